@@ -1,12 +1,22 @@
 import os
 import platform
 from pathlib import Path
-from flask import Flask, render_template, redirect, url_for
+from flask import Flask, Response, render_template, redirect, url_for
 from flask_cors import CORS
-from flask_migrate import Migrate
-from models import db
+from flask_migrate import Migrate, stamp
+from models import db, Game, User
+import click
 import logging
 from flask_wtf import CSRFProtect
+from services.analysis import get_stockfish_path
+from services.database import init_database
+from services.metrics import init_metrics, render_metrics
+from services.bulk_analysis import reanalyse_stored_games
+from services.opening_book import BOOK_MAX_PLY, build_opening_book
+from services.player_stats import rebuild_player_stats
+from services.leaderboard import get_leaderboard
+from services.ratings import recompute_ratings
+from services.replay import pack_stored_games, store_missing_plies
 
 # Import blueprints from routes
 from routes.auth import auth_bp
@@ -25,11 +35,22 @@ instance_path.mkdir(exist_ok=True)
 db_path = instance_path / 'app.db'
 
 app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'default-secret-key')
 
-db.init_app(app)
+# SQLite tuning for concurrent writers (services/database.py): connection pool
+# size, how long a writer waits for the lock and how often a view is retried
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['DB_LOCK_RETRIES'] = int(os.environ.get('DB_LOCK_RETRIES', 3))
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+init_database(app)
+init_metrics(app)
 migrate = Migrate(app, db)
 csrf = CSRFProtect(app)
 
@@ -46,6 +67,62 @@ elif platform.system() == "Linux":
 else:
     raise OSError("Unsupported operating system")
 
+# Warm Stockfish processes kept per worker, and how long a request waits for one
+app.config['ENGINE_POOL_SIZE'] = int(os.environ.get('ENGINE_POOL_SIZE', 2))
+app.config['ENGINE_POOL_TIMEOUT'] = float(os.environ.get('ENGINE_POOL_TIMEOUT', 10))
+# 'pool' checks a Stockfish process out per request; 'async' multiplexes searches
+# from all requests over the same processes on one asyncio event loop
+app.config['ENGINE_BACKEND'] = os.environ.get('ENGINE_BACKEND', 'pool')
+app.config['ENGINE_SEARCH_TIMEOUT'] = float(os.environ.get('ENGINE_SEARCH_TIMEOUT', 30))
+# Latency budget in seconds for the engine searches of one request; it caps the
+# time budgets of the difficulty profiles in services/difficulty.py
+app.config['ENGINE_LATENCY_SLO'] = float(os.environ.get('ENGINE_LATENCY_SLO', 2.5))
+
+# Shared position evaluation cache; set EVAL_CACHE_PATH to keep it across restarts
+app.config['EVAL_CACHE_SIZE'] = int(os.environ.get('EVAL_CACHE_SIZE', 50000))
+app.config['EVAL_CACHE_PATH'] = os.environ.get('EVAL_CACHE_PATH')
+
+# Rows per page of the friends, friend request, game and move lists, and the
+# most a client can ask for with ?limit=
+app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 50))
+app.config['MAX_PAGE_SIZE'] = int(os.environ.get('MAX_PAGE_SIZE', 200))
+
+# Whether save_game stores a GamePly row per position for O(1) replay lookups.
+# Off, games keep only their packed moves (services/game_codec.py) and
+# replays decode them, for a much smaller database
+app.config['STORE_GAME_PLIES'] = os.environ.get('STORE_GAME_PLIES', '1') == '1'
+
+# Whether analysed games keep their graded moves packed into
+# Game.packed_analysis instead of Move rows (services/stored_analysis.py),
+# for a much smaller database. Off, analyses are written as Move rows
+app.config['PACK_ANALYSIS'] = os.environ.get('PACK_ANALYSIS', '0') == '1'
+
+# Rendered JSON of the polled GET routes (services/response_cache.py). Writes
+# in this worker invalidate it at once; the TTL bounds how long a write in
+# another worker can go unseen
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 10000))
+app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 30))
+
+# Requests slower than this many seconds are logged to the 'slow_requests'
+# logger with their SQL and engine time
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+
+# Friend suggestions are cached per user for this many seconds
+app.config['SUGGESTION_CACHE_SIZE'] = int(os.environ.get('SUGGESTION_CACHE_SIZE', 10000))
+app.config['SUGGESTION_CACHE_TTL'] = int(os.environ.get('SUGGESTION_CACHE_TTL', 300))
+
+# How often, in seconds, each worker reloads the leaderboard to pick up games
+# saved by the other workers; its own games update it straight away
+app.config['LEADERBOARD_CACHE_TTL'] = int(os.environ.get('LEADERBOARD_CACHE_TTL', 60))
+
+# Background threads that grade finished games from the AnalysisJob queue
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', 1))
+app.config['ANALYSIS_POLL_INTERVAL'] = float(os.environ.get('ANALYSIS_POLL_INTERVAL', 5))
+
+# Polyglot opening book played before the engine; build one from stored games
+# with `flask build-opening-book`
+app.config['OPENING_BOOK_PATH'] = os.environ.get('OPENING_BOOK_PATH', str(instance_path / 'opening_book.bin'))
+
 # Register blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(chess_bp)
@@ -62,8 +139,80 @@ csrf.exempt(friends_bp)  # <--- ADD THIS LINE
 def init_db():
     with app.app_context():
         db.create_all()
+        # The tables are already current, so mark every migration as applied
+        stamp()
     print('Initialized the database.')
 
+# CLI command to re-grade stored games in parallel, e.g. after changing the
+# evaluate_move thresholds or to backfill analysis for old games
+@app.cli.command('reanalyze-games')
+@click.option('--all', 'all_games', is_flag=True, help='Include games that were already analysed.')
+@click.option('--processes', type=int, default=None, help='Engine processes to run (default: one per core).')
+@click.option('--threads', type=int, default=1, help='Search threads per engine.')
+@click.option('--hash', 'hash_mb', type=int, default=None, help='Hash table size per engine, in MB.')
+@click.option('--depth', type=int, default=15, help='Search depth per position.')
+def reanalyze_games(all_games, processes, threads, hash_mb, depth):
+    query = Game.query
+    if not all_games:
+        query = query.filter(Game.analyzed.isnot(True))
+    result = reanalyse_stored_games(
+        query,
+        get_stockfish_path(),
+        processes=processes,
+        threads=threads,
+        hash_mb=hash_mb,
+        depth=depth,
+    )
+    print(result.summary())
+
+# CLI command to recompute the stats page aggregates from the stored moves,
+# e.g. for moves saved before the aggregates were kept
+@app.cli.command('rebuild-player-stats')
+def rebuild_stats():
+    user_ids = [user_id for user_id, in db.session.query(Game.user_id).filter(Game.user_id.isnot(None)).distinct()]
+    for user_id in user_ids:
+        rebuild_player_stats(user_id)
+    db.session.commit()
+    print(f'Rebuilt stats for {len(user_ids)} players.')
+
+# CLI command to rebuild every player's rating from their whole game history,
+# e.g. after changing the rating formula or the engine ratings per difficulty
+@app.cli.command('recompute-ratings')
+@click.option('--no-numpy', is_flag=True, help='Replay the games in plain Python even if NumPy is installed.')
+def recompute_ratings_command(no_numpy):
+    players = recompute_ratings(use_numpy=False if no_numpy else None)
+    db.session.commit()
+    get_leaderboard().clear()
+    print(f'Recomputed ratings for {players} players.')
+
+# CLI command to store the replay plies of games saved before they were kept
+@app.cli.command('build-game-replays')
+def build_game_replays():
+    print(f'Stored plies for {store_missing_plies()} games.')
+
+# CLI command to pack the moves of games stored before they were packed and,
+# with PACK_ANALYSIS on, replace the Move rows of analysed games with their
+# packed analysis; --drop-plies then leaves replays to decode the packed moves
+@app.cli.command('pack-games')
+@click.option('--drop-plies', is_flag=True, help='Delete the GamePly rows of packed games.')
+def pack_games(drop_plies):
+    packed = pack_stored_games(drop_plies=drop_plies, pack_analysis=app.config['PACK_ANALYSIS'])
+    print(f'Packed {packed} games.')
+
+# CLI command to build the opening book from the games played on the site
+@app.cli.command('build-opening-book')
+@click.option('--plies', type=int, default=BOOK_MAX_PLY, help='How many plies of each game to include.')
+@click.option('--min-games', type=int, default=2, help='Leave out moves played in fewer games than this.')
+def build_book(plies, min_games):
+    games = db.session.query(Game.pgn, Game.result).filter(Game.pgn.isnot(None)).yield_per(500)
+    entries = build_opening_book(games, app.config['OPENING_BOOK_PATH'], max_ply=plies, min_games=min_games)
+    print(f"Wrote {entries} book entries to {app.config['OPENING_BOOK_PATH']}")
+
+# Prometheus scrape endpoint: request latency, SQL, engine, pool and cache metrics
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # Template routes
 @app.route('/')
 def index():
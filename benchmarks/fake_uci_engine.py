@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""A stand-in for Stockfish that speaks just enough UCI for the app.
+
+It plays a legal move straight away and reports one info line per depth up
+to the depth asked for, so searches cost next to nothing and the load test
+measures the app rather than the engine. Set FAKE_ENGINE_DELAY to the
+milliseconds each depth should take to simulate a real search.
+"""
+import os
+import sys
+import time
+
+import chess
+
+DELAY = float(os.environ.get('FAKE_ENGINE_DELAY', 0)) / 1000
+
+
+def search(board, depth):
+    moves = list(board.legal_moves)
+    if not moves:
+        print('info depth 0 score mate 0' if board.is_checkmate() else 'info depth 0 score cp 0')
+        print('bestmove (none)')
+        return
+    best = moves[len(moves) // 2]
+    after = board.copy()
+    after.push(best)
+    replies = list(after.legal_moves)
+    pv = best.uci() + (' ' + replies[0].uci() if replies else '')
+    for d in range(1, depth + 1):
+        time.sleep(DELAY)
+        print(f'info depth {d} seldepth {d} nodes {d * 1000} time {d} score cp {len(moves) - 20} pv {pv}')
+    print(f'bestmove {best.uci()}')
+
+
+def main():
+    board = chess.Board()
+    pending = None
+    for line in sys.stdin:
+        parts = line.split()
+        if not parts:
+            continue
+        command = parts[0]
+        if command == 'uci':
+            print('id name FakeUCIEngine')
+            print('option name Skill Level type spin default 20 min 0 max 20')
+            print('option name Threads type spin default 1 min 1 max 512')
+            print('option name Hash type spin default 16 min 1 max 33554432')
+            print('uciok')
+        elif command == 'isready':
+            print('readyok')
+        elif command == 'position':
+            if parts[1] == 'startpos':
+                board, rest = chess.Board(), parts[2:]
+            else:
+                board, rest = chess.Board(' '.join(parts[2:8])), parts[8:]
+            for move in rest[1:] if rest and rest[0] == 'moves' else []:
+                board.push_uci(move)
+        elif command == 'go' and ('infinite' in parts or len(parts) == 1):
+            # Streamed analysis: answer when told to stop
+            pending = next(iter(board.legal_moves)).uci()
+        elif command == 'go':
+            search(board, int(parts[parts.index('depth') + 1]) if 'depth' in parts else 5)
+        elif command == 'stop' and pending:
+            print('bestmove ' + pending)
+            pending = None
+        elif command == 'quit':
+            break
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Friend suggestion latency as the user base grows, vs ORDER BY RANDOM().
+
+For each --sizes entry, fills a scratch database with that many players,
+each with about --friends accepted friendships, then times suggest_players()
+for random users with the suggestion cache bypassed. Run from the
+repository root:
+
+    python benchmarks/friend_suggestions.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func
+
+from models import db, Friendship, User
+from services.database import init_database
+from services.player_search import players_query
+from services.suggestions import SUGGESTION_COUNT, suggest_players
+
+
+def fill(path, users, friends, seed):
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            'INSERT INTO "user" (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+            ((i, f'player{i}', f'player{i}@example.com', 'x') for i in range(1, users + 1))
+        )
+        connection.executemany(
+            'INSERT INTO player_stats (user_id, rating) VALUES (?, ?)',
+            ((i, rng.randint(600, 2400)) for i in range(1, users + 1))
+        )
+        # Each player asks friends / 2 others, so about ``friends`` each in all
+        pairs = {(i, rng.randint(1, users)) for i in range(1, users + 1) for _ in range(friends // 2)}
+        connection.executemany(
+            "INSERT INTO friendship (user_id, friend_id, status) VALUES (?, ?, 'accepted')",
+            ((a, b) for a, b in pairs if a != b)
+        )
+    connection.execute('ANALYZE')
+    connection.close()
+
+
+def random_order_suggestions(user_id):
+    # What get_suggestions did before the suggestion engine
+    sent = db.session.query(Friendship.friend_id).filter(Friendship.user_id == user_id)
+    received = db.session.query(Friendship.user_id).filter(Friendship.friend_id == user_id)
+    return players_query().filter(
+        User.id != user_id, ~User.id.in_(sent), ~User.id.in_(received)
+    ).order_by(func.random()).limit(SUGGESTION_COUNT).all()
+
+
+def time_calls(suggest, user_ids):
+    times = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        suggest(user_id)
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma-separated numbers of players.')
+    parser.add_argument('--friends', type=int, default=10, help='Average friends per player.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"players":>9} {"engine median":>14} {"p95":>8} {"RANDOM() median":>16} {"p95":>8}  (ms)')
+    for size in (int(size) for size in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+            init_database(app)
+
+            with app.app_context():
+                db.create_all()
+                fill(path, size, args.friends, args.seed)
+                rng = random.Random(args.seed)
+                user_ids = [rng.randint(1, size) for _ in range(args.requests)]
+
+                engine = time_calls(suggest_players, user_ids)
+                # ORDER BY RANDOM() is slow enough that a few calls will do
+                baseline = time_calls(random_order_suggestions, user_ids[:max(args.requests // 20, 5)])
+                print(f'{size:9} {engine[0]:14.3f} {engine[1]:8.3f} {baseline[0]:16.3f} {baseline[1]:8.3f}')
+                db.session.remove()
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
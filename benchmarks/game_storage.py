@@ -0,0 +1,144 @@
+"""Storage and read cost of game analysis and replays: rows vs packed blobs.
+
+Stores --games random games both ways: a GamePly row per position and a
+Move row per player move, as the app does by default, and Game.packed_moves
+and Game.packed_analysis, which is all an analysed game keeps with
+STORE_GAME_PLIES off and PACK_ANALYSIS on. Then it compares the bytes each
+takes on disk, and the time to read a game's analysis both ways. Run from
+the repository root:
+
+    python benchmarks/game_storage.py --games 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chess
+import chess.pgn
+from flask import Flask
+from sqlalchemy import insert, text
+
+from models import db, Game, Move, User
+from services.database import init_database
+from services.game_codec import COMMENTS, pack_analysis_or_none, unpack_analysis
+from services.replay import store_game_plies
+
+GRADES = [(10, 'Best move!'), (8, 'Good move.'), (5, 'Inaccuracy.'), (3, 'Mistake.'), (0, 'Blunder!')]
+
+
+def random_pgn(rng, plies):
+    board = chess.Board()
+    while len(board.move_stack) < plies and not board.is_game_over():
+        board.push(rng.choice(list(board.legal_moves)))
+    return str(chess.pgn.Game.from_board(board)), board
+
+
+def fill(games, plies, seed):
+    rng = random.Random(seed)
+    user = User(username='player', email='player@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    for _ in range(games):
+        pgn, board = random_pgn(rng, plies)
+        game = Game(user_id=user.id, pgn=pgn, white_player='Player', black_player='AI', result='*')
+        db.session.add(game)
+        db.session.flush()
+        store_game_plies(game)
+
+        # The player's (white's) moves, graded as the analysis job would
+        replay = chess.Board()
+        rows = []
+        for ply, move in enumerate(board.move_stack, start=1):
+            replay.push(move)
+            if ply % 2:
+                score, comment = rng.choice(GRADES)
+                rows.append({
+                    'game_id': game.id,
+                    'move_number': (ply + 1) // 2,
+                    'game_state': replay.fen(),
+                    'score': score,
+                    'is_blunder': comment == 'Blunder!',
+                    'is_brilliant': score == 10,
+                    'comment': comment,
+                })
+        db.session.execute(insert(Move), rows)
+        game.packed_analysis = pack_analysis_or_none(rows)
+    db.session.commit()
+
+
+def table_bytes(names):
+    """Bytes on disk of the named tables and their indexes."""
+    indexes = [name for name, in db.session.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name IN (%s)"
+        % ', '.join(f"'{name}'" for name in names)))]
+    objects = ', '.join(f"'{name}'" for name in list(names) + indexes)
+    return db.session.execute(text(f'SELECT sum(pgsize) FROM dbstat WHERE name IN ({objects})')).scalar()
+
+
+def read_rows(game_id):
+    return [{
+        'move_number': m.move_number,
+        'score': m.score,
+        'is_blunder': m.is_blunder,
+        'is_brilliant': m.is_brilliant,
+        'comment': m.comment
+    } for m in Move.query.filter_by(game_id=game_id).order_by(Move.move_number)]
+
+
+def read_packed(game_id):
+    return unpack_analysis(db.session.query(Game.packed_analysis).filter_by(id=game_id).scalar())
+
+
+def median_ms(read, game_ids):
+    times = []
+    for game_id in game_ids:
+        started = time.perf_counter()
+        read(game_id)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--plies', type=int, default=80, help='Length of each game.')
+    parser.add_argument('--reads', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    assert len(COMMENTS) < 256
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        init_database(app)
+
+        with app.app_context():
+            db.create_all()
+            fill(args.games, args.plies, args.seed)
+
+            packed_moves, packed_analysis = db.session.execute(text(
+                'SELECT sum(length(packed_moves)), sum(length(packed_analysis)) FROM game')).one()
+            move_rows = table_bytes(['move'])
+            ply_rows = table_bytes(['game_ply'])
+            print(f'analysis: Move rows {move_rows / 1024:9.0f} KiB   packed {packed_analysis / 1024:7.0f} KiB'
+                  f'   {move_rows / packed_analysis:5.1f}x smaller')
+            print(f'replay:   GamePly rows {ply_rows / 1024:6.0f} KiB   packed {packed_moves / 1024:7.0f} KiB'
+                  f'   {ply_rows / packed_moves:5.1f}x smaller')
+
+            rng = random.Random(args.seed)
+            game_ids = [rng.randint(1, args.games) for _ in range(args.reads)]
+            assert read_rows(game_ids[0]) == read_packed(game_ids[0])
+            print(f'/api/game_analysis read: rows {median_ms(read_rows, game_ids):.3f} ms'
+                  f'   packed {median_ms(read_packed, game_ids):.3f} ms (median)')
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
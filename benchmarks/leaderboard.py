@@ -0,0 +1,104 @@
+"""Leaderboard rank lookups as the number of players grows, vs SQL counts.
+
+For each --sizes entry, fills a scratch database with that many rated
+players, then times player_rank() and top_players() with the leaderboard
+loaded, the load itself, and the COUNT(*) of higher rated players a rank
+would otherwise take. Run from the repository root:
+
+    python benchmarks/leaderboard.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func
+
+from models import db, PlayerStats
+from services.database import init_database
+from services.leaderboard import get_leaderboard, player_rank, top_players
+
+
+def fill(path, users, friends, seed):
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            'INSERT INTO "user" (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+            ((i, f'player{i}', f'player{i}@example.com', 'x') for i in range(1, users + 1))
+        )
+        connection.executemany(
+            'INSERT INTO player_stats (user_id, rating) VALUES (?, ?)',
+            ((i, rng.randint(600, 2400)) for i in range(1, users + 1))
+        )
+        pairs = {(i, rng.randint(1, users)) for i in range(1, users + 1) for _ in range(friends // 2)}
+        connection.executemany(
+            "INSERT INTO friendship (user_id, friend_id, status) VALUES (?, ?, 'accepted')",
+            ((a, b) for a, b in pairs if a != b)
+        )
+    connection.execute('ANALYZE')
+    connection.close()
+
+
+def sql_rank(user_id):
+    # A rank without the leaderboard: count everyone rated higher
+    rating = db.session.query(PlayerStats.rating).filter_by(user_id=user_id).scalar()
+    return db.session.query(func.count()).filter(PlayerStats.rating > rating).scalar() + 1
+
+
+def median_ms(call, user_ids):
+    times = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        call(user_id)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Comma-separated numbers of players.')
+    parser.add_argument('--friends', type=int, default=10, help='Average friends per player.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{"players":>9} {"load":>9} {"player_rank":>12} {"top_players":>12} {"SQL COUNT rank":>15}  (ms, median)')
+    for size in (int(size) for size in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            app = Flask(__name__)
+            app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+            init_database(app)
+
+            with app.app_context():
+                db.create_all()
+                fill(path, size, args.friends, args.seed)
+                rng = random.Random(args.seed)
+                user_ids = [rng.randint(1, size) for _ in range(args.requests)]
+
+                leaderboard = get_leaderboard()
+                leaderboard.clear()
+                started = time.perf_counter()
+                len(top_players(1))
+                load = (time.perf_counter() - started) * 1000
+
+                for user_id in user_ids[:20]:
+                    assert player_rank(user_id)['rank'] == sql_rank(user_id)
+                ranked = median_ms(player_rank, user_ids)
+                top = median_ms(lambda _: top_players(), user_ids)
+                counted = median_ms(sql_rank, user_ids)
+                print(f'{size:9} {load:9.1f} {ranked:12.3f} {top:12.3f} {counted:15.3f}')
+                db.session.remove()
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""Concurrent game sessions against the app, with per-endpoint latency.
+
+Builds the app on a scratch SQLite database with --players registered
+players, points it at benchmarks/fake_uci_engine.py instead of Stockfish and
+runs --users concurrent players through the test client. Each plays
+--sessions games: log in, save the game in progress, then for every move
+get_ai_move, evaluate_move and record_move, save the finished game, load
+the stats and friends pages and search for players. Prints throughput and
+p50/p95/p99 latency per endpoint and compares them with a saved baseline,
+exiting 1 if an endpoint's p95 got slower than --tolerance and --min-delta
+allow. Baselines only hold for the machine they were saved on. Run from the
+repository root:
+
+    python benchmarks/load_test.py --users 8 --sessions 3 --save-baseline
+    python benchmarks/load_test.py --users 8 --sessions 3
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chess
+import chess.pgn
+from werkzeug.security import generate_password_hash
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_ENGINE = os.path.join(HERE, 'fake_uci_engine.py')
+DEFAULT_BASELINE = os.path.join(HERE, 'load_test_baseline.json')
+PASSWORD = 'load-test'
+DIFFICULTIES = ['easy', 'medium', 'hard']
+
+# Run settings that have to match for a baseline to be comparable
+COMPARABLE = ['users', 'sessions', 'moves', 'players', 'engine_delay', 'pool_size', 'seed']
+
+
+def fill(path, players, friends, seed):
+    rng = random.Random(seed)
+    # Hashing is deliberately slow, so every player shares one hash
+    password_hash = generate_password_hash(PASSWORD)
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            'INSERT INTO "user" (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+            ((i, f'player{i}', f'player{i}@example.com', password_hash) for i in range(1, players + 1))
+        )
+        connection.executemany(
+            'INSERT INTO player_stats (user_id, rating) VALUES (?, ?)',
+            ((i, rng.randint(600, 2400)) for i in range(1, players + 1))
+        )
+        pairs = {(i, rng.randint(1, players)) for i in range(1, players + 1) for _ in range(friends)}
+        connection.executemany(
+            "INSERT INTO friendship (user_id, friend_id, status) VALUES (?, ?, 'accepted')",
+            ((a, b) for a, b in pairs if a != b)
+        )
+    connection.execute('ANALYZE')
+    connection.close()
+
+
+class Recorder:
+    """Latencies and failures per endpoint, shared by the player threads."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def call(self, client, name, method, url, **kwargs):
+        started = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.latencies.setdefault(name, []).append(elapsed)
+            if response.status_code >= 400:
+                self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+
+def percentile(sorted_values, pct):
+    # Nearest rank
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def play_session(client, recorder, rng, user_id, moves):
+    call = recorder.call
+    call(client, 'login', 'POST', '/login', json={'username': f'player{user_id}', 'password': PASSWORD})
+    call(client, 'current_user', 'GET', f'/api/current_user/{user_id}')
+
+    difficulty = rng.choice(DIFFICULTIES)
+    # The game in progress gets an id up front so its moves can be recorded
+    response = call(client, 'save_game', 'POST', '/save_game', json={
+        'pgn': '*', 'white': 'Player', 'black': 'AI', 'result': '*',
+        'user_id': user_id, 'difficulty': difficulty,
+    })
+    game_id = response.get_json().get('game_id')
+
+    board = chess.Board()
+    for move_number in range(1, moves + 1):
+        if board.is_game_over():
+            break
+        fen_before = board.fen()
+        move = rng.choice(list(board.legal_moves))
+        grade = call(client, 'evaluate_move', 'POST', '/evaluate_move',
+                     json={'fen_before': fen_before, 'move': move.uci()}).get_json()
+        board.push(move)
+        if game_id is not None:
+            score = grade.get('score', 0)
+            call(client, 'record_move', 'POST', '/record_move', json={
+                'game_id': game_id, 'move_number': move_number, 'game_state': board.fen(),
+                'score': score, 'is_blunder': score == 0, 'is_brilliant': score == 10,
+                'comment': grade.get('feedback', ''),
+            })
+        if board.is_game_over():
+            break
+        reply = call(client, 'get_ai_move', 'POST', '/get_ai_move',
+                     json={'fen': board.fen(), 'difficulty': difficulty}).get_json().get('move')
+        try:
+            board.push_uci(reply)
+        except (TypeError, ValueError):
+            board.push(rng.choice(list(board.legal_moves)))
+
+    # Unfinished games end in a resignation
+    result = board.result() if board.is_game_over() else rng.choice(['1-0', '0-1'])
+    game = chess.pgn.Game.from_board(board)
+    game.headers['Result'] = result
+    call(client, 'save_game', 'POST', '/save_game', json={
+        'pgn': str(game), 'white': 'Player', 'black': 'AI', 'result': result,
+        'user_id': user_id, 'difficulty': difficulty,
+    })
+
+    # Stats page
+    call(client, 'player_stats', 'GET', f'/api/player_stats/{user_id}')
+    call(client, 'games', 'GET', f'/api/games/{user_id}')
+    call(client, 'leaderboard', 'GET', '/api/leaderboard')
+    call(client, 'leaderboard_rank', 'GET', f'/api/leaderboard/{user_id}')
+
+    # Friends page, typing a name a letter at a time
+    call(client, 'friends', 'GET', f'/api/friends/{user_id}')
+    call(client, 'friend_requests', 'GET', f'/api/friend_requests/{user_id}')
+    call(client, 'suggestions', 'GET', f'/api/suggestions/{user_id}')
+    name = f'player{rng.randint(1, 999)}'
+    for length in range(len('player') + 1, len(name) + 1):
+        call(client, 'search_players', 'GET', '/api/search_players',
+             query_string={'q': name[:length], 'exclude': user_id})
+
+
+def run(app, args):
+    recorder = Recorder()
+    failures = []
+
+    def player(index):
+        rng = random.Random(args.seed * 1000 + index)
+        client = app.test_client()
+        try:
+            for _ in range(args.sessions):
+                play_session(client, recorder, rng, index + 1, args.moves)
+        except Exception as e:
+            failures.append(f'player {index + 1}: {e!r}')
+
+    threads = [threading.Thread(target=player, args=(i,)) for i in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started, failures
+
+
+def summarize(recorder, seconds):
+    endpoints = {}
+    for name, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        endpoints[name] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(name, 0),
+            'throughput': len(values) / seconds,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {'seconds': seconds, 'requests': total, 'throughput': total / seconds, 'endpoints': endpoints}
+
+
+def print_summary(summary, baseline):
+    base = baseline['results']['endpoints'] if baseline else {}
+    print(f'{"endpoint":<18} {"requests":>8} {"errors":>6} {"req/s":>8} '
+          f'{"p50":>8} {"p95":>8} {"p99":>8}  (ms){"   p95 vs baseline" if baseline else ""}')
+    for name, e in summary['endpoints'].items():
+        line = (f'{name:<18} {e["requests"]:8} {e["errors"]:6} {e["throughput"]:8.1f} '
+                f'{e["p50"]:8.2f} {e["p95"]:8.2f} {e["p99"]:8.2f}')
+        if name in base:
+            line += f'   {(e["p95"] / base[name]["p95"] - 1) * 100:+7.1f}%'
+        print(line)
+    print(f'{summary["requests"]} requests in {summary["seconds"]:.2f}s, {summary["throughput"]:.1f} req/s')
+
+
+def regressions(summary, baseline, tolerance, min_delta):
+    """Endpoints whose p95 or overall throughput got worse than the baseline allows."""
+    found = []
+    base = baseline['results']
+    for name, e in summary['endpoints'].items():
+        before = base['endpoints'].get(name)
+        # A few milliseconds either way is thread scheduling, not the code
+        if before and e['p95'] > max(before['p95'] * (1 + tolerance), before['p95'] + min_delta):
+            found.append(f'{name}: p95 {before["p95"]:.2f}ms -> {e["p95"]:.2f}ms')
+        if before and e['errors'] > before['errors']:
+            found.append(f'{name}: errors {before["errors"]} -> {e["errors"]}')
+    if summary['throughput'] < base['throughput'] / (1 + tolerance):
+        found.append(f'throughput {base["throughput"]:.1f} -> {summary["throughput"]:.1f} req/s')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=8, help='Concurrent players.')
+    parser.add_argument('--sessions', type=int, default=3, help='Games each player plays.')
+    parser.add_argument('--moves', type=int, default=20, help='Most moves the player makes per game.')
+    parser.add_argument('--players', type=int, default=1000, help='Registered players in the database.')
+    parser.add_argument('--friends', type=int, default=5, help='Friends added per player.')
+    parser.add_argument('--engine-delay', type=float, default=0.0,
+                        help='Milliseconds the fake engine spends per depth.')
+    parser.add_argument('--pool-size', type=int, default=4, help='ENGINE_POOL_SIZE.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline.')
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='Allowed slowdown against the baseline, as a fraction.')
+    parser.add_argument('--min-delta', type=float, default=10.0,
+                        help='Milliseconds of p95 slowdown always allowed.')
+    args = parser.parse_args()
+    if args.users > args.players:
+        parser.error('--players must be at least --users')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'load.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+        # Read by the engine processes the pool starts
+        os.environ['FAKE_ENGINE_DELAY'] = str(args.engine_delay)
+        from app import app
+        from models import db
+
+        app.config['STOCKFISH_PATH'] = FAKE_ENGINE
+        app.config['ENGINE_POOL_SIZE'] = args.pool_size
+        app.config['WTF_CSRF_ENABLED'] = False
+
+        with app.app_context():
+            db.create_all()
+            fill(path, args.players, args.friends, args.seed)
+            recorder, seconds, failures = run(app, args)
+            db.session.remove()
+            db.engine.dispose()
+
+    summary = summarize(recorder, seconds)
+    settings = {key: getattr(args, key) for key in COMPARABLE}
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != settings:
+            print(f'Baseline was run with {baseline["settings"]}, not comparing')
+            baseline = None
+
+    print_summary(summary, baseline)
+    for failure in failures:
+        print(f'FAILED {failure}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'results': summary}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Saved baseline to {args.baseline}')
+    elif baseline:
+        found = regressions(summary, baseline, args.tolerance, args.min_delta)
+        for regression in found:
+            print(f'REGRESSION {regression}')
+        if found:
+            sys.exit(1)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
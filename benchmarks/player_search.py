@@ -0,0 +1,117 @@
+"""Player search latency at scale: the trigram index vs the old LIKE '%q%'.
+
+Fills a scratch database with --users players, then times search_players()
+for substrings of existing names, short prefixes and common fragments that
+match thousands of players. "call" includes building the query in
+SQLAlchemy; "SQL" is SQLite alone. Run from the repository root:
+
+    python benchmarks/player_search.py --users 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from models import db, User
+from services.database import init_database
+from services.player_search import SEARCH_LIMIT, players_query, search_players
+from tests.query_plans import capture_statements
+
+SYLLABLES = ['ka', 'ro', 'mi', 'ne', 'zu', 'ta', 'li', 'so', 've', 'du', 'chess', 'king', 'pawn',
+             'night', 'rook', 'bi', 'sha', 'ox', 'fi', 'ra', 'mo', 'el', 'gam', 'bit', 'qu', 'een']
+
+
+def fill(path, users, seed):
+    rng = random.Random(seed)
+    names = []
+    connection = sqlite3.connect(path)
+    with connection:
+        rows = []
+        for i in range(users):
+            name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + str(i)
+            names.append(name)
+            rows.append((name, f'{name}@example.com', 'x'))
+        connection.executemany('INSERT INTO "user" (username, email, password_hash) VALUES (?, ?, ?)', rows)
+        connection.executemany(
+            'INSERT INTO player_stats (user_id, rating, wins, losses, draws) VALUES (?, ?, 0, 0, 0)',
+            ((i + 1, rng.randint(600, 2400)) for i in range(users))
+        )
+    connection.execute('ANALYZE')
+    connection.close()
+    return names
+
+
+def time_queries(search, queries):
+    """Median and p95 milliseconds for the whole call and for its SQL alone."""
+    calls = []
+    sql = []
+    connection = db.session.connection()
+    for q in queries:
+        with capture_statements(db.engine) as statements:
+            started = time.perf_counter()
+            search(q)
+            calls.append((time.perf_counter() - started) * 1000)
+        statement, parameters = statements[0]
+        started = time.perf_counter()
+        connection.exec_driver_sql(statement, parameters).fetchall()
+        sql.append((time.perf_counter() - started) * 1000)
+    return [(statistics.median(times), sorted(times)[int(len(times) * 0.95) - 1]) for times in (calls, sql)]
+
+
+def like_search(q):
+    # What search_players did before the index
+    return players_query().filter(User.username.ilike(f'%{q}%')).limit(SEARCH_LIMIT).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200, help='Queries of each kind.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+        init_database(app)
+
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            names = fill(path, args.users, args.seed)
+            print(f'{args.users} players indexed in {time.perf_counter() - started:.1f}s')
+
+            rng = random.Random(args.seed)
+            substrings = []
+            for name in rng.sample(names, args.queries):
+                start = rng.randrange(len(name) - 3)
+                substrings.append(name[start:start + rng.randint(4, 6)])
+            kinds = [
+                ('substring', substrings),
+                ('prefix', [rng.choice(names)[:2] for _ in range(args.queries)]),
+                ('common', [rng.choice(SYLLABLES) + rng.choice(SYLLABLES) for _ in range(args.queries)]),
+            ]
+
+            # Warm the page cache before timing anything
+            for q in substrings[:10]:
+                search_players(q)
+            print(f'{"":16} {"call median":>12} {"p95":>9} {"SQL median":>12} {"p95":>9}  (ms)')
+            results = [(f'index {label}', time_queries(search_players, queries)) for label, queries in kinds]
+            results.append(('LIKE substring', time_queries(like_search, substrings[:max(args.queries // 20, 5)])))
+            for label, ((call_median, call_p95), (sql_median, sql_p95)) in results:
+                print(f'{label:16} {call_median:12.3f} {call_p95:9.3f} {sql_median:12.3f} {sql_p95:9.3f}')
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
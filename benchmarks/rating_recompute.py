@@ -0,0 +1,121 @@
+"""Time to rebuild every player's rating from their full game history.
+
+Fills a scratch database with --players players who have played --games
+games each against the AI, then times recompute_ratings() with NumPy (when
+it is installed) and in plain Python, and a per-game ORM loop through
+apply_game_result() like save_game runs, timed on a sample of players. Run
+from the repository root:
+
+    python benchmarks/rating_recompute.py --players 10000 --games 100
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from models import db, Game, PlayerStats
+from services.database import init_database
+from services.difficulty import DIFFICULTY_PROFILES
+from services.player_stats import INITIAL_RATING
+from services.ratings import RECORD_FIELDS, apply_game_result, np, recompute_ratings
+
+
+def fill(path, players, games, seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.executemany(
+            'INSERT INTO "user" (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+            ((i, f'player{i}', f'player{i}@example.com', 'x') for i in range(1, players + 1))
+        )
+        connection.executemany(
+            'INSERT INTO player_stats (user_id, rating, highest_rating, wins, losses, draws) VALUES (?, ?, ?, 0, 0, 0)',
+            ((i, INITIAL_RATING, INITIAL_RATING) for i in range(1, players + 1))
+        )
+        difficulties = list(DIFFICULTY_PROFILES) + [None]
+        connection.executemany(
+            'INSERT INTO game (user_id, pgn, white_player, black_player, result, difficulty, date_played) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((user_id, '*', *rng.choice([('Player', 'AI'), ('AI', 'Player')]),
+              rng.choice(['1-0', '0-1', '1/2-1/2', '*']), rng.choice(difficulties),
+              start + timedelta(minutes=rng.randrange(500_000)))
+             for user_id in range(1, players + 1) for _ in range(games))
+        )
+    connection.execute('ANALYZE')
+    connection.close()
+
+
+def records():
+    return {stats.user_id: tuple(getattr(stats, field) for field in RECORD_FIELDS)
+            for stats in PlayerStats.query}
+
+
+def orm_loop(user_ids):
+    # What rebuilding the ratings one saved game at a time costs
+    for user_id in user_ids:
+        stats = PlayerStats.query.filter_by(user_id=user_id).one()
+        stats.rating = stats.highest_rating = INITIAL_RATING
+        stats.wins = stats.losses = stats.draws = 0
+        for game in Game.query.filter_by(user_id=user_id).order_by(Game.date_played, Game.id):
+            apply_game_result(stats, game)
+    db.session.commit()
+
+
+def timed(run):
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--games', type=int, default=100, help='Games per player.')
+    parser.add_argument('--sample', type=int, default=200, help='Players to time the ORM loop on.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+        init_database(app)
+
+        with app.app_context():
+            db.create_all()
+            fill(path, args.players, args.games, args.seed)
+            print(f'{args.players} players, {args.players * args.games} games')
+
+            results = {}
+            modes = ([('numpy', True)] if np is not None else []) + [('python', False)]
+            for name, use_numpy in modes:
+                seconds = timed(lambda: (recompute_ratings(use_numpy=use_numpy), db.session.commit()))
+                results[name] = records()
+                print(f'recompute_ratings ({name}): {seconds:8.2f} s')
+            if np is None:
+                print('recompute_ratings (numpy): NumPy is not installed')
+
+            sample = list(range(1, min(args.sample, args.players) + 1))
+            seconds = timed(lambda: orm_loop(sample)) * args.players / len(sample)
+            print(f'per-game ORM loop:        {seconds:8.2f} s (estimated from {len(sample)} players)')
+
+            # Every way of computing the ratings must agree
+            incremental = records()
+            for name, rebuilt in results.items():
+                assert all(rebuilt[user_id] == incremental[user_id] for user_id in sample), name
+            assert len({tuple(sorted(rebuilt.items())) for rebuilt in results.values()}) == 1
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
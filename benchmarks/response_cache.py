@@ -0,0 +1,84 @@
+"""Latency of the polled JSON routes uncached, cached, and revalidated (304).
+
+Fills a scratch database with one player who has --friends friends and an
+analysed game, then calls each cached route through the Flask test client:
+with the response cache cleared before every call, from the cache, and with
+the ETag of the last response in If-None-Match. Run from the repository
+root:
+
+    python benchmarks/response_cache.py --friends 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Friendship, Game, Move, PlayerStats, User
+from services.response_cache import get_response_cache
+
+ROUTES = ['/api/player_stats/1', '/api/game_analysis/1', '/api/friends/1', '/api/current_user/1']
+
+
+def fill(friends):
+    users = [User(username=f'player{i}', email=f'player{i}@example.com', password_hash='x')
+             for i in range(friends + 1)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([PlayerStats(user_id=user.id) for user in users])
+    db.session.add_all([Friendship(user_id=1, friend_id=user.id, status='accepted') for user in users[1:]])
+    game = Game(user_id=1, pgn='1. e4 e5 *', white_player='Player', black_player='AI', result='1-0', analyzed=True)
+    db.session.add(game)
+    db.session.flush()
+    db.session.add_all([Move(game_id=game.id, move_number=n, game_state='x', score=5, comment='Inaccuracy.')
+                        for n in range(1, 41)])
+    db.session.flush()
+    PlayerStats.query.filter_by(user_id=1).one().last_game_id = game.id
+    db.session.commit()
+
+
+def median_ms(call, requests):
+    times = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--friends', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from app import app
+
+        with app.app_context():
+            db.create_all()
+            fill(args.friends)
+            client = app.test_client()
+            cache = get_response_cache()
+
+            print(f'{"route":<24} {"uncached":>9} {"cached":>9} {"304":>9}  (ms, median)')
+            for url in ROUTES:
+                def uncached():
+                    cache.clear()
+                    return client.get(url)
+                etag = client.get(url).headers['ETag']
+                revalidated = client.get(url, headers={'If-None-Match': etag})
+                assert revalidated.status_code == 304, url
+                print(f'{url:<24} {median_ms(uncached, args.requests):9.3f} '
+                      f'{median_ms(lambda: client.get(url), args.requests):9.3f} '
+                      f'{median_ms(lambda: client.get(url, headers={"If-None-Match": etag}), args.requests):9.3f}')
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
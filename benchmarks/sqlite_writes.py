@@ -0,0 +1,96 @@
+"""Concurrent write throughput of the app's SQLite database, default vs tuned.
+
+Each writer thread runs the same transaction as /save_game: insert a Game,
+update the player's PlayerStats and commit. Run from the repository root:
+
+    python benchmarks/sqlite_writes.py --threads 8 --commits 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from models import db, Game, PlayerStats, User
+from services.database import apply_sqlite_pragmas, sqlite_pragmas
+
+PGN = '1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 1-0'
+
+
+def make_engine(path, tuned, threads):
+    if not tuned:
+        return create_engine(f'sqlite:///{path}')
+    engine = create_engine(
+        f'sqlite:///{path}',
+        pool_size=threads,
+        max_overflow=0,
+        connect_args={'timeout': 5},
+    )
+    apply_sqlite_pragmas(engine, sqlite_pragmas({}))
+    return engine
+
+
+def run(tuned, threads, commits):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, 'bench.db'), tuned, threads)
+        db.metadata.create_all(engine)
+        with Session(engine) as session:
+            for i in range(threads):
+                user = User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x')
+                session.add(user)
+                session.flush()
+                session.add(PlayerStats(user_id=user.id))
+            session.commit()
+            user_ids = [user.id for user in session.query(User).order_by(User.id)]
+
+        errors = []
+        done = []
+
+        def writer(user_id):
+            ok = 0
+            with Session(engine) as session:
+                for _ in range(commits):
+                    try:
+                        session.add(Game(user_id=user_id, pgn=PGN, white_player='Player',
+                                         black_player='AI', result='1-0'))
+                        session.execute(update(PlayerStats).where(PlayerStats.user_id == user_id)
+                                        .values(wins=PlayerStats.wins + 1))
+                        session.commit()
+                        ok += 1
+                    except OperationalError as e:
+                        session.rollback()
+                        errors.append(str(e.orig))
+            done.append(ok)
+
+        workers = [threading.Thread(target=writer, args=(user_id,)) for user_id in user_ids]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+        return sum(done), len(errors), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--commits', type=int, default=200, help='Transactions per thread.')
+    args = parser.parse_args()
+
+    for label, tuned in (('default', False), ('tuned', True)):
+        committed, failed, elapsed = run(tuned, args.threads, args.commits)
+        print(f'{label:8} {committed:6} commits, {failed:5} lock errors in {elapsed:6.2f}s: '
+              f'{committed / elapsed:8.1f} commits/s')
+
+
+if __name__ == '__main__':
+    main()
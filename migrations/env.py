@@ -93,6 +93,13 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    # The player search index and its shadow tables are made by raw DDL
+    # (see models.py), so autogenerate must not try to drop them
+    def include_name(name, type_, parent_names):
+        return not (type_ == 'table' and name.startswith('user_search'))
+
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
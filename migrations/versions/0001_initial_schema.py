@@ -0,0 +1,92 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('password_hash', sa.String(length=128), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_login', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('friendship',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('friend_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['friend_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'friend_id', name='unique_friendship')
+    )
+    op.create_table('game',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('pgn', sa.Text(), nullable=False),
+    sa.Column('white_player', sa.String(length=50), nullable=True),
+    sa.Column('black_player', sa.String(length=50), nullable=True),
+    sa.Column('result', sa.String(length=10), nullable=True),
+    sa.Column('date_played', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('move',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('move_number', sa.Integer(), nullable=False),
+    sa.Column('game_state', sa.String(length=100), nullable=True),
+    sa.Column('score', sa.Float(), nullable=True),
+    sa.Column('is_blunder', sa.Boolean(), nullable=True),
+    sa.Column('is_brilliant', sa.Boolean(), nullable=True),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('move', schema=None) as batch_op:
+        batch_op.create_index('idx_analysis_blunders', ['game_id', 'is_blunder'], unique=False)
+
+    op.create_table('player_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('wins', sa.Integer(), nullable=True),
+    sa.Column('losses', sa.Integer(), nullable=True),
+    sa.Column('draws', sa.Integer(), nullable=True),
+    sa.Column('rating', sa.Integer(), nullable=True),
+    sa.Column('highest_rating', sa.Integer(), nullable=True),
+    sa.Column('last_game_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['last_game_id'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('player_stats')
+    with op.batch_alter_table('move', schema=None) as batch_op:
+        batch_op.drop_index('idx_analysis_blunders')
+
+    op.drop_table('move')
+    op.drop_table('game')
+    op.drop_table('friendship')
+    op.drop_table('user')
@@ -0,0 +1,95 @@
+"""analysis jobs and move aggregates
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 12:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('analysis_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('moves_analyzed', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.create_index('idx_analysis_job_status', ['status', 'id'], unique=False)
+
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('analyzed', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('moves_scored', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('score_total', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('blunders', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('games_analyzed', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('moves_scored', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('score_total', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('blunders', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('brilliants', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('highest_average', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('lowest_average', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('best_move_game_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('best_move_number', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('best_move_score', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('worst_move_game_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('worst_move_number', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('worst_move_score', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('move_range_scores', sa.JSON(), nullable=True))
+
+    # Keep the latest copy of any move recorded twice before the key existed
+    op.execute(
+        'DELETE FROM move WHERE id NOT IN '
+        '(SELECT MAX(id) FROM move GROUP BY game_id, move_number)'
+    )
+    with op.batch_alter_table('move', schema=None) as batch_op:
+        batch_op.create_unique_constraint('unique_game_move', ['game_id', 'move_number'])
+
+
+def downgrade():
+    with op.batch_alter_table('move', schema=None) as batch_op:
+        batch_op.drop_constraint('unique_game_move', type_='unique')
+
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.drop_column('move_range_scores')
+        batch_op.drop_column('worst_move_score')
+        batch_op.drop_column('worst_move_number')
+        batch_op.drop_column('worst_move_game_id')
+        batch_op.drop_column('best_move_score')
+        batch_op.drop_column('best_move_number')
+        batch_op.drop_column('best_move_game_id')
+        batch_op.drop_column('lowest_average')
+        batch_op.drop_column('highest_average')
+        batch_op.drop_column('brilliants')
+        batch_op.drop_column('blunders')
+        batch_op.drop_column('score_total')
+        batch_op.drop_column('moves_scored')
+        batch_op.drop_column('games_analyzed')
+
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_column('blunders')
+        batch_op.drop_column('score_total')
+        batch_op.drop_column('moves_scored')
+        batch_op.drop_column('analyzed')
+
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.drop_index('idx_analysis_job_status')
+
+    op.drop_table('analysis_job')
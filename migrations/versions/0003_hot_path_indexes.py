@@ -0,0 +1,50 @@
+"""indexes for the hot query paths
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Stats requests and save_game look players up by user
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.create_index('idx_player_stats_user', ['user_id'], unique=True)
+
+    # A player's games, and get_player_stats_by_name's filter on the white player
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.create_index('idx_game_user', ['user_id'], unique=False)
+        batch_op.create_index('idx_game_white_player', ['white_player'], unique=False)
+
+    # get_friend_requests and the friend_id side of the friends lookups
+    with op.batch_alter_table('friendship', schema=None) as batch_op:
+        batch_op.create_index('idx_friendship_friend_status', ['friend_id', 'status'], unique=False)
+
+    # enqueue_game_analysis looks for a game's active job
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.create_index('idx_analysis_job_game', ['game_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.drop_index('idx_analysis_job_game')
+
+    with op.batch_alter_table('friendship', schema=None) as batch_op:
+        batch_op.drop_index('idx_friendship_friend_status')
+
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('idx_game_white_player')
+        batch_op.drop_index('idx_game_user')
+
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.drop_index('idx_player_stats_user')
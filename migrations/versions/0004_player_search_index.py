@@ -0,0 +1,51 @@
+"""player search index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 12:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('idx_user_username_lower', [sa.text('lower(username)')], unique=False)
+
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # Trigram index over usernames, kept in step by triggers (see models.py)
+    op.execute("""CREATE VIRTUAL TABLE user_search USING fts5(
+        username, content='user', content_rowid='id', tokenize='trigram'
+    )""")
+    op.execute("""CREATE TRIGGER user_search_insert AFTER INSERT ON "user" BEGIN
+        INSERT INTO user_search (rowid, username) VALUES (new.id, new.username);
+    END""")
+    op.execute("""CREATE TRIGGER user_search_delete AFTER DELETE ON "user" BEGIN
+        INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username);
+    END""")
+    op.execute("""CREATE TRIGGER user_search_update AFTER UPDATE OF username ON "user" BEGIN
+        INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username);
+        INSERT INTO user_search (rowid, username) VALUES (new.id, new.username);
+    END""")
+    # Index the players who registered before the triggers existed
+    op.execute("INSERT INTO user_search (user_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS user_search_update')
+        op.execute('DROP TRIGGER IF EXISTS user_search_delete')
+        op.execute('DROP TRIGGER IF EXISTS user_search_insert')
+        op.execute('DROP TABLE IF EXISTS user_search')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('idx_user_username_lower')
@@ -0,0 +1,27 @@
+"""player stats rating index
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 12:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Friend suggestions look for players rated close to the user
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.create_index('idx_player_stats_rating', ['rating'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.drop_index('idx_player_stats_rating')
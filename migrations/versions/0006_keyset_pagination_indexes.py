@@ -0,0 +1,40 @@
+"""indexes for keyset pagination
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 12:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Game history pages by (date_played, id) within a player's games
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('idx_game_user')
+        batch_op.create_index('idx_game_user', ['user_id', 'date_played'], unique=False)
+
+    # Friends and friend requests page by (created_at, id) from either side
+    with op.batch_alter_table('friendship', schema=None) as batch_op:
+        batch_op.drop_index('idx_friendship_friend_status')
+        batch_op.create_index('idx_friendship_friend_status', ['friend_id', 'status', 'created_at'], unique=False)
+        batch_op.create_index('idx_friendship_user_status', ['user_id', 'status', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('friendship', schema=None) as batch_op:
+        batch_op.drop_index('idx_friendship_user_status')
+        batch_op.drop_index('idx_friendship_friend_status')
+        batch_op.create_index('idx_friendship_friend_status', ['friend_id', 'status'], unique=False)
+
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('idx_game_user')
+        batch_op.create_index('idx_game_user', ['user_id'], unique=False)
@@ -0,0 +1,35 @@
+"""per-ply positions for game replay
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in for existing games by `flask build-game-replays`
+    op.create_table('game_ply',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('ply', sa.Integer(), nullable=False),
+    sa.Column('san', sa.String(length=10), nullable=True),
+    sa.Column('uci', sa.String(length=5), nullable=True),
+    sa.Column('fen', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('game_id', 'ply', name='unique_game_ply')
+    )
+
+
+def downgrade():
+    op.drop_table('game_ply')
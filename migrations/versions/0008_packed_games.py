@@ -0,0 +1,29 @@
+"""packed moves and analysis on games
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 12:35:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in for existing games by `flask pack-games`
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('packed_moves', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('packed_analysis', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_column('packed_analysis')
+        batch_op.drop_column('packed_moves')
@@ -0,0 +1,27 @@
+"""difficulty on games
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Games saved before it are rated against medium by `flask recompute-ratings`
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('difficulty', sa.String(length=10), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_column('difficulty')
@@ -0,0 +1,29 @@
+"""covering rating index for the leaderboard
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 15:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The leaderboard loads every (rating, user_id) in order from the index
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.drop_index('idx_player_stats_rating')
+        batch_op.create_index('idx_player_stats_rating', ['rating', 'user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('player_stats', schema=None) as batch_op:
+        batch_op.drop_index('idx_player_stats_rating')
+        batch_op.create_index('idx_player_stats_rating', ['rating'], unique=False)
@@ -1,6 +1,7 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, Index
+from sqlalchemy import DDL, event, func, Index
+from sqlalchemy.orm import deferred
 
 db = SQLAlchemy()
 
@@ -13,10 +14,37 @@ class User(db.Model):
     last_login = db.Column(db.DateTime, default=datetime.now)
     is_active = db.Column(db.Boolean, default=True)
     
+    __table_args__ = (
+        # Prefix search on usernames too short for the trigram index
+        Index('idx_user_username_lower', func.lower(username)),
+    )
+
     # Relationships
     stats = db.relationship('PlayerStats', backref='user', uselist=False)
     games = db.relationship('Game', backref='player', lazy=True)
 
+# Trigram index over usernames for player search (services/player_search.py),
+# kept in step with the user table by triggers. It's an SQLite virtual table,
+# which the models can't declare, so create_all() runs the DDL itself.
+USER_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE user_search USING fts5(
+        username, content='user', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER user_search_insert AFTER INSERT ON "user" BEGIN
+        INSERT INTO user_search (rowid, username) VALUES (new.id, new.username);
+    END""",
+    """CREATE TRIGGER user_search_delete AFTER DELETE ON "user" BEGIN
+        INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username);
+    END""",
+    """CREATE TRIGGER user_search_update AFTER UPDATE OF username ON "user" BEGIN
+        INSERT INTO user_search (user_search, rowid, username) VALUES ('delete', old.id, old.username);
+        INSERT INTO user_search (rowid, username) VALUES (new.id, new.username);
+    END""",
+]
+for statement in USER_SEARCH_DDL:
+    event.listen(User.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(User.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS user_search').execute_if(dialect='sqlite'))
+
 class Game(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -24,10 +52,30 @@ class Game(db.Model):
     white_player = db.Column(db.String(50))
     black_player = db.Column(db.String(50))
     result = db.Column(db.String(10))
+    difficulty = db.Column(db.String(10))  # AI level the game was played against
     date_played = db.Column(db.DateTime, default=datetime.utcnow)
+    analyzed = db.Column(db.Boolean, default=False)
+
+    # Running totals over this game's scored graded moves (services/player_stats.py)
+    moves_scored = db.Column(db.Integer, default=0)
+    score_total = db.Column(db.Float, default=0.0)
+    blunders = db.Column(db.Integer, default=0)
+
+    # Compact copy of the moves, and the graded moves of an analysed game in
+    # place of its Move rows (services/game_codec.py, services/stored_analysis.py).
+    # Deferred, so listing games doesn't read them
+    packed_moves = deferred(db.Column(db.LargeBinary))
+    packed_analysis = deferred(db.Column(db.LargeBinary))
+
+    __table_args__ = (
+        # A player's games, and their history newest first
+        Index('idx_game_user', 'user_id', 'date_played'),
+        Index('idx_game_white_player', 'white_player'),
+    )
     
     # Relationships
     moves = db.relationship('Move', backref='game', lazy=True, order_by='Move.move_number')
+    plies = db.relationship('GamePly', backref='game', lazy=True, order_by='GamePly.ply')
 
 class Move(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -43,8 +91,41 @@ class Move(db.Model):
     
     __table_args__ = (
         Index('idx_analysis_blunders', 'game_id', 'is_blunder'),
+        db.UniqueConstraint('game_id', 'move_number', name='unique_game_move'),
+    )
+
+class GamePly(db.Model):
+    """One position of a saved game, parsed from its PGN once when the game is
+    saved (services/replay.py). Ply 0 is the starting position."""
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    ply = db.Column(db.Integer, nullable=False)
+    san = db.Column(db.String(10))  # Move that led here; None at ply 0
+    uci = db.Column(db.String(5))
+    fen = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('game_id', 'ply', name='unique_game_ply'),
+    )
+
+class AnalysisJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    moves_analyzed = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        Index('idx_analysis_job_status', 'status', 'id'),
+        Index('idx_analysis_job_game', 'game_id', 'status'),
     )
 
+    # Relationships
+    game = db.relationship('Game', backref='analysis_jobs')
+
 class PlayerStats(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -54,6 +135,30 @@ class PlayerStats(db.Model):
     rating = db.Column(db.Integer, default=1000)
     highest_rating = db.Column(db.Integer, default=1000)
     last_game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=True)
+
+    # Move quality aggregates, updated whenever graded moves are stored so the
+    # stats pages never have to scan the player's games
+    games_analyzed = db.Column(db.Integer, default=0)
+    moves_scored = db.Column(db.Integer, default=0)
+    score_total = db.Column(db.Float, default=0.0)
+    blunders = db.Column(db.Integer, default=0)
+    brilliants = db.Column(db.Integer, default=0)
+    highest_average = db.Column(db.Float)  # best and worst per-game average score
+    lowest_average = db.Column(db.Float)
+    best_move_game_id = db.Column(db.Integer)
+    best_move_number = db.Column(db.Integer)
+    best_move_score = db.Column(db.Float)
+    worst_move_game_id = db.Column(db.Integer)
+    worst_move_number = db.Column(db.Integer)
+    worst_move_score = db.Column(db.Float)
+    move_range_scores = db.Column(db.JSON)  # [score total, moves] per range of 5 moves
+
+    __table_args__ = (
+        Index('idx_player_stats_user', 'user_id', unique=True),
+        # Friend suggestions by rating (services/suggestions.py), and the
+        # leaderboard read in rating order from the index alone
+        Index('idx_player_stats_rating', 'rating', 'user_id'),
+    )
     
     # Relationships
     last_game = db.relationship('Game')
@@ -67,6 +172,9 @@ class Friendship(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+        # Both sides of the friends list and the requests, oldest first
+        Index('idx_friendship_user_status', 'user_id', 'status', 'created_at'),
+        Index('idx_friendship_friend_status', 'friend_id', 'status', 'created_at'),
     )
 
     # Relationships
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, session
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from models import db, User, PlayerStats
+from services.response_cache import cached_json
 from flask_wtf.csrf import CSRFProtect
 
 auth_bp = Blueprint('auth', __name__)
@@ -114,6 +115,7 @@ def get_current_user():
     })
 
 @auth_bp.route('/api/current_user/<int:user_id>')
+@cached_json('current_user', 'user_id')
 def get_user_by_id(user_id):
     user = User.query.get(user_id)
     if not user:
@@ -1,24 +1,39 @@
-from flask import Blueprint, request, jsonify
-from models import db, Game, PlayerStats, Move
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from models import db, Game, GamePly, PlayerStats, Move, AnalysisJob
 import chess
 import chess.engine
-import platform
-from flask import current_app
+import json
+import time
+from services.engine_pool import EnginePoolExhausted
+from services.async_engine import EngineSearchTimeout
+from werkzeug.exceptions import ClientDisconnected
+from services.analysis import (GRADING_PROFILE, MOVE_GRADE_DEPTH, analyse_positions, get_engine, get_eval_cache,
+                               grade_move)
+from services.difficulty import DIFFICULTY_PROFILES, engine_options, get_profile, search_limit, search_stats
+from services.opening_book import get_opening_book
+from services.moves import invalidate_move_responses, store_moves, validate_moves
+from services.player_stats import game_average, get_player_stats, invalidate_record_responses, player_stats_to_dict
+from services.analysis_queue import (NO_PLAYER_SIDE, enqueue_game_analysis, game_needs_analysis, job_to_dict,
+                                     player_color, wake_analysis_worker)
+from services.database import DatabaseBusy, retry_on_lock
+from services.pagination import InvalidCursor, after_cursor, keyset_page, page_size
+from services.leaderboard import get_leaderboard
+from services.suggestions import get_suggestion_cache
+from services.ratings import RESULT_SCORES, apply_game_result
+from services.replay import load_game_plies, ply_to_dict, store_game_plies
+from services.stored_analysis import load_analysis
+from services.response_cache import cached_json, get_response_cache
 
 chess_bp = Blueprint('chess', __name__)
 
-# Helper to get Stockfish path from app config or platform
-def get_stockfish_path():
-    if hasattr(current_app, 'config') and 'STOCKFISH_PATH' in current_app.config:
-        return current_app.config['STOCKFISH_PATH']
-    if platform.system() == "Darwin":
-        return "./static/stockfish/stockfish-macos"
-    elif platform.system() == "Windows":
-        return "./static/stockfish/stockfish.exe"
-    elif platform.system() == "Linux":
-        return "./static/stockfish/stockfish-linux"
-    else:
-        raise OSError("Unsupported operating system")
+# Eval bar value in centipawns from white's point of view, with mates pinned to +/-10000
+def evaluation_from_info(info):
+    if 'score' not in info:
+        return None
+    score = info['score'].white()
+    if isinstance(score, chess.engine.Mate):
+        return 10000 if score.mate() > 0 else -10000
+    return score.score()
 
 @chess_bp.route('/get_ai_move', methods=['POST'])
 def get_ai_move():
@@ -29,12 +44,7 @@ def get_ai_move():
     if not fen:
         return jsonify({'error': 'FEN not provided'}), 400
 
-    difficulty_settings = {
-        'easy': {'skill_level': 1, 'depth': 10},
-        'medium': {'skill_level': 10, 'depth': 12},
-        'hard': {'skill_level': 20, 'depth': 20}
-    }
-    settings = difficulty_settings.get(difficulty, difficulty_settings['medium'])
+    profile = get_profile(difficulty)
 
     try:
         board = chess.Board(fen)
@@ -47,23 +57,41 @@ def get_ai_move():
                 'result': board.result()
             })
 
-        with chess.engine.SimpleEngine.popen_uci(get_stockfish_path()) as engine:
-            engine.configure({'Skill Level': settings['skill_level']})
-            result = engine.play(board, chess.engine.Limit(depth=settings['depth'], time=1))
+        # Known opening positions are answered from the book without the engine
+        book = get_opening_book(current_app.config.get('OPENING_BOOK_PATH'))
+        book_move = book and book.choose(board, profile['book_choice'], profile['book_plies'])
+        if book_move:
+            cached = get_eval_cache().get(board, 1, engine_options(profile))
+            return jsonify({
+                'move': book_move.uci(),
+                'evaluation': evaluation_from_info(cached) if cached else None,
+                'game_over': False,
+                'book': True
+            })
+
+        limit = search_limit(profile, current_app.config.get('ENGINE_LATENCY_SLO'))
+        with get_engine(engine_options(profile)) as engine:
+            # One search gives both the move and the score it was chosen with,
+            # rather than a second full analyse of the same position
+            started = time.perf_counter()
+            result = engine.play(
+                board,
+                limit,
+                info=chess.engine.INFO_BASIC | chess.engine.INFO_SCORE | chess.engine.INFO_PV
+            )
+            search_stats.record('ai_move', difficulty, result.info, time.perf_counter() - started, limit.time)
+            get_eval_cache().put(board, result.info, engine_options(profile))
 
             move = result.move.uci() if result.move else None
             game_over = result.move is None
             evaluation = None
-            try:
-                info = engine.analyse(board, chess.engine.Limit(depth=settings['depth']))
-                score_obj = info['score'].white()
+            if 'score' in result.info:
+                score_obj = result.info['score'].white()
                 if isinstance(score_obj, chess.engine.Cp):
                     evaluation = score_obj.score()
                 elif isinstance(score_obj, chess.engine.Mate):
                     mate_val = score_obj.mate()
                     evaluation = 100000 if mate_val > 0 else -100000
-            except Exception:
-                evaluation = None
 
             return jsonify({
                 'move': move,
@@ -71,6 +99,12 @@ def get_ai_move():
                 'game_over': game_over
             })
 
+    except EnginePoolExhausted as e:
+        return jsonify({'error': str(e)}), 503
+    except EngineSearchTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except ClientDisconnected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -83,32 +117,91 @@ def get_evaluation():
     if not fen:
         return jsonify({'error': 'FEN not provided'}), 400
 
-    difficulty_settings = {
-        'easy': {'skill_level': 1, 'depth': 10},
-        'medium': {'skill_level': 10, 'depth': 12},
-        'hard': {'skill_level': 20, 'depth': 20}
-    }
-    settings = difficulty_settings.get(difficulty, difficulty_settings['medium'])
+    profile = get_profile(difficulty)
 
     try:
-        with chess.engine.SimpleEngine.popen_uci(get_stockfish_path()) as engine:
-            board = chess.Board(fen)
-            engine.configure({'Skill Level': settings['skill_level']})
+        board = chess.Board(fen)
+        info, = analyse_positions(
+            [board],
+            profile['depth'],
+            engine_options(profile),
+            accept_depths=[profile['cache_depth']],
+            limit=search_limit(profile, current_app.config.get('ENGINE_LATENCY_SLO')),
+            label=('evaluation', difficulty)
+        )
+        return jsonify({'evaluation': evaluation_from_info(info)})
+
+    except EnginePoolExhausted as e:
+        return jsonify({'error': str(e)}), 503
+    except EngineSearchTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            info = engine.analyse(board, chess.engine.Limit(depth=settings['depth']))
-            evaluation = None
+@chess_bp.route('/stream_evaluation')
+def stream_evaluation():
+    """Server-Sent Events version of /get_evaluation.
 
-            if 'score' in info:
-                score = info['score'].white()
-                if isinstance(score, chess.engine.Mate):
-                    evaluation = 10000 if score.mate() > 0 else -10000
-                elif isinstance(score, chess.engine.Cp):
-                    evaluation = score.score()
+    Sends an event with the evaluation after every completed search depth, so
+    the eval bar can update long before the full difficulty depth is reached.
+    The search stops as soon as the client disconnects.
+    """
+    fen = request.args.get('fen')
+    difficulty = request.args.get('difficulty', 'medium')
 
-            return jsonify({'evaluation': evaluation})
+    if not fen:
+        return jsonify({'error': 'FEN not provided'}), 400
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    profile = get_profile(difficulty)
+    try:
+        board = chess.Board(fen)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = search_limit(profile, current_app.config.get('ENGINE_LATENCY_SLO'))
+
+    def event(data, name=None):
+        prefix = f'event: {name}\n' if name else ''
+        return f'{prefix}data: {json.dumps(data)}\n\n'
+
+    def generate():
+        cache = get_eval_cache()
+        cached = cache.get(board, profile['cache_depth'], engine_options(profile))
+        if cached is not None:
+            yield event({'depth': cached['depth'], 'evaluation': evaluation_from_info(cached)}, 'done')
+            return
+
+        last_depth = 0
+        last_info = None
+        started = time.perf_counter()
+        try:
+            with get_engine(engine_options(profile)) as engine:
+                with engine.analysis(board, limit) as analysis:
+                    # A client that goes away makes the next yield raise
+                    # GeneratorExit, which leaves both with blocks and stops
+                    # the search
+                    for info in analysis:
+                        depth = info.get('depth', 0)
+                        if 'score' not in info or depth <= last_depth:
+                            continue
+                        last_depth, last_info = depth, info
+                        yield event({'depth': depth, 'evaluation': evaluation_from_info(info)})
+        except (EnginePoolExhausted, EngineSearchTimeout) as e:
+            yield event({'error': str(e)}, 'error')
+            return
+
+        if last_info is not None:
+            search_stats.record('stream_evaluation', difficulty, last_info, time.perf_counter() - started, limit.time)
+            cache.put(board, last_info, engine_options(profile))
+            yield event({'depth': last_depth, 'evaluation': evaluation_from_info(last_info)}, 'done')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @chess_bp.route('/evaluate_move', methods=['POST'])
 def evaluate_move():
@@ -132,84 +225,38 @@ def evaluate_move():
         board_after = board_before.copy()
         board_after.push(move)
 
-        with chess.engine.SimpleEngine.popen_uci(get_stockfish_path()) as engine:
-            # Check if the player checkmated the AI
-            if board_after.is_checkmate():
-                return jsonify({
-                    'cpl': 0,
-                    'score': 10,
-                    'feedback': "Checkmate! You won the game."
-                })
-
-            info_before = engine.analyse(board_before, chess.engine.Limit(depth=15))
-            info_after = engine.analyse(board_after, chess.engine.Limit(depth=15))
-
-            turn = board_before.turn  # True for white, False for black
-
-            if turn:
-                score_before = info_before['score'].white()
-                score_after = info_after['score'].white()
-            else:
-                score_before = info_before['score'].black()
-                score_after = info_after['score'].black()
-
-            def score_to_cp(score_obj):
-                if isinstance(score_obj, chess.engine.Cp):
-                    return score_obj.score()
-                elif isinstance(score_obj, chess.engine.Mate):
-                    mate_val = score_obj.mate()
-                    return 100000 if mate_val > 0 else -100000
-                else:
-                    return 0
-
-            eval_before = score_to_cp(score_before)
-            eval_after = score_to_cp(score_after)
-
-            cpl = abs(eval_before - eval_after)
-
-            if score_after.is_mate():
-                mate_val = score_after.mate()
-                if mate_val > 0:
-                    feedback = f"You're delivering mate in {mate_val}"
-                    score_value = 10
-                else:
-                    feedback = f"Opponent has mate in {abs(mate_val)}"
-                    score_value = 0
-            elif score_before.is_mate():
-                mate_val = score_before.mate()
-                if mate_val > 0:
-                    feedback = f"You were delivering mate in {mate_val}, don't miss it!"
-                    score_value = 5
-                else:
-                    feedback = f"Opponent was mating in {abs(mate_val)}, stay alert!"
-                    score_value = 1
-            else:
-                if cpl == 0:
-                    feedback = "Best move!"
-                    score_value = 10
-                elif cpl < 50:
-                    feedback = "Good move."
-                    score_value = 8
-                elif cpl < 150:
-                    feedback = "Inaccuracy."
-                    score_value = 5
-                elif cpl < 400:
-                    feedback = "Mistake."
-                    score_value = 3
-                else:
-                    feedback = "Blunder!"
-                    score_value = 0
+        # Checkmate needs no search; grade_move handles it
+        if board_after.is_checkmate():
+            return jsonify(grade_move(board_before, board_after, None, None))
+
+        # In a game, the position before this move was already searched one ply
+        # deeper as part of the previous grade or AI move (it is the reply in
+        # that search's principal variation), so only board_after normally
+        # needs a fresh search.
+        # Each search gets half the request's latency budget
+        accept_depth = GRADING_PROFILE['cache_depth']
+        info_before, info_after = analyse_positions(
+            [board_before, board_after],
+            MOVE_GRADE_DEPTH,
+            engine_options(GRADING_PROFILE),
+            accept_depths=[accept_depth - 1, accept_depth],
+            limit=search_limit(GRADING_PROFILE, current_app.config.get('ENGINE_LATENCY_SLO'), searches=2),
+            label=('evaluate_move', None)
+        )
 
-            return jsonify({
-                'cpl': cpl,
-                'score': score_value,
-                'feedback': feedback
-            })
+        return jsonify(grade_move(board_before, board_after, info_before, info_after))
 
+    except EnginePoolExhausted as e:
+        return jsonify({'error': str(e)}), 503
+    except EngineSearchTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except ClientDisconnected:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @chess_bp.route('/save_game', methods=['POST'])
+@retry_on_lock
 def save_game():
     data = request.json
     pgn = data.get('pgn')
@@ -217,6 +264,9 @@ def save_game():
     black = data.get('black')
     result = data.get('result')
     user_id = data.get('user_id')  # Get user_id sent from frontend
+    difficulty = data.get('difficulty')
+    if difficulty not in DIFFICULTY_PROFILES:
+        difficulty = None
 
     if not pgn or not white or not black or not result:
         return jsonify({'error': 'Missing required fields'}), 400
@@ -228,11 +278,16 @@ def save_game():
                 pgn=pgn,
                 white_player=white,
                 black_player=black,
-                result=result
+                result=result,
+                difficulty=difficulty
             )
             db.session.add(game)
+            db.session.flush()
+            store_game_plies(game, store_rows=current_app.config['STORE_GAME_PLIES'])
             db.session.commit()
             return jsonify({'status': 'success', 'game_id': game.id, 'warning': 'Game saved without user stats update'})
+        except DatabaseBusy:
+            raise
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
@@ -244,53 +299,51 @@ def save_game():
             white_player=white,
             black_player=black,
             result=result,
+            difficulty=difficulty,
             user_id=user_id  # Set the user_id on the game
         )
         db.session.add(game)
         db.session.flush()  # This assigns an ID to the game without committing
 
+        # Parse the PGN once so replays never have to
+        store_game_plies(game, store_rows=current_app.config['STORE_GAME_PLIES'])
+
         # Find or create player stats for this user
-        stats = PlayerStats.query.filter_by(user_id=user_id).first()
-        if not stats:
-            stats = PlayerStats(user_id=user_id, wins=0, losses=0, draws=0, rating=1200, highest_rating=1200)
-            db.session.add(stats)
-        
-        # Convert chess notation result to win/loss/draw status from the perspective of the current user
-        is_player_white = (white == "Player")
-        
-        # Update stats based on game result
-        if result == '1-0':  # White wins
-            if is_player_white:
-                stats.wins += 1
-                stats.rating += 10
-            else:
-                stats.losses += 1
-                stats.rating -= 8
-        elif result == '0-1':  # Black wins
-            if not is_player_white:
-                stats.wins += 1
-                stats.rating += 10
-            else:
-                stats.losses += 1
-                stats.rating -= 8
-        elif result == '1/2-1/2':  # Draw
-            stats.draws += 1
-            stats.rating += 2
-            
-        # Update highest rating if needed
-        if stats.rating > stats.highest_rating:
-            stats.highest_rating = stats.rating
+        stats = get_player_stats(user_id)
         
+        # Rate the result against the engine's strength at the game's difficulty
+        rating_change = apply_game_result(stats, game)
+        rating = stats.rating
+
         # Update last game reference
         stats.last_game_id = game.id
 
+        # Finished games are graded move by move in the background
+        job = None
+        if game_needs_analysis(pgn, result) and player_color(game) is not None:
+            job = enqueue_game_analysis(game.id)
+
         db.session.commit()
-        return jsonify({'game_status': 'success', 'game_id': game.id})
+        invalidate_record_responses(user_id)
+        if rating_change is not None:
+            get_leaderboard().update(int(user_id), rating - rating_change, rating)
+        if job:
+            wake_analysis_worker()
+        return jsonify({
+            'game_status': 'success',
+            'game_id': game.id,
+            'rating': rating,
+            'rating_change': rating_change,
+            'analysis_job_id': job.id if job else None
+        })
+    except DatabaseBusy:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
     
 @chess_bp.route('/update_game/<int:game_id>', methods=['POST'])
+@retry_on_lock
 def update_game(game_id):
     data = request.json
     result = data.get('result')
@@ -300,16 +353,71 @@ def update_game(game_id):
     game = Game.query.get(game_id)
     if not game:
         return jsonify({'error': 'Game not found'}), 404
-
-    game.result = result
+    # A finished game has been rated; changing its result would leave the
+    # rating disagreeing with `flask recompute-ratings`
+    if game.result in RESULT_SCORES and result != game.result:
+        return jsonify({'error': "A finished game's result can't be changed"}), 400
+
+    rating_change = None
+    if game.result not in RESULT_SCORES:
+        game.result = result
+        if game.user_id:
+            stats = get_player_stats(game.user_id)
+            rating_change = apply_game_result(stats, game)
+            rating = stats.rating
+    user_id = game.user_id
     db.session.commit()
-    return jsonify({'status': 'success', 'game_id': game.id})
+    if user_id:
+        invalidate_record_responses(user_id)
+    if rating_change is not None:
+        get_leaderboard().update(int(user_id), rating - rating_change, rating)
+    return jsonify({'status': 'success', 'game_id': game.id, 'rating_change': rating_change})
+
+@chess_bp.route('/analyze_game/<int:game_id>', methods=['POST'])
+def analyze_game(game_id):
+    game = Game.query.get(game_id)
+    if not game:
+        return jsonify({'error': 'Game not found'}), 404
+    if player_color(game) is None:
+        return jsonify({'error': NO_PLAYER_SIDE}), 400
+
+    try:
+        job = enqueue_game_analysis(game.id)
+        db.session.commit()
+        wake_analysis_worker()
+        return jsonify(job_to_dict(job)), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@chess_bp.route('/api/analysis_jobs/<int:job_id>')
+def get_analysis_job(job_id):
+    job = AnalysisJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Analysis job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+# Hit rates of the in-process caches
+@chess_bp.route('/api/cache_stats')
+def get_cache_stats():
+    return jsonify({
+        'responses': get_response_cache().stats(),
+        'evaluations': get_eval_cache().stats(),
+        'suggestions': get_suggestion_cache().stats(),
+        'leaderboard': get_leaderboard().stats(),
+    })
+
+# What engine searches have actually cost so far, per endpoint and difficulty
+@chess_bp.route('/api/engine_stats')
+def get_engine_stats():
+    return jsonify({
+        'latency_slo': current_app.config.get('ENGINE_LATENCY_SLO'),
+        'searches': search_stats.snapshot()
+    })
 
 @chess_bp.route('/player_stats/<player_name>')
 def get_player_stats_by_name(player_name):
-    stats = PlayerStats.query.join(Game, PlayerStats.last_game_id == Game.id, isouter=True) \
-        .join(Move, Game.id == Move.game_id, isouter=True) \
-        .join(Game, PlayerStats.user_id == Game.user_id, isouter=True) \
+    stats = PlayerStats.query.join(Game, PlayerStats.user_id == Game.user_id) \
         .filter(Game.white_player == player_name).first()
     if not stats:
         return jsonify({'error': 'Player not found'}), 404
@@ -322,59 +430,119 @@ def get_player_stats_by_name(player_name):
     })
 
 @chess_bp.route('/api/player_stats/<int:user_id>')
+@cached_json('player_stats', 'user_id')
 def get_player_stats_by_id(user_id):
-    stats = PlayerStats.query.filter_by(user_id=user_id).first_or_404()
+    # One query: the aggregates live on PlayerStats and the last game's on Game
+    stats, last_game = db.session.query(PlayerStats, Game) \
+        .outerjoin(Game, PlayerStats.last_game_id == Game.id) \
+        .filter(PlayerStats.user_id == user_id).first_or_404()
+    data = player_stats_to_dict(stats, last_game)
+    # The last game's move scores for the stats page chart, so it needs no
+    # second request for the game's analysis
+    data['last_game_moves'] = [{
+        'move_number': m['move_number'],
+        'score': m['score'],
+        'is_blunder': m['is_blunder'],
+        'is_brilliant': m['is_brilliant'],
+    } for m in load_analysis(last_game.id)] if last_game else []
+    return jsonify(data)
+
+# A player's games, newest first, paged with keyset cursors:
+# ?limit=N&cursor=<next_cursor from the previous page>
+@chess_bp.route('/api/games/<int:user_id>')
+def get_game_history(user_id):
+    try:
+        limit = page_size()
+        query = Game.query.filter(Game.user_id == user_id)
+        if request.args.get('cursor'):
+            query = query.filter(after_cursor([Game.date_played, Game.id], request.args['cursor'], descending=True))
+        games = query.order_by(Game.date_played.desc(), Game.id.desc()).limit(limit + 1).all()
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    games, next_cursor = keyset_page(games, limit, lambda g: (g.date_played, g.id))
     return jsonify({
-        'wins': stats.wins,
-        'losses': stats.losses,
-        'draws': stats.draws,
-        'rating': stats.rating,
-        'best_move': stats.best_move if hasattr(stats, 'best_move') else None,
-        'best_move_score': stats.best_move_score if hasattr(stats, 'best_move_score') else None,
-        'worst_move': stats.worst_move if hasattr(stats, 'worst_move') else None,
-        'worst_move_score': stats.worst_move_score if hasattr(stats, 'worst_move_score') else None,
-        'average_score': stats.average_score if hasattr(stats, 'average_score') else None,
-        'last_game_id': stats.last_game_id
+        'games': [{
+            'id': g.id,
+            'white': g.white_player,
+            'black': g.black_player,
+            'result': g.result,
+            'date_played': g.date_played.isoformat() if g.date_played else None,
+            'analyzed': g.analyzed,
+            'average_score': game_average(g),
+            'blunders': g.blunders or 0
+        } for g in games],
+        'next_cursor': next_cursor
+    })
+
+# Every position of a game with the move that led to it, for the replay board
+@chess_bp.route('/api/replay/<int:game_id>')
+def get_game_replay(game_id):
+    game = Game.query.get(game_id)
+    if not game:
+        return jsonify({'error': 'Game not found'}), 404
+    return jsonify({
+        'game_id': game.id,
+        'white': game.white_player,
+        'black': game.black_player,
+        'result': game.result,
+        'plies': [ply_to_dict(row) for row in load_game_plies(game)]
     })
 
+# One position of a game, looked up by ply without replaying the moves before it
+@chess_bp.route('/api/replay/<int:game_id>/<int:ply>')
+def get_game_replay_ply(game_id, ply):
+    row = db.session.query(GamePly.ply, GamePly.san, GamePly.uci, GamePly.fen) \
+        .filter_by(game_id=game_id, ply=ply).first()
+    if row:
+        return jsonify(ply_to_dict(row._asdict()))
+
+    # Not stored: a game saved before plies were, or a ply past the end
+    game = Game.query.get(game_id)
+    if not game:
+        return jsonify({'error': 'Game not found'}), 404
+    plies = load_game_plies(game)
+    if ply >= len(plies):
+        return jsonify({'error': 'Ply not found'}), 404
+    return jsonify(ply_to_dict(plies[ply]))
+
 @chess_bp.route('/api/game_analysis/<int:game_id>')
+@cached_json('game_analysis', 'game_id')
 def get_game_analysis(game_id):
-    moves = Move.query.filter_by(game_id=game_id).order_by(Move.move_number).all()
+    # Analysed games keep their graded moves in one small blob instead of a
+    # row per move. Sent with the default no-cache like the other routes, as
+    # `flask reanalyze-games` can rewrite a finished game's analysis.
     return jsonify([{
-        'move_number': m.move_number,
-        'score': m.score,
-        'is_blunder': m.is_blunder,
-        'is_brilliant': m.is_brilliant,
-        'comment': m.comment
-    } for m in moves])
+        'move_number': m['move_number'],
+        'score': m['score'],
+        'is_blunder': m['is_blunder'],
+        'is_brilliant': m['is_brilliant'],
+        'comment': m['comment']
+    } for m in load_analysis(game_id)])
     
 @chess_bp.route('/api/record_moves_batch', methods=['POST'])
+@retry_on_lock
 def record_moves_batch():
+    """Record many moves in one transaction.
+
+    The whole payload is validated first and nothing is stored if any row is
+    invalid; the response then lists the error for each bad row. Rows are
+    upserted on (game_id, move_number), so retrying a batch is safe.
+    """
     data = request.json
     moves = data.get('moves', [])
     if not moves or not isinstance(moves, list):
         return jsonify({'error': 'No moves provided'}), 400
     try:
-        move_objects = []
-        for move in moves:
-            # Clamp score to [0, 10] if needed
-            score = move.get('score', 0)
-            if not isinstance(score, (int, float)):
-                score = 0
-            score = max(0, min(10, score))
-            move_obj = Move(
-                game_id=move['game_id'],
-                move_number=move['move_number'],
-                game_state=move['game_state'],
-                score=score,
-                is_blunder=move.get('is_blunder', False),
-                is_brilliant=move.get('is_brilliant', False),
-                comment=move.get('comment', '')
-            )
-            move_objects.append(move_obj)
-        db.session.bulk_save_objects(move_objects)
+        rows, errors = validate_moves(moves)
+        if errors:
+            return jsonify({'error': 'Invalid moves', 'errors': errors}), 400
+        saved = store_moves(rows)
         db.session.commit()
-        return jsonify({'status': 'success', 'moves_saved': len(move_objects)})
+        invalidate_move_responses({row['game_id'] for row in rows})
+        return jsonify({'status': 'success', 'moves_saved': saved})
+    except DatabaseBusy:
+        raise
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
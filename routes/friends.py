@@ -1,45 +1,90 @@
 from flask import Blueprint, abort, redirect, request, jsonify, render_template, session, url_for
 from models import db, User, Friendship, PlayerStats
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, select, union_all
+from services.database import DatabaseBusy, retry_on_lock
+from services.pagination import InvalidCursor, after_cursor, keyset_page, page_size
+from services.player_search import player_to_dict, players_query, search_players as find_players
+from services.response_cache import cached_json, invalidate_responses
+from services.suggestions import get_suggestion_cache, suggest_players
 
 friends_bp = Blueprint('friends', __name__)
 
+# The lists below are paged with keyset cursors, oldest friendship first:
+# ?limit=N&cursor=<next_cursor from the previous page>
 @friends_bp.route('/api/friends/<int:user_id>')
+@cached_json('friends', 'user_id')
 def get_friends(user_id):
-    friends = Friendship.query.filter(
-        ((Friendship.user_id == user_id) | (Friendship.friend_id == user_id)) &
-        (Friendship.status == 'accepted')
-    ).all()
-    friend_ids = []
-    for f in friends:
-        if f.user_id == user_id:
-            friend_ids.append(f.friend_id)
-        else:
-            friend_ids.append(f.user_id)
-    friends_data = User.query.filter(User.id.in_(friend_ids)).all()
-    return jsonify([{
-        'id': f.id,
-        'username': f.username,
-        'rating': f.stats.rating if f.stats else 1000,
-        'last_active': f.last_login.isoformat() if f.last_login else None
-    } for f in friends_data])
+    try:
+        limit = page_size()
+        cursor = request.args.get('cursor')
+
+        # One page from each side of the friendship, each read in order
+        # from its index, then merged
+        def side(player_id, own_id):
+            query = select(Friendship.id, Friendship.created_at, player_id.label('player_id')) \
+                .where(own_id == user_id, Friendship.status == 'accepted')
+            if cursor:
+                query = query.where(after_cursor([Friendship.created_at, Friendship.id], cursor))
+            return query.order_by(Friendship.created_at, Friendship.id).limit(limit + 1).subquery().select()
+
+        page = union_all(side(Friendship.friend_id, Friendship.user_id),
+                         side(Friendship.user_id, Friendship.friend_id)).subquery()
+        friends = players_query(page.c.id.label('friendship_id'), page.c.created_at) \
+            .join(page, page.c.player_id == User.id) \
+            .order_by(page.c.created_at, page.c.id).limit(limit + 1).all()
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    # Every page carries the full count for the friends badge, counted from
+    # the index on each side of the friendship
+    def count(own_id):
+        return select(func.count()).select_from(Friendship) \
+            .where(own_id == user_id, Friendship.status == 'accepted').scalar_subquery()
+    total = db.session.query(count(Friendship.user_id) + count(Friendship.friend_id)).scalar()
+
+    friends, next_cursor = keyset_page(friends, limit, lambda f: (f.created_at, f.friendship_id))
+    return jsonify({
+        # With each friend's record, so the cards need no request per friend
+        'friends': [player_to_dict(f) for f in friends],
+        'total': total,
+        'next_cursor': next_cursor
+    })
 
 @friends_bp.route('/api/friend_requests/<int:user_id>')
+@cached_json('friend_requests', 'user_id')
 def get_friend_requests(user_id):
-    requests = Friendship.query.filter_by(
-        friend_id=user_id,
-        status='pending'
-    ).all()
-    requesters = User.query.filter(User.id.in_([r.user_id for r in requests])).all()
-    return jsonify([{
-        'id': r.id,
-        'username': u.username,
-        'request_date': r.created_at.isoformat(),
-        'rating': u.stats.rating if u.stats else 1000
-    } for r, u in zip(requests, requesters)])
+    try:
+        limit = page_size()
+        query = players_query(Friendship.id.label('friendship_id'), Friendship.created_at) \
+            .join(Friendship, Friendship.user_id == User.id) \
+            .filter(Friendship.friend_id == user_id, Friendship.status == 'pending')
+        if request.args.get('cursor'):
+            query = query.filter(after_cursor([Friendship.created_at, Friendship.id], request.args['cursor']))
+        requests = query.order_by(Friendship.created_at, Friendship.id).limit(limit + 1).all()
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    total = db.session.query(func.count(Friendship.id)) \
+        .filter(Friendship.friend_id == user_id, Friendship.status == 'pending').scalar()
+
+    requests, next_cursor = keyset_page(requests, limit, lambda r: (r.created_at, r.friendship_id))
+    return jsonify({
+        'requests': [{
+            'id': r.friendship_id,
+            'username': r.username,
+            'request_date': r.created_at.isoformat(),
+            'rating': r.rating if r.rating is not None else 1000
+        } for r in requests],
+        'total': total,
+        'next_cursor': next_cursor
+    })
+
+def invalidate_friend_responses(*user_ids):
+    invalidate_responses('friends', *user_ids)
+    invalidate_responses('friend_requests', *user_ids)
 
 @friends_bp.route('/api/friend_action', methods=['POST'])
+@retry_on_lock
 def handle_friend_action():
     data = request.get_json()
     if not data:
@@ -74,10 +119,14 @@ def handle_friend_action():
             )
             db.session.add(friendship)
             db.session.commit()
+            get_suggestion_cache().invalidate(user_id, friend_id)
+            invalidate_friend_responses(user_id, friend_id)
             return jsonify({
                 'status': 'success',
                 'message': 'Friend request sent'
             })
+        except DatabaseBusy:
+            raise
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
@@ -91,6 +140,7 @@ def handle_friend_action():
     if not friendship:
         return jsonify({'error': 'Friendship not found'}), 404
 
+    players = (friendship.user_id, friendship.friend_id)
     if action == 'accept':
         friendship.status = 'accepted'
     elif action == 'reject':
@@ -101,6 +151,8 @@ def handle_friend_action():
         return jsonify({'error': 'Invalid action'}), 400
 
     db.session.commit()
+    get_suggestion_cache().invalidate(*players)
+    invalidate_friend_responses(*players)
     return jsonify({'status': 'success'})
 
 @friends_bp.route('/api/search_players')
@@ -108,47 +160,20 @@ def search_players():
     q = request.args.get('q', '').strip()
     exclude = request.args.get('exclude', type=int)
     if not q:
-        return jsonify([])
-
-    query = User.query.filter(User.username.ilike(f'%{q}%'))
-    if exclude:
-        query = query.filter(User.id != exclude)
-    users = query.limit(10).all()
-    return jsonify([{
-        'id': u.id,
-        'username': u.username,
-        'rating': u.stats.rating if u.stats else 1000,
-        'wins': u.stats.wins if u.stats else 0,
-        'losses': u.stats.losses if u.stats else 0,
-        'draws': u.stats.draws if u.stats else 0,
-        'last_active': u.last_login.isoformat() if u.last_login else None
-    } for u in users])
+        return jsonify({'query': q, 'results': []})
+
+    # The query is echoed back so a client firing a request per keystroke
+    # can drop responses to anything but what's in the box now
+    return jsonify({'query': q, 'results': [player_to_dict(u) for u in find_players(q, exclude)]})
 
 @friends_bp.route('/api/suggestions/<int:user_id>')
 def get_suggestions(user_id):
-    friends = Friendship.query.filter(
-        (Friendship.user_id == user_id) | 
-        (Friendship.friend_id == user_id)
-    ).all()
-    friend_ids = {user_id}
-    for f in friends:
-        if f.user_id == user_id:
-            friend_ids.add(f.friend_id)
-        else:
-            friend_ids.add(f.user_id)
-    suggestions = User.query.filter(
-        User.id != user_id,
-        ~User.id.in_(friend_ids)
-    ).order_by(func.random()).limit(5).all()
-    return jsonify([{
-        'id': u.id,
-        'username': u.username,
-        'rating': u.stats.rating if u.stats else 1000,
-        'wins': u.stats.wins if u.stats else 0,
-        'losses': u.stats.losses if u.stats else 0,
-        'draws': u.stats.draws if u.stats else 0,
-        'last_active': u.last_login.isoformat() if u.last_login else None
-    } for u in suggestions])
+    cache = get_suggestion_cache()
+    suggestions = cache.get(user_id)
+    if suggestions is None:
+        suggestions = suggest_players(user_id)
+        cache.put(user_id, suggestions)
+    return jsonify(suggestions)
 
 @friends_bp.route('/api/get_friendship')
 def get_friendship():
@@ -1,11 +1,18 @@
 from flask import Blueprint, request, jsonify, render_template
 from datetime import datetime
-from models import db, Game, Move
+from models import db, Game, GamePly, Move
 from sqlalchemy import func
+from services.moves import invalidate_move_responses, store_moves, validate_moves
+from services.database import DatabaseBusy, retry_on_lock
+from services.pagination import InvalidCursor, after_cursor, decode_cursor, keyset_page, page_size
+from services.analysis_queue import player_color
+from services.game_codec import unpack_analysis
+from services.replay import load_game_plies, ply_for_move
 
 move_bp = Blueprint('move', __name__)
 
 @move_bp.route('/record_move', methods=['POST'])
+@retry_on_lock
 def record_move():
     """Record a move in the database."""
     try:
@@ -17,50 +24,85 @@ def record_move():
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        # Create new move record
-        new_move = Move(
-            game_id=data['game_id'],
-            move_number=data['move_number'],
-            game_state=data['game_state'],
-            score=data['score'],
-            is_blunder=data['is_blunder'],
-            is_brilliant=data['is_brilliant'],
-            comment=data['comment']
-        )
-        
-        db.session.add(new_move)
+        # Same validation and upsert as the batch endpoint, for a single move
+        rows, errors = validate_moves([data])
+        if errors:
+            return jsonify({'error': errors[0]['error']}), 400
+        store_moves(rows)
         db.session.commit()
-        
+        invalidate_move_responses([data['game_id']])
+
+        # None when the game's analysis is packed (PACK_ANALYSIS), as it has no Move rows
+        new_move = Move.query.filter_by(game_id=data['game_id'], move_number=data['move_number']).first()
         return jsonify({
             'success': True,
-            'move_id': new_move.id
+            'move_id': new_move.id if new_move else None
         })
     
+    except DatabaseBusy:
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @move_bp.route('/get_game_moves', methods=['GET'])
 def get_game_moves():
-    """Get all moves for a specific game."""
+    """Get the moves of a game, a page at a time.
+
+    Pass ``cursor`` from the previous page's next_cursor for the next one.
+    """
     try:
-        game_id = request.args.get('game_id')
+        game_id = request.args.get('game_id', type=int)
         if not game_id:
             return jsonify({'error': 'Missing game_id parameter'}), 400
-            
-        moves = Move.query.filter_by(game_id=game_id).order_by(Move.move_number).all()
-        
+        game = Game.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+
+        limit = page_size()
+        if game.packed_analysis is not None:
+            # An analysed game's moves are all in its packed analysis
+            after = decode_cursor(request.args['cursor'], [Move.move_number])[0] if request.args.get('cursor') else 0
+            moves = [dict(row, id=None, game_state=None) for row in unpack_analysis(game.packed_analysis)
+                     if row['move_number'] > after][:limit + 1]
+        else:
+            query = db.session.query(Move.id, Move.move_number, Move.game_state, Move.score) \
+                .filter(Move.game_id == game_id)
+            if request.args.get('cursor'):
+                query = query.filter(after_cursor([Move.move_number], request.args['cursor']))
+            moves = [row._asdict() for row in query.order_by(Move.move_number).limit(limit + 1)]
+        moves, next_cursor = keyset_page(moves, limit, lambda m: (m['move_number'],))
+
+        # Moves only hold the player's moves by move number; the SAN and UCI
+        # come from the plies stored when the game was saved, or decoded from
+        # its packed moves when none were
+        color = player_color(game)
+        ply_numbers = [ply_for_move(move['move_number'], color) for move in moves]
+        plies = {row.ply: row._asdict() for row in db.session.query(
+            GamePly.ply, GamePly.san, GamePly.uci, GamePly.fen
+        ).filter(GamePly.game_id == game_id, GamePly.ply.in_(set(ply_numbers)))}
+        if moves and not plies:
+            plies = {row['ply']: row for row in load_game_plies(game)}
+
+        def move_to_dict(move, ply_number):
+            ply = plies.get(ply_number)
+            return {
+                'id': move['id'],
+                'move_number': move['move_number'],
+                'ply': ply_number,
+                'san': ply['san'] if ply else None,
+                'uci': ply['uci'] if ply else None,
+                'fen': ply['fen'] if ply else move['game_state'],
+                'score': move['score']
+            }
+
         return jsonify({
             'success': True,
-            'moves': [{
-                'id': move.id,
-                'move_number': move.move_number,
-                'san': move.san,
-                'uci': move.uci,
-                'fen': move.fen,
-                'score': move.score
-            } for move in moves]
+            'next_cursor': next_cursor,
+            'moves': [move_to_dict(move, ply) for move, ply in zip(moves, ply_numbers)]
         })
-    
+
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
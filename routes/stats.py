@@ -1,9 +1,14 @@
-from flask import Blueprint, request, jsonify
-from models import db, PlayerStats, Game, User, Move
+from flask import Blueprint, current_app, request, jsonify
+from models import db, PlayerStats, Game, User
+from services.analysis_queue import player_color
+from services.leaderboard import LEADERBOARD_SIZE, player_rank, top_players
+from services.replay import load_game_plies, ply_for_move
+from services.stored_analysis import load_analysis
 from sqlalchemy import func
+import logging
 import math
-import chess
-import chess.pgn
+
+logger = logging.getLogger(__name__)
 
 stats_bp = Blueprint('stats', __name__)
 
@@ -25,7 +30,7 @@ def get_player_stats_by_id(user_id):
             db.session.add(stats)
             db.session.commit()
     except Exception as e:
-        print(f"Error in get_player_stats_by_id: {str(e)}")
+        logger.exception('Error in get_player_stats_by_id')
         return jsonify({'error': str(e)}), 500
 
 @stats_bp.route('/api/game_analysis/<int:game_id>')
@@ -41,48 +46,51 @@ def get_game_analysis(game_id):
             return jsonify({'error': 'Game not analyzed yet'}), 404
             
         # Get all moves with analysis for this game
-        moves = Move.query.filter_by(game_id=game_id)\
-                         .order_by(Move.move_number)\
-                         .all()
+        moves = load_analysis(game_id)
         
         if not moves:
             return jsonify({'error': 'No moves found for this game'}), 404
+
+        # Packed analyses leave the positions to the game's plies
+        color = player_color(game)
+        plies = load_game_plies(game) if any(m['game_state'] is None for m in moves) else []
+        def fen(m):
+            ply = ply_for_move(m['move_number'], color)
+            return m['game_state'] or (plies[ply]['fen'] if ply < len(plies) else None)
             
         # Format the move data for response
         analysis_data = [{
-            'move_number': m.move_number,
-            'score': m.score,
-            'is_blunder': m.is_blunder,
-            'is_brilliant': m.is_brilliant,
-            'comment': m.comment,
-            'fen': m.game_state  # Use game_state instead of get_fen_for_move
+            'move_number': m['move_number'],
+            'score': m['score'],
+            'is_blunder': m['is_blunder'],
+            'is_brilliant': m['is_brilliant'],
+            'comment': m['comment'],
+            'fen': fen(m)
         } for m in moves]
 
         return jsonify(analysis_data)
         
     except Exception as e:
-        print(f"Error in get_game_analysis: {str(e)}")
+        logger.exception('Error in get_game_analysis')
         return jsonify({'error': str(e)}), 500
 
-def get_fen_for_move(game, move_number):
-    """
-    Helper function to get the FEN after a specific move number
-    """
+# Global top players; ?limit=N for more or fewer than LEADERBOARD_SIZE
+@stats_bp.route('/api/leaderboard')
+def get_leaderboard_top():
     try:
-        # Get all moves up to the requested move number
-        moves = Move.query.filter_by(game_id=game.id)\
-                   .filter(Move.move_number <= move_number)\
-                   .order_by(Move.move_number)\
-                   .all()
-        
-        # Replay the moves to get the position
-        board = chess.Board()
-        for move in moves:
-            chess_move = chess.Move.from_uci(move.uci)
-            board.push(chess_move)
-            
-        return board.fen()
-        
+        limit = request.args.get('limit', type=int) or LEADERBOARD_SIZE
+        limit = max(1, min(limit, current_app.config.get('MAX_PAGE_SIZE', 200)))
+        return jsonify({'players': top_players(limit)})
     except Exception as e:
-        print(f"Error getting FEN for move {move_number}: {str(e)}")
-        return None
+        return jsonify({'error': str(e)}), 500
+
+# A player's global rank and percentile, and their rank among their friends
+@stats_bp.route('/api/leaderboard/<int:user_id>')
+def get_leaderboard_rank(user_id):
+    try:
+        rank = player_rank(user_id)
+        if rank is None:
+            return jsonify({'error': 'Player has no rating yet'}), 404
+        return jsonify(rank)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
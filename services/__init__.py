@@ -0,0 +1,3 @@
+# This file can be left empty.
+# It marks the 'services' directory as a Python package so the routes can share
+# long-lived helpers (engines, caches, background jobs) between requests.
@@ -0,0 +1,231 @@
+import io
+import platform
+import time
+
+import chess
+import chess.engine
+import chess.pgn
+from flask import current_app, has_request_context, request
+
+from services.async_engine import get_engine_service
+from services.difficulty import engine_options, search_stats
+from services.engine_pool import get_engine_pool
+from services.eval_cache import FULL_STRENGTH, get_evaluation_cache
+
+# Search depth used to grade the player's moves
+MOVE_GRADE_DEPTH = 15
+
+# Budget for grading a move while the player waits; only the request's latency
+# budget caps its time. Shaped like the DIFFICULTY_PROFILES for search_limit()
+# and engine_options(). Grades always come from full-strength searches, so only
+# those are reused from the evaluation cache.
+GRADING_PROFILE = {
+    'skill_level': FULL_STRENGTH, 'depth': MOVE_GRADE_DEPTH, 'cache_depth': MOVE_GRADE_DEPTH - 2,
+    'nodes': None, 'time': None,
+}
+
+
+# Helper to get Stockfish path from app config or platform
+def get_stockfish_path():
+    if hasattr(current_app, 'config') and 'STOCKFISH_PATH' in current_app.config:
+        return current_app.config['STOCKFISH_PATH']
+    if platform.system() == "Darwin":
+        return "./static/stockfish/stockfish-macos"
+    elif platform.system() == "Windows":
+        return "./static/stockfish/stockfish.exe"
+    elif platform.system() == "Linux":
+        return "./static/stockfish/stockfish-linux"
+    else:
+        raise OSError("Unsupported operating system")
+
+
+# Borrow a warm engine from the process-wide pool instead of spawning one per request.
+# With ENGINE_BACKEND = 'async' searches are instead queued on the shared asyncio
+# engine service, which holds an engine only for the length of each search.
+def get_engine(options=None):
+    if current_app.config.get('ENGINE_BACKEND') == 'async':
+        service = get_engine_service(
+            get_stockfish_path(),
+            size=current_app.config.get('ENGINE_POOL_SIZE', 2),
+            checkout_timeout=current_app.config.get('ENGINE_POOL_TIMEOUT', 10),
+        )
+        # Werkzeug's and gunicorn's servers hand the view the client socket
+        client = None
+        if has_request_context():
+            client = request.environ.get('werkzeug.socket') or request.environ.get('gunicorn.socket')
+        return service.engine(options, timeout=current_app.config.get('ENGINE_SEARCH_TIMEOUT'), client=client)
+
+    pool = get_engine_pool(
+        get_stockfish_path(),
+        size=current_app.config.get('ENGINE_POOL_SIZE', 2),
+        timeout=current_app.config.get('ENGINE_POOL_TIMEOUT', 10),
+    )
+    return pool.engine(options)
+
+
+def get_eval_cache():
+    return get_evaluation_cache(
+        max_size=current_app.config.get('EVAL_CACHE_SIZE', 50000),
+        path=current_app.config.get('EVAL_CACHE_PATH'),
+    )
+
+
+# Analyse each board to the given depth, only starting an engine search for
+# positions the evaluation cache can't already answer. accept_depths optionally
+# lowers, per board, the cached depth that is good enough to reuse. limit
+# replaces the plain depth limit for the searches, e.g. to add a time budget,
+# and label = (kind, difficulty) records what each search cost in search_stats,
+# against the limit's time budget. Cached results are only reused for searches
+# run with the same engine options.
+def analyse_positions(boards, depth, options=None, accept_depths=None, limit=None, label=None):
+    cache = get_eval_cache()
+    accept_depths = accept_depths or [depth] * len(boards)
+    limit = limit or chess.engine.Limit(depth=depth)
+    infos = [cache.get(board, min_depth, options) for board, min_depth in zip(boards, accept_depths)]
+    missing = [i for i, info in enumerate(infos) if info is None]
+    if missing:
+        with get_engine(options) as engine:
+            for i in missing:
+                started = time.perf_counter()
+                infos[i] = engine.analyse(boards[i], limit)
+                if label:
+                    search_stats.record(*label, infos[i], time.perf_counter() - started, limit.time)
+                cache.put(boards[i], infos[i], options)
+    return infos
+
+
+def score_to_cp(score_obj):
+    if isinstance(score_obj, chess.engine.Cp):
+        return score_obj.score()
+    elif isinstance(score_obj, chess.engine.Mate):
+        mate_val = score_obj.mate()
+        return 100000 if mate_val > 0 else -100000
+    else:
+        return 0
+
+
+def grade_move(board_before, board_after, info_before, info_after):
+    """Score a move 0-10 from the engine evaluations either side of it.
+
+    Returns a dict with the centipawn loss, the score and a feedback message.
+    """
+    # Check if the player checkmated the AI
+    if board_after.is_checkmate():
+        return {
+            'cpl': 0,
+            'score': 10,
+            'feedback': "Checkmate! You won the game."
+        }
+
+    turn = board_before.turn  # True for white, False for black
+
+    if turn:
+        score_before = info_before['score'].white()
+        score_after = info_after['score'].white()
+    else:
+        score_before = info_before['score'].black()
+        score_after = info_after['score'].black()
+
+    eval_before = score_to_cp(score_before)
+    eval_after = score_to_cp(score_after)
+
+    cpl = abs(eval_before - eval_after)
+
+    if score_after.is_mate():
+        mate_val = score_after.mate()
+        if mate_val > 0:
+            feedback = f"You're delivering mate in {mate_val}"
+            score_value = 10
+        else:
+            feedback = f"Opponent has mate in {abs(mate_val)}"
+            score_value = 0
+    elif score_before.is_mate():
+        mate_val = score_before.mate()
+        if mate_val > 0:
+            feedback = f"You were delivering mate in {mate_val}, don't miss it!"
+            score_value = 5
+        else:
+            feedback = f"Opponent was mating in {abs(mate_val)}, stay alert!"
+            score_value = 1
+    else:
+        if cpl == 0:
+            feedback = "Best move!"
+            score_value = 10
+        elif cpl < 50:
+            feedback = "Good move."
+            score_value = 8
+        elif cpl < 150:
+            feedback = "Inaccuracy."
+            score_value = 5
+        elif cpl < 400:
+            feedback = "Mistake."
+            score_value = 3
+        else:
+            feedback = "Blunder!"
+            score_value = 0
+
+    return {
+        'cpl': cpl,
+        'score': score_value,
+        'feedback': feedback
+    }
+
+
+def read_pgn(pgn):
+    """Parse PGN text into a game, raising ValueError if it can't be read."""
+    game = chess.pgn.read_game(io.StringIO(pgn))
+    if game is None:
+        raise ValueError('Could not parse PGN')
+    if game.errors:
+        raise ValueError(f'Invalid PGN: {game.errors[0]}')
+    return game
+
+
+def game_boards(pgn):
+    """The starting position of a PGN game followed by the position after each move."""
+    game = read_pgn(pgn)
+    board = game.board()
+    boards = [board.copy(stack=False)]
+    for move in game.mainline_moves():
+        board.push(move)
+        boards.append(board.copy(stack=False))
+    return boards
+
+
+def terminal_info(board):
+    """A fixed analyse()-style result for a position with no legal moves."""
+    score = chess.engine.Mate(0) if board.is_checkmate() else chess.engine.Cp(0)
+    return {'score': chess.engine.PovScore(score, board.turn)}
+
+
+def grade_game(boards, infos):
+    """Grade every ply given one analysis per position from game_boards().
+
+    Returns one dict per ply with the ply index, the side that moved, the
+    player-facing move number, the FEN after the move and the grade_move()
+    result.
+    """
+    plies = []
+    for ply, (before, after) in enumerate(zip(boards, boards[1:]), start=1):
+        grade = grade_move(before, after, infos[ply - 1], infos[ply])
+        plies.append({
+            'ply': ply,
+            'color': before.turn,
+            'move_number': before.fullmove_number,
+            'fen': after.fen(),
+            **grade,
+        })
+    return plies
+
+
+def analyse_game(pgn, depth=MOVE_GRADE_DEPTH):
+    """Grade every ply of a PGN game using a single engine checkout."""
+    boards = game_boards(pgn)
+
+    # Positions with no legal moves need no search
+    searchable = [i for i, b in enumerate(boards) if not b.is_game_over()]
+    infos = [terminal_info(b) for b in boards]
+    results = analyse_positions([boards[i] for i in searchable], depth, engine_options(GRADING_PROFILE))
+    for i, info in zip(searchable, results):
+        infos[i] = info
+    return grade_game(boards, infos)
@@ -0,0 +1,214 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import chess
+from flask import current_app
+
+from models import db, AnalysisJob, Game
+from services.analysis import MOVE_GRADE_DEPTH, analyse_game, read_pgn
+from services.player_stats import update_move_aggregates
+from services.response_cache import invalidate_responses
+from services.stored_analysis import load_analysis, replace_analysis
+
+logger = logging.getLogger(__name__)
+
+# A game with a job in one of these states doesn't need another one
+ACTIVE_STATUSES = ('queued', 'running', 'done')
+
+NO_PLAYER_SIDE = "Game has no side played by 'Player' to grade"
+
+
+def enqueue_game_analysis(game_id):
+    """Add an analysis job for a game to the session. The caller commits.
+
+    Returns the existing job instead if the game is already queued, running or
+    analysed, so calling this twice for one game is harmless.
+    """
+    job = AnalysisJob.query.filter(
+        AnalysisJob.game_id == game_id,
+        AnalysisJob.status.in_(ACTIVE_STATUSES)
+    ).order_by(AnalysisJob.id.desc()).first()
+    if job is None:
+        job = AnalysisJob(game_id=game_id, status='queued')
+        db.session.add(job)
+    return job
+
+
+def game_needs_analysis(pgn, result):
+    """Games that ended on the board are analysed. Resigned or abandoned games
+    are not, since their scores are left out of the stats pages."""
+    if result not in ('1-0', '0-1', '1/2-1/2'):
+        return False
+    try:
+        game = read_pgn(pgn)
+    except ValueError:
+        return False
+    return game.end().board().is_game_over(claim_draw=True)
+
+
+def wake_analysis_worker():
+    """Start the worker threads for this process if needed and let them know
+    there is work. Call after committing new jobs."""
+    app = current_app._get_current_object()
+    get_analysis_worker(app).notify()
+
+
+def job_to_dict(job):
+    return {
+        'job_id': job.id,
+        'game_id': job.game_id,
+        'status': job.status,
+        'moves_analyzed': job.moves_analyzed,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def player_color(game):
+    """The side the human played, or None if the game doesn't say."""
+    if game.white_player == 'Player':
+        return chess.WHITE
+    if game.black_player == 'Player':
+        return chess.BLACK
+    return None
+
+
+def has_player_side():
+    """Filter for the games player_color() can place, i.e. the gradeable ones."""
+    return (Game.white_player == 'Player') | (Game.black_player == 'Player')
+
+
+def save_game_analysis(game, plies):
+    """Replace a game's graded moves with graded plies. The caller commits.
+
+    Only the human's moves are stored, as the stats pages expect, as Move
+    rows or, with PACK_ANALYSIS on, packed (services/stored_analysis.py).
+    Moves are keyed by move number, which both sides share, so a game with
+    no 'Player' side raises ValueError.
+    """
+    color = player_color(game)
+    if color is None:
+        raise ValueError(NO_PLAYER_SIDE)
+    rows = [{
+        'move_number': ply['move_number'],
+        'game_state': ply['fen'],
+        'score': ply['score'],
+        'is_blunder': ply['feedback'] == 'Blunder!',
+        # A best move isn't brilliant; the engine grade has no criterion for that
+        'is_brilliant': False,
+        'comment': ply['feedback'],
+    } for ply in plies if ply['color'] == color]
+
+    old_rows = load_analysis(game.id)
+    replace_analysis(game, rows, pack=current_app.config['PACK_ANALYSIS'])
+    update_move_aggregates(game, rows, old_rows)
+    game.analyzed = True
+    return len(rows)
+
+
+def run_analysis_job(job_id):
+    """Analyse the job's game and replace its graded moves in one transaction."""
+    job = db.session.get(AnalysisJob, job_id)
+    game = db.session.get(Game, job.game_id)
+    try:
+        if player_color(game) is None:
+            raise ValueError(NO_PLAYER_SIDE)
+        plies = analyse_game(game.pgn, depth=current_app.config.get('ANALYSIS_DEPTH', MOVE_GRADE_DEPTH))
+        job.moves_analyzed = save_game_analysis(game, plies)
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        game_id, user_id = game.id, game.user_id
+        db.session.commit()
+        invalidate_responses('game_analysis', game_id)
+        invalidate_responses('player_stats', user_id)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Analysis job %s failed', job_id)
+        job = db.session.get(AnalysisJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+class AnalysisWorker:
+    """Background threads that drain the AnalysisJob table.
+
+    Jobs are claimed with a conditional UPDATE so several threads, or several
+    server processes sharing the database, never run the same job twice. A job
+    left 'running' for longer than ``stale_after`` seconds (its worker died)
+    becomes claimable again.
+    """
+
+    def __init__(self, app, workers=1, poll_interval=5.0, stale_after=600):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._wake = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def notify(self):
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f'analysis-worker-{i}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    while True:
+                        job_id = self._claim()
+                        if job_id is None:
+                            break
+                        run_analysis_job(job_id)
+                except Exception:
+                    logger.exception('Analysis worker error')
+                finally:
+                    db.session.remove()
+
+    def _claim(self):
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.stale_after)
+        claimable = (AnalysisJob.status == 'queued') | (
+            (AnalysisJob.status == 'running') & (AnalysisJob.started_at < stale)
+        )
+        while True:
+            job = AnalysisJob.query.filter(claimable).order_by(AnalysisJob.id).first()
+            if job is None:
+                db.session.rollback()
+                return None
+            claimed = AnalysisJob.query.filter(AnalysisJob.id == job.id, claimable).update(
+                {'status': 'running', 'started_at': now, 'error': None},
+                synchronize_session=False
+            )
+            db.session.commit()
+            if claimed:
+                return job.id
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_analysis_worker(app):
+    with _workers_lock:
+        worker = _workers.get(app)
+        if worker is None:
+            worker = AnalysisWorker(
+                app,
+                workers=app.config.get('ANALYSIS_WORKERS', 1),
+                poll_interval=app.config.get('ANALYSIS_POLL_INTERVAL', 5.0),
+            )
+            _workers[app] = worker
+        return worker
@@ -0,0 +1,324 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import queue
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import chess.engine
+from werkzeug.exceptions import ClientDisconnected
+
+from services.engine_pool import EnginePoolExhausted
+
+logger = logging.getLogger(__name__)
+
+# How often a view waiting on a search checks that its client is still there
+DISCONNECT_POLL_SECONDS = 0.25
+
+
+class EngineSearchTimeout(Exception):
+    """Raised when a search does not finish within the request's time budget."""
+
+
+class AsyncEngineService:
+    """A few UCI engines driven from one asyncio event loop.
+
+    The loop runs on a background thread and owns every engine process. Views
+    submit searches to it and wait on the result, so engines are only held for
+    the length of a single search rather than a whole request, and many games
+    can share a small number of processes. A search that runs past its timeout
+    is cancelled, which sends ``stop`` to the engine so it is free again.
+    """
+
+    def __init__(self, path, size=2, checkout_timeout=10.0):
+        self.path = path
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+
+        self.searches = 0
+        self.cancelled = 0
+        self.restarted = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='engine-service', daemon=True)
+        self._thread.start()
+        self._idle = None
+        self._engines = []
+        self._touched = set()
+        self._call(self._start()).result()
+
+    @contextmanager
+    def engine(self, options=None, timeout=None, client=None):
+        """Yield a handle whose play()/analyse() run on the shared engines.
+
+        ``client`` is the request's socket, if the server exposes it. While a
+        search runs the socket is polled, and once the client has hung up the
+        search is cancelled and ClientDisconnected raised. Searches still
+        running when the block exits are cancelled too.
+        """
+        handle = EngineHandle(self, options or {}, timeout, client)
+        try:
+            yield handle
+        finally:
+            handle.cancel()
+
+    def stream(self, board, limit, options=None, **kwargs):
+        """Start an engine.analysis() on the loop; returns (future, queue).
+
+        Each info the engine reports is put on the queue, followed by None once
+        the search is over. Cancelling the future stops the search.
+        """
+        infos = queue.Queue()
+        future = self._call(self._stream(board.copy(), limit, options or {}, kwargs, infos))
+        future.add_done_callback(lambda _: infos.put(None))
+        return future, infos
+
+    def submit(self, method, board, limit, options=None, **kwargs):
+        """Start a search on the event loop and return a concurrent Future."""
+        return self._call(self._search(method, board.copy(), limit, options or {}, kwargs))
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize() if self._idle is not None else 0,
+            'searches': self.searches,
+            'cancelled': self.cancelled,
+            'restarted': self.restarted,
+        }
+
+    def close(self):
+        if not self._loop.is_running():
+            return
+        try:
+            self._call(self._stop()).result(timeout=5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _start(self):
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._spawn())
+
+    async def _stop(self):
+        for engine in list(self._engines):
+            await self._discard(engine)
+
+    async def _spawn(self):
+        _, engine = await chess.engine.popen_uci(self.path)
+        self._engines.append(engine)
+        return engine
+
+    async def _discard(self, engine):
+        if engine in self._engines:
+            self._engines.remove(engine)
+        try:
+            await asyncio.wait_for(engine.quit(), 2)
+        except Exception:
+            engine.transport.close()
+
+    async def _acquire(self):
+        try:
+            engine = await asyncio.wait_for(self._idle.get(), self.checkout_timeout)
+        except asyncio.TimeoutError:
+            raise EnginePoolExhausted(
+                f'All {self.size} chess engines are busy, please try again shortly'
+            ) from None
+
+        # Health check: replace an engine that died or stopped answering
+        try:
+            if engine.returncode.done():
+                raise chess.engine.EngineTerminatedError('engine process died')
+            await asyncio.wait_for(engine.ping(), 5)
+        except Exception as e:
+            logger.warning('Restarting unresponsive chess engine: %s', e)
+            await self._discard(engine)
+            self.restarted += 1
+            try:
+                engine = await self._spawn()
+            except BaseException:
+                # Keep the slot; the next checkout retries the restart
+                self._idle.put_nowait(engine)
+                raise
+        return engine
+
+    async def _configure(self, engine, options):
+        self._touched.update(options)
+        config = {
+            name: engine.options[name].default
+            for name in self._touched
+            if name in engine.options
+        }
+        config.update(options)
+        if config:
+            await engine.configure(config)
+
+    async def _search(self, method, board, limit, options, kwargs):
+        engine = await self._acquire()
+        try:
+            self.searches += 1
+            await self._configure(engine, options)
+            return await getattr(engine, method)(board, limit, **kwargs)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            # A crashed engine goes back too; the next checkout replaces it
+            self._idle.put_nowait(engine)
+
+    async def _stream(self, board, limit, options, kwargs, infos):
+        engine = await self._acquire()
+        try:
+            self.searches += 1
+            await self._configure(engine, options)
+            with await engine.analysis(board, limit, **kwargs) as analysis:
+                async for info in analysis:
+                    infos.put(info)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            # A crashed engine goes back too; the next checkout replaces it
+            self._idle.put_nowait(engine)
+
+
+class EngineHandle:
+    """SimpleEngine-like front for AsyncEngineService, bound to one request."""
+
+    def __init__(self, service, options, timeout, client=None):
+        self.service = service
+        self.options = options
+        self.timeout = timeout
+        self.client = client
+        self._pending = set()
+
+    def play(self, board, limit, **kwargs):
+        return self._wait(self.service.submit('play', board, limit, self.options, **kwargs))
+
+    def analyse(self, board, limit, **kwargs):
+        return self._wait(self.service.submit('analyse', board, limit, self.options, **kwargs))
+
+    def analysis(self, board, limit, **kwargs):
+        return StreamedAnalysis(*self.service.stream(board, limit, self.options, **kwargs), timeout=self.timeout)
+
+    def cancel(self):
+        for future in list(self._pending):
+            future.cancel()
+        self._pending.clear()
+
+    def _wait(self, future):
+        self._pending.add(future)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            while True:
+                wait = DISCONNECT_POLL_SECONDS if self.client is not None else None
+                if deadline is not None:
+                    remaining = max(deadline - time.monotonic(), 0)
+                    wait = remaining if wait is None else min(wait, remaining)
+                try:
+                    return future.result(timeout=wait)
+                except concurrent.futures.TimeoutError:
+                    pass
+                if deadline is not None and time.monotonic() >= deadline:
+                    future.cancel()
+                    raise EngineSearchTimeout('Engine search timed out')
+                if client_disconnected(self.client):
+                    future.cancel()
+                    raise ClientDisconnected()
+        finally:
+            self._pending.discard(future)
+
+
+def client_disconnected(sock):
+    """True once the peer has closed ``sock``.
+
+    The views have read the request body by the time they search, so a
+    readable socket with nothing to peek at means the client hung up. Sockets
+    that can't be peeked at (TLS) are assumed to still be connected.
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except ValueError:
+        return False
+    except OSError:
+        return True
+
+
+class StreamedAnalysis:
+    """Iterate over the infos of a streamed search, like SimpleAnalysisResult.
+
+    Leaving the ``with`` block, or closing the iterator early, stops the search.
+    A search still running ``timeout`` seconds after it started is stopped
+    and EngineSearchTimeout raised.
+    """
+
+    def __init__(self, future, infos, timeout=None):
+        self.future = future
+        self.infos = infos
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __iter__(self):
+        while True:
+            try:
+                if self.deadline is None:
+                    info = self.infos.get()
+                else:
+                    info = self.infos.get(timeout=max(self.deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.stop()
+                raise EngineSearchTimeout('Engine search timed out') from None
+            if info is None:
+                break
+            yield info
+        if not self.future.cancelled() and self.future.exception() is not None:
+            raise self.future.exception()
+
+    def stop(self):
+        self.future.cancel()
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_engine_service(path, size=2, checkout_timeout=10.0):
+    """Return the process-wide async engine service for ``path``."""
+    with _services_lock:
+        service = _services.get(path)
+        if service is None:
+            service = AsyncEngineService(path, size=size, checkout_timeout=checkout_timeout)
+            _services[path] = service
+        return service
+
+
+def engine_service_stats():
+    """stats() of every service started so far, keyed by engine path."""
+    with _services_lock:
+        return {path: service.stats() for path, service in _services.items()}
+
+
+def shutdown_engine_services():
+    with _services_lock:
+        services = list(_services.values())
+        _services.clear()
+    for service in services:
+        service.close()
+
+
+# The event loop thread is a daemon, so it is still running when atexit hooks
+# fire and can quit the engines cleanly.
+atexit.register(shutdown_engine_services)
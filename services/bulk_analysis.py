@@ -0,0 +1,241 @@
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.engine
+
+from models import db, Game
+from services.analysis import MOVE_GRADE_DEPTH, game_boards, grade_game, terminal_info
+from services.analysis_queue import has_player_side, save_game_analysis
+
+logger = logging.getLogger(__name__)
+
+# State of each worker process: its own engine and how it was configured
+_engine = None
+_settings = None
+
+
+def _open_engine():
+    global _engine
+    path, _, threads, hash_mb = _settings
+    _engine = chess.engine.SimpleEngine.popen_uci(path)
+    options = {}
+    if 'Threads' in _engine.options:
+        options['Threads'] = threads
+    if hash_mb and 'Hash' in _engine.options:
+        options['Hash'] = hash_mb
+    if options:
+        _engine.configure(options)
+
+
+def _start_worker(path, depth, threads, hash_mb, counter):
+    """Process pool initializer: pin to a core and start a configured engine."""
+    global _settings
+
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    if hasattr(os, 'sched_setaffinity'):
+        cores = sorted(os.sched_getaffinity(0))
+        # Give each worker its own block of `threads` cores
+        start = (index * threads) % len(cores)
+        os.sched_setaffinity(0, {cores[(start + i) % len(cores)] for i in range(threads)})
+
+    _settings = (path, depth, threads, hash_mb)
+    _open_engine()
+    # The engine's event loop runs on a non-daemon thread; quit it when the
+    # worker process shuts down, or the process never exits
+    multiprocessing.util.Finalize(None, _close_engine, exitpriority=10)
+
+
+def _close_engine():
+    try:
+        _engine.close()
+    except Exception:
+        pass
+
+
+def _analyse_chunk(key, start, fens):
+    """Analyse a run of positions in a worker; returns (key, start, infos).
+
+    A crashed engine is restarted once before the chunk is given up on.
+    """
+    depth = _settings[1]
+    for attempt in range(2):
+        try:
+            infos = []
+            for fen in fens:
+                info = _engine.analyse(chess.Board(fen), chess.engine.Limit(depth=depth))
+                infos.append({'score': info['score'], 'depth': info.get('depth')})
+            return key, start, infos
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, TimeoutError):
+            if attempt:
+                raise
+            _close_engine()
+            _open_engine()
+
+
+class _PendingGame:
+    """A game whose positions are still being analysed by the workers."""
+
+    def __init__(self, boards):
+        self.boards = boards
+        self.infos = [terminal_info(b) if b.is_game_over() else None for b in boards]
+        self.todo = [i for i, info in enumerate(self.infos) if info is None]
+        self.remaining = len(self.todo)
+
+    def fill(self, start, chunk):
+        for offset, info in enumerate(chunk):
+            self.infos[self.todo[start + offset]] = info
+        self.remaining -= len(chunk)
+
+
+class BulkAnalysisResult:
+    def __init__(self):
+        self.games = 0
+        self.positions = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    @property
+    def positions_per_second(self):
+        return self.positions / self.seconds if self.seconds else 0.0
+
+    @property
+    def games_per_minute(self):
+        return self.games * 60 / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (
+            f'{self.games} games ({self.failed} failed), {self.positions} positions '
+            f'in {self.seconds:.1f}s: {self.positions_per_second:.1f} positions/s, '
+            f'{self.games_per_minute:.1f} games/min'
+        )
+
+
+def analyse_games(games, engine_path, processes=None, threads=1, hash_mb=None,
+                  depth=MOVE_GRADE_DEPTH, chunk_size=40, on_game=None):
+    """Grade many games at once across a pool of engine processes.
+
+    ``games`` is an iterable of ``(key, pgn)`` pairs and is consumed lazily.
+    Each game's positions are split into chunks of ``chunk_size`` so a long
+    game is spread over several engines, and every worker process runs one
+    engine pinned to its own cores with ``threads`` search threads and
+    ``hash_mb`` of hash. ``on_game(key, plies)`` is called in this process as
+    each game finishes, and ``on_game(key, None)`` for a game that failed.
+
+    Returns a BulkAnalysisResult with throughput figures.
+    """
+    processes = processes or max(1, (os.cpu_count() or 1) // threads)
+    result = BulkAnalysisResult()
+    started = time.perf_counter()
+
+    games = iter(games)
+    pending = {}
+    in_flight = set()
+    max_in_flight = processes * 4
+
+    def finish(key, game):
+        result.games += 1
+        result.positions += len(game.boards)
+        if on_game:
+            on_game(key, grade_game(game.boards, game.infos))
+
+    def fail(key):
+        pending.pop(key, None)
+        result.failed += 1
+        if on_game:
+            on_game(key, None)
+
+    def submit_more():
+        while len(in_flight) < max_in_flight:
+            try:
+                key, pgn = next(games)
+            except StopIteration:
+                return
+            try:
+                game = _PendingGame(game_boards(pgn))
+            except ValueError:
+                fail(key)
+                continue
+            if not game.remaining:
+                finish(key, game)
+                continue
+            pending[key] = game
+            for start in range(0, len(game.todo), chunk_size):
+                fens = [game.boards[i].fen() for i in game.todo[start:start + chunk_size]]
+                future = executor.submit(_analyse_chunk, key, start, fens)
+                future.key = key
+                in_flight.add(future)
+
+    context = multiprocessing.get_context('spawn')
+    counter = context.Value('i', 0)
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=context,
+        initializer=_start_worker,
+        initargs=(engine_path, depth, threads, hash_mb, counter),
+    ) as executor:
+        submit_more()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                try:
+                    key, start, chunk = future.result()
+                except Exception as e:
+                    if future.key in pending:
+                        logger.warning('Analysis of game %s failed: %s', future.key, e)
+                        fail(future.key)
+                    continue
+                game = pending.get(key)
+                if game is None:
+                    continue  # another chunk of this game already failed
+                game.fill(start, chunk)
+                if not game.remaining:
+                    finish(key, pending.pop(key))
+            submit_more()
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def _iter_games(query, batch_size):
+    # Page through by id so commits made while grading don't disturb the read
+    last_id = 0
+    while True:
+        rows = query.filter(Game.id > last_id).order_by(Game.id) \
+            .with_entities(Game.id, Game.pgn).limit(batch_size).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def reanalyse_stored_games(query, engine_path, commit_every=50, **options):
+    """Re-grade the games matched by ``query`` and store their graded moves.
+
+    Takes the same options as analyse_games(). Results are committed every
+    ``commit_every`` games, so an interrupted backfill keeps its progress.
+    Games with no 'Player' side are skipped, as save_game_analysis() can't
+    store them.
+    """
+    query = query.filter(has_player_side())
+    written = 0
+
+    def store(game_id, plies):
+        nonlocal written
+        if plies is None:
+            return
+        save_game_analysis(db.session.get(Game, game_id), plies)
+        written += 1
+        if written % commit_every == 0:
+            db.session.commit()
+
+    result = analyse_games(_iter_games(query, commit_every * 10), engine_path, on_game=store, **options)
+    db.session.commit()
+    return result
@@ -0,0 +1,94 @@
+import random
+import sqlite3
+import time
+from functools import wraps
+
+from flask import current_app, jsonify
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from models import db
+
+
+class DatabaseBusy(OperationalError):
+    """SQLite gave up waiting for another connection's write lock."""
+
+
+def sqlite_pragmas(config):
+    """The PRAGMAs run on every new SQLite connection, from app config."""
+    return {
+        # Readers no longer block the writer or each other
+        'journal_mode': 'WAL',
+        # In WAL mode only checkpoints fsync; a crash can lose the last
+        # commits but never corrupts the database
+        'synchronous': config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000),
+        'cache_size': -config.get('SQLITE_CACHE_SIZE_KB', 20000),  # negative means KiB
+        'mmap_size': config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'temp_store': 'MEMORY',
+    }
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run ``pragmas`` on every connection ``engine`` opens to a SQLite file."""
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'handle_error')
+    def raise_busy(context):
+        # Let retry_on_lock() tell lock contention apart from other errors
+        error = context.original_exception
+        if isinstance(error, sqlite3.OperationalError) and (
+            'database is locked' in str(error) or 'database is busy' in str(error)
+        ):
+            raise DatabaseBusy(context.statement, context.parameters, error) from error
+
+
+def init_database(app):
+    """Set up Flask-SQLAlchemy for ``app``, tuning SQLite for concurrent writers.
+
+    Sizes the connection pool from DB_POOL_SIZE / DB_MAX_OVERFLOW and runs the
+    sqlite_pragmas() on every connection.
+    """
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # The driver's own lock timeout, in seconds, matches busy_timeout
+        options.setdefault('connect_args', {}).setdefault(
+            'timeout', app.config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000
+        )
+    options.setdefault('pool_size', app.config.get('DB_POOL_SIZE', 10))
+    options.setdefault('max_overflow', app.config.get('DB_MAX_OVERFLOW', 10))
+
+    db.init_app(app)
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            apply_sqlite_pragmas(db.engine, sqlite_pragmas(app.config))
+
+
+def retry_on_lock(view):
+    """Rerun a view whose transaction lost a race for SQLite's write lock.
+
+    Gives up with a 503 after DB_LOCK_RETRIES retries. Views let DatabaseBusy
+    propagate rather than turning it into a 500.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        retries = current_app.config.get('DB_LOCK_RETRIES', 3)
+        for attempt in range(retries + 1):
+            try:
+                return view(*args, **kwargs)
+            except DatabaseBusy:
+                db.session.rollback()
+                if attempt == retries:
+                    break
+                # Back off with jitter so the retries don't collide again
+                time.sleep(0.05 * 2 ** attempt * (0.5 + random.random()))
+        return jsonify({'error': 'The database is busy, please try again'}), 503
+    return wrapper
@@ -0,0 +1,126 @@
+import copy
+import logging
+import threading
+from bisect import bisect_left
+
+import chess.engine
+from flask import g, has_request_context
+
+logger = logging.getLogger(__name__)
+
+# Search budgets for each AI level. The engine stops at whichever of depth,
+# nodes or time it reaches first, so a quiet position still gets the full
+# depth while a sharp one is cut off by the node or time budget instead of
+# running for many seconds. A search cut off that way is cached at the depth it
+# reached, so cache_depth is the shallowest cached evaluation reused instead
+# of searching again. book_plies and book_choice control how long and how the
+# AI plays from the opening book before it starts searching. rating is the
+# engine's approximate Elo at that level, which players are rated against.
+DIFFICULTY_PROFILES = {
+    'easy': {
+        'skill_level': 1, 'depth': 10, 'cache_depth': 8, 'nodes': 200_000, 'time': 0.3,
+        'book_plies': 6, 'book_choice': 'uniform', 'rating': 1000,
+    },
+    'medium': {
+        'skill_level': 10, 'depth': 12, 'cache_depth': 10, 'nodes': 1_000_000, 'time': 0.8,
+        'book_plies': 10, 'book_choice': 'weighted', 'rating': 1600,
+    },
+    'hard': {
+        'skill_level': 20, 'depth': 20, 'cache_depth': 16, 'nodes': 5_000_000, 'time': 2.0,
+        'book_plies': 12, 'book_choice': 'best', 'rating': 2400,
+    },
+}
+DEFAULT_DIFFICULTY = 'medium'
+
+
+def get_profile(difficulty):
+    """The profile for a difficulty name, falling back to medium."""
+    return DIFFICULTY_PROFILES.get(difficulty, DIFFICULTY_PROFILES[DEFAULT_DIFFICULTY])
+
+
+def engine_options(profile):
+    return {'Skill Level': profile['skill_level']}
+
+
+def search_limit(profile, slo=None, searches=1):
+    """The Limit for one of ``searches`` searches made under ``profile``.
+
+    ``slo`` is the latency budget in seconds for the whole request. It is
+    split evenly between the searches and caps the profile's own time budget,
+    if it has one. The Limit's time is the budget to record the search against.
+    """
+    seconds = profile.get('time')
+    if slo:
+        seconds = min(seconds, slo / searches) if seconds else slo / searches
+    return chess.engine.Limit(depth=profile['depth'], nodes=profile.get('nodes'), time=seconds)
+
+
+# Upper bounds, in seconds, of the search time histogram buckets
+SEARCH_SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+class SearchStats:
+    """Running totals of what engine searches actually cost, per endpoint and
+    difficulty, for capacity planning."""
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, difficulty, info, elapsed, budget=None):
+        nodes = info.get('nodes', 0)
+        depth = info.get('depth', 0)
+        over = bool(budget) and elapsed > budget
+        if over:
+            logger.warning('%s search (%s) took %.2fs, over the %.2fs budget', kind, difficulty, elapsed, budget)
+        if has_request_context():
+            # For the request's line in the slow request log
+            g.engine_searches = g.get('engine_searches', 0) + 1
+            g.engine_seconds = g.get('engine_seconds', 0.0) + elapsed
+        with self._lock:
+            totals = self._totals.setdefault((kind, difficulty), {
+                'searches': 0, 'nodes': 0, 'depth': 0, 'seconds': 0.0,
+                'max_seconds': 0.0, 'min_depth': None, 'over_budget': 0,
+                'buckets': [0] * (len(SEARCH_SECONDS_BUCKETS) + 1),
+            })
+            totals['buckets'][bisect_left(SEARCH_SECONDS_BUCKETS, elapsed)] += 1
+            totals['searches'] += 1
+            totals['nodes'] += nodes
+            totals['depth'] += depth
+            totals['seconds'] += elapsed
+            totals['max_seconds'] = max(totals['max_seconds'], elapsed)
+            if totals['min_depth'] is None or depth < totals['min_depth']:
+                totals['min_depth'] = depth
+            totals['over_budget'] += over
+
+    def snapshot(self):
+        with self._lock:
+            rows = []
+            for (kind, difficulty), totals in sorted(self._totals.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+                searches = totals['searches']
+                rows.append({
+                    'kind': kind,
+                    'difficulty': difficulty,
+                    'searches': searches,
+                    'avg_nodes': totals['nodes'] / searches,
+                    'avg_depth': totals['depth'] / searches,
+                    'min_depth': totals['min_depth'],
+                    'avg_seconds': totals['seconds'] / searches,
+                    'max_seconds': totals['max_seconds'],
+                    'nodes_per_second': totals['nodes'] / totals['seconds'] if totals['seconds'] else 0.0,
+                    'over_budget': totals['over_budget'],
+                })
+            return rows
+
+    def totals(self):
+        """The raw running totals, keyed by (kind, difficulty), with the
+        search time histogram counts under 'buckets'."""
+        with self._lock:
+            return copy.deepcopy(self._totals)
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+search_stats = SearchStats()
@@ -0,0 +1,198 @@
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+import chess.engine
+
+logger = logging.getLogger(__name__)
+
+# Errors after which an engine process can no longer be trusted and is replaced
+ENGINE_FAILURES = (
+    chess.engine.EngineError,
+    chess.engine.EngineTerminatedError,
+    TimeoutError,
+)
+
+
+class EnginePoolExhausted(Exception):
+    """Raised when no engine becomes free before the checkout timeout."""
+
+
+class EnginePool:
+    """A bounded set of warm Stockfish processes shared by every request.
+
+    Engines are started lazily, up to ``size`` of them, and handed out one
+    request at a time. An idle engine is pinged before it is handed out and a
+    crashed or hung engine is replaced by a fresh process, so a request never
+    inherits a broken engine. Options set by one request (e.g. ``Skill Level``)
+    are put back to the engine defaults before the next checkout.
+    """
+
+    def __init__(self, path, size=2, timeout=10.0, options=None):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.options = dict(options or {})
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._touched = set(self.options)
+        self._closed = False
+
+        self.spawned = 0
+        self.restarted = 0
+        self.checkouts = 0
+        self.exhausted = 0
+
+    @contextmanager
+    def engine(self, options=None):
+        """Check an engine out for the duration of a ``with`` block."""
+        if self._closed:
+            raise EnginePoolExhausted('Engine pool has been shut down')
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.exhausted += 1
+            raise EnginePoolExhausted(
+                f'All {self.size} chess engines are busy, please try again shortly'
+            )
+
+        engine = None
+        healthy = True
+        try:
+            engine = self._checkout()
+            self._configure(engine, options or {})
+            yield engine
+        except BaseException as e:
+            healthy = not isinstance(e, ENGINE_FAILURES)
+            raise
+        finally:
+            self._checkin(engine, healthy)
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                'size': self.size,
+                'idle': idle,
+                'spawned': self.spawned,
+                'restarted': self.restarted,
+                'checkouts': self.checkouts,
+                'exhausted': self.exhausted,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for engine in idle:
+            self._quit(engine)
+
+    def _spawn(self):
+        engine = chess.engine.SimpleEngine.popen_uci(self.path)
+        with self._lock:
+            self.spawned += 1
+        return engine
+
+    def _checkout(self):
+        with self._lock:
+            engine = self._idle.pop() if self._idle else None
+            self.checkouts += 1
+
+        if engine is None:
+            return self._spawn()
+
+        # Health check: a crashed or wedged engine is replaced, not reused
+        try:
+            engine.ping()
+            return engine
+        except Exception as e:
+            logger.warning('Restarting unresponsive chess engine: %s', e)
+            self._quit(engine)
+            with self._lock:
+                self.restarted += 1
+            return self._spawn()
+
+    def _checkin(self, engine, healthy):
+        if engine is None:
+            return
+        if not healthy or self._closed:
+            if not healthy:
+                logger.warning('Discarding chess engine after engine failure')
+            self._quit(engine)
+            return
+        with self._lock:
+            self._idle.append(engine)
+
+    def _configure(self, engine, options):
+        # Reset anything an earlier request changed, then apply this request's
+        # options. Unchanged values are not resent to the engine.
+        with self._lock:
+            self._touched.update(options)
+            touched = set(self._touched)
+        config = {
+            name: engine.options[name].default
+            for name in touched
+            if name in engine.options
+        }
+        config.update(self.options)
+        config.update(options)
+        if config:
+            engine.configure(config)
+
+    @staticmethod
+    def _quit(engine):
+        try:
+            engine.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+_shutdown_watcher = None
+
+
+def get_engine_pool(path, size=2, timeout=10.0, options=None):
+    """Return the process-wide pool for the engine binary at ``path``."""
+    global _shutdown_watcher
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = EnginePool(path, size=size, timeout=timeout, options=options)
+            _pools[path] = pool
+        if _shutdown_watcher is None:
+            _shutdown_watcher = threading.Thread(target=_close_pools_on_exit, name='engine-pool-shutdown', daemon=True)
+            _shutdown_watcher.start()
+        return pool
+
+
+def engine_pool_stats():
+    """stats() of every pool started so far, keyed by engine path."""
+    with _pools_lock:
+        return {path: pool.stats() for path, pool in _pools.items()}
+
+
+def shutdown_engine_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _close_pools_on_exit():
+    # Each engine runs its event loop on a non-daemon thread, and the
+    # interpreter joins those before it runs atexit hooks, so the pools are
+    # closed as soon as the main thread finishes (the server or CLI command
+    # returned) rather than from the hook, which would never be reached
+    threading.main_thread().join()
+    shutdown_engine_pools()
+
+
+# For pools that are already idle when the process exits some other way
+atexit.register(shutdown_engine_pools)
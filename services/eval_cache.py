@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import chess
+import chess.engine
+
+
+# Stockfish's default Skill Level, i.e. an unrestricted search
+FULL_STRENGTH = 20
+
+
+def position_key(board, options=None):
+    """FEN without the move clocks, so transpositions share one entry.
+
+    Searches weakened with a lower Skill Level are kept apart from full
+    strength ones, so they are never handed out as an accurate evaluation.
+    """
+    skill = (options or {}).get('Skill Level', FULL_STRENGTH)
+    if skill >= FULL_STRENGTH:
+        return board.epd()
+    return f'{board.epd()} skill {skill}'
+
+
+class EvaluationCache:
+    """LRU cache of engine evaluations shared by the chess endpoints.
+
+    One entry is kept per position, at the deepest depth it has been searched
+    to, and a request for a shallower depth is answered from it. Scores are
+    stored from white's point of view together with the first move of the
+    principal variation. Lookups and stores take the engine ``options`` the
+    search runs with, and only match entries searched at the same strength.
+    When ``path`` is given, entries are also written
+    through to a small SQLite file so the cache survives restarts.
+    """
+
+    def __init__(self, max_size=50000, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            # Its keys did not record the search strength
+            self._db.execute('DROP TABLE IF EXISTS evaluation')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS evaluations ('
+                ' position TEXT PRIMARY KEY,'
+                ' depth INTEGER NOT NULL,'
+                ' cp INTEGER,'
+                ' mate INTEGER,'
+                ' best_move TEXT)'
+            )
+            self._db.commit()
+
+    def get(self, board, depth, options=None):
+        """Return an analyse()-style info dict searched to at least ``depth``
+        with engine ``options``, or None."""
+        key = position_key(board, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is not None and entry[0] >= depth:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._to_info(entry)
+            self.misses += 1
+            return None
+
+    def put(self, board, info, options=None):
+        """Store the result of an engine search of ``board`` with engine ``options``.
+
+        A search to depth ``d`` has also searched the position after its best
+        move to ``d - 1`` with the same score, so that position is stored too.
+        This is what lets the next move's evaluation reuse this one. Mate scores
+        are not carried over since the mate distance changes by a move.
+        """
+        if 'score' not in info or 'depth' not in info:
+            return
+        score = info['score'].white()
+        pv = info.get('pv') or []
+        depth = info['depth']
+
+        self._store(board, options, (depth, score.score(), score.mate(), pv[0].uci() if pv else None))
+        if pv and depth > 1 and not score.is_mate() and board.is_legal(pv[0]):
+            child = board.copy(stack=False)
+            child.push(pv[0])
+            reply = pv[1].uci() if len(pv) > 1 else None
+            self._store(child, options, (depth - 1, score.score(), score.mate(), reply))
+
+    def _store(self, board, options, entry):
+        key = position_key(board, options)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[0] > entry[0]:
+                return
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT INTO evaluations (position, depth, cp, mate, best_move)'
+                    ' VALUES (?, ?, ?, ?, ?)'
+                    ' ON CONFLICT(position) DO UPDATE SET'
+                    ' depth = excluded.depth, cp = excluded.cp,'
+                    ' mate = excluded.mate, best_move = excluded.best_move'
+                    ' WHERE excluded.depth >= evaluations.depth',
+                    (key,) + entry
+                )
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute('DELETE FROM evaluations')
+                self._db.commit()
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load(self, key):
+        row = self._db.execute(
+            'SELECT depth, cp, mate, best_move FROM evaluations WHERE position = ?',
+            (key,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    @staticmethod
+    def _to_info(entry):
+        depth, cp, mate, best_move = entry
+        score = chess.engine.Mate(mate) if mate is not None else chess.engine.Cp(cp)
+        return {
+            'score': chess.engine.PovScore(score, chess.WHITE),
+            'depth': depth,
+            'pv': [chess.Move.from_uci(best_move)] if best_move else [],
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_evaluation_cache(max_size=50000, path=None):
+    """Return the process-wide evaluation cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EvaluationCache(max_size=max_size, path=path)
+        return _cache
@@ -0,0 +1,110 @@
+"""Compact binary encoding of a game's moves and its move analysis.
+
+A game's moves pack into 2 bytes each: the from and to squares in 6 bits
+apiece and the promotion piece in 3. Each analysed Move row packs into 7
+bytes: the move number, the 0-10 score in hundredths, the blunder and
+brilliant flags, and the comment as a code into the grade_move() feedback
+messages plus the mate distance some of them carry. Both formats start with
+a version byte.
+"""
+import re
+import struct
+
+import chess
+
+FORMAT_VERSION = 1
+
+_PROMOTIONS = [None, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+_MOVE = struct.Struct('<H')
+_ANALYSIS = struct.Struct('<HhBBb')
+_NO_SCORE = -32768
+_BLUNDER = 1
+_BRILLIANT = 2
+
+# The feedback messages grade_move() writes into Move.comment; {n} is a mate distance
+COMMENTS = [
+    '',
+    'Checkmate! You won the game.',
+    "You're delivering mate in {n}",
+    'Opponent has mate in {n}',
+    "You were delivering mate in {n}, don't miss it!",
+    'Opponent was mating in {n}, stay alert!',
+    'Best move!',
+    'Good move.',
+    'Inaccuracy.',
+    'Mistake.',
+    'Blunder!',
+]
+_COMMENT_PATTERNS = [re.compile(re.escape(comment).replace(r'\{n\}', r'(-?\d+)') + '$') for comment in COMMENTS]
+
+
+class CannotPack(ValueError):
+    """The data has something the compact format has no room for."""
+
+
+def _version_byte(data):
+    if not data or data[0] != FORMAT_VERSION:
+        raise ValueError('Unknown packed format')
+    return memoryview(data)[1:]
+
+
+def pack_moves(moves):
+    """Pack a game's moves, played from the standard starting position."""
+    return bytes([FORMAT_VERSION]) + b''.join(
+        _MOVE.pack(move.from_square | move.to_square << 6 | _PROMOTIONS.index(move.promotion) << 12)
+        for move in moves
+    )
+
+
+def unpack_moves(data):
+    return [chess.Move(code & 63, code >> 6 & 63, _PROMOTIONS[code >> 12])
+            for code, in _MOVE.iter_unpack(_version_byte(data))]
+
+
+def _comment_code(comment):
+    for code, pattern in enumerate(_COMMENT_PATTERNS):
+        match = pattern.match(comment or '')
+        if match:
+            mate = int(match.group(1)) if match.groups() else 0
+            if -128 <= mate <= 127:
+                return code, mate
+    raise CannotPack(f'Comment {comment!r} is not a known feedback message')
+
+
+def pack_analysis(rows):
+    """Pack Move rows given as dicts with move_number, score, is_blunder,
+    is_brilliant and comment. Raises CannotPack for rows it can't represent."""
+    packed = [bytes([FORMAT_VERSION])]
+    for row in rows:
+        if not 0 <= row['move_number'] <= 0xFFFF:
+            raise CannotPack(f"Move number {row['move_number']} is out of range")
+        score = _NO_SCORE if row['score'] is None else round(row['score'] * 100)
+        flags = (_BLUNDER if row['is_blunder'] else 0) | (_BRILLIANT if row['is_brilliant'] else 0)
+        packed.append(_ANALYSIS.pack(row['move_number'], score, flags, *_comment_code(row['comment'])))
+    return b''.join(packed)
+
+
+def pack_analysis_or_none(moves):
+    """pack_analysis() for Move objects or row dicts, None if they can't be packed."""
+    rows = [move if isinstance(move, dict) else {
+        'move_number': move.move_number,
+        'score': move.score,
+        'is_blunder': move.is_blunder,
+        'is_brilliant': move.is_brilliant,
+        'comment': move.comment,
+    } for move in moves]
+    try:
+        return pack_analysis(sorted(rows, key=lambda row: row['move_number']))
+    except CannotPack:
+        return None
+
+
+def unpack_analysis(data):
+    """The rows given to pack_analysis(), in the same order."""
+    return [{
+        'move_number': move_number,
+        'score': None if score == _NO_SCORE else score / 100,
+        'is_blunder': bool(flags & _BLUNDER),
+        'is_brilliant': bool(flags & _BRILLIANT),
+        'comment': COMMENTS[code].format(n=mate),
+    } for move_number, score, flags, code, mate in _ANALYSIS.iter_unpack(_version_byte(data))]
@@ -0,0 +1,153 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from flask import current_app
+from sqlalchemy import select, union_all
+
+from models import db, Friendship, PlayerStats, User
+
+LEADERBOARD_SIZE = 10
+
+# Each player is one 64-bit key, the rating in the high half and the user id
+# in the low, so the keys sort by rating and a rank is a binary search
+_ID_BITS = 32
+
+
+def _key(rating, user_id):
+    return (rating << _ID_BITS) | user_id
+
+
+class Leaderboard:
+    """Every rated player's rating, sorted, for rank lookups without sorting
+    the table.
+
+    Loaded from the covering index on (rating, user_id) on first use and again
+    every ``ttl`` seconds, so games saved by other worker processes show up.
+    save_game moves its player's key in place in between.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.loads = 0
+        self.updates = 0
+
+        self._keys = array('q')
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load_if_stale(self):
+        # Called with the lock held
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            # Built in SQL and fetched through Core, skipping the ORM's
+            # per-row work, as there can be a million of them
+            keys = db.session.connection().execute(
+                select(PlayerStats.rating.op('<<')(_ID_BITS).op('|')(PlayerStats.user_id))
+                .where(PlayerStats.rating.isnot(None))
+                .order_by(PlayerStats.rating, PlayerStats.user_id)
+            ).scalars()
+            self._keys = array('q', keys)
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+
+    def _rank(self, rating):
+        return len(self._keys) - bisect_left(self._keys, (rating + 1) << _ID_BITS) + 1
+
+    def update(self, user_id, old_rating, new_rating):
+        """Move a player whose rating changed from ``old_rating`` (None for a
+        new player), after the change is committed."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if old_rating is not None:
+                old_key = _key(old_rating, user_id)
+                i = bisect_left(self._keys, old_key)
+                if i < len(self._keys) and self._keys[i] == old_key:
+                    del self._keys[i]
+            insort(self._keys, _key(new_rating, user_id))
+            self.updates += 1
+
+    def top(self, count):
+        """(user_id, rating, rank) of the ``count`` highest rated players."""
+        with self._lock:
+            self._load_if_stale()
+            players = []
+            for key in reversed(self._keys[-count:] if count > 0 else []):
+                rating = key >> _ID_BITS
+                players.append((key & ((1 << _ID_BITS) - 1), rating, self._rank(rating)))
+            return players
+
+    def position(self, rating):
+        """(rank, players rated below, players) for a rating. Ties share a rank."""
+        with self._lock:
+            self._load_if_stale()
+            return self._rank(rating), bisect_left(self._keys, rating << _ID_BITS), len(self._keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'players': len(self._keys),
+                'ttl': self.ttl,
+                'loads': self.loads,
+                'updates': self.updates,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._keys = array('q')
+            self._loaded_at = None
+            self.loads = self.updates = 0
+
+
+_leaderboard = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard():
+    """Return the process-wide leaderboard, creating it on first use."""
+    global _leaderboard
+    with _leaderboard_lock:
+        if _leaderboard is None:
+            _leaderboard = Leaderboard(ttl=current_app.config.get('LEADERBOARD_CACHE_TTL', 60))
+        return _leaderboard
+
+
+def top_players(count=LEADERBOARD_SIZE):
+    """The ``count`` highest rated players, best first."""
+    top = get_leaderboard().top(count)
+    names = dict(db.session.query(User.id, User.username).filter(User.id.in_([user_id for user_id, _, _ in top])))
+    return [{
+        'rank': rank,
+        'id': user_id,
+        'username': names.get(user_id),
+        'rating': rating,
+    } for user_id, rating, rank in top]
+
+
+def player_rank(user_id):
+    """The player's global rank and percentile and their rank among their
+    accepted friends, or None if they have no rating yet."""
+    rating = db.session.query(PlayerStats.rating).filter_by(user_id=user_id).scalar()
+    if rating is None:
+        return None
+
+    rank, below, players = get_leaderboard().position(rating)
+    sent = select(Friendship.friend_id.label('friend_id')).where(
+        Friendship.user_id == user_id, Friendship.status == 'accepted')
+    received = select(Friendship.user_id.label('friend_id')).where(
+        Friendship.friend_id == user_id, Friendship.status == 'accepted')
+    friends = union_all(sent, received).subquery()
+    friend_ratings = [friend_rating for friend_rating, in db.session.query(PlayerStats.rating)
+                      .join(friends, friends.c.friend_id == PlayerStats.user_id)]
+    return {
+        'user_id': user_id,
+        'rating': rating,
+        'rank': rank,
+        'players': players,
+        # Share of the other players rated below this one
+        'percentile': round(100 * below / (players - 1), 1) if players > 1 else 100.0,
+        'friends_rank': 1 + sum(1 for friend_rating in friend_ratings
+                                if friend_rating is not None and friend_rating > rating),
+        'friends': len(friend_ratings),
+    }
@@ -0,0 +1,255 @@
+"""Request, SQL, engine, pool and cache metrics in the Prometheus text format.
+
+init_metrics() times every request and counts the SQL statements it runs.
+render_metrics() writes those histograms out together with the engine
+search totals and the stats() of the pools and caches. Requests slower than
+SLOW_REQUEST_SECONDS are also logged as one JSON object per line on the
+'slow_requests' logger.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from models import db
+from services.analysis import get_eval_cache
+from services.async_engine import engine_service_stats
+from services.difficulty import SEARCH_SECONDS_BUCKETS, search_stats
+from services.engine_pool import engine_pool_stats
+from services.leaderboard import get_leaderboard
+from services.response_cache import get_response_cache
+from services.suggestions import get_suggestion_cache
+
+slow_request_log = logging.getLogger('slow_requests')
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RequestMetrics:
+    """Per-endpoint request latency and SQL statement histograms."""
+
+    def __init__(self):
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.latency = {}  # (endpoint, method) -> Histogram
+        self.queries = {}  # endpoint -> Histogram of statements per request
+        self.query_seconds = {}  # endpoint -> total SQL time
+        self.query_latency = Histogram(QUERY_BUCKETS)  # every statement, in requests or not
+        self._lock = threading.Lock()
+
+    def record_request(self, endpoint, method, status, seconds, queries, query_seconds):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault((endpoint, method), Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(endpoint, Histogram(QUERY_COUNT_BUCKETS)).observe(queries)
+            self.query_seconds[endpoint] = self.query_seconds.get(endpoint, 0.0) + query_seconds
+
+    def record_query(self, seconds):
+        with self._lock:
+            self.query_latency.observe(seconds)
+
+    def snapshot(self):
+        """Copies of the counts, with each histogram as (bucket counts, sum)."""
+        with self._lock:
+            return (
+                dict(self.requests),
+                {key: (h.counts[:], h.sum) for key, h in self.latency.items()},
+                {key: (h.counts[:], h.sum) for key, h in self.queries.items()},
+                dict(self.query_seconds),
+                (self.query_latency.counts[:], self.query_latency.sum),
+            )
+
+    def clear(self):
+        with self._lock:
+            self.requests.clear()
+            self.latency.clear()
+            self.queries.clear()
+            self.query_seconds.clear()
+            self.query_latency = Histogram(QUERY_BUCKETS)
+
+
+request_metrics = RequestMetrics()
+
+
+def _endpoint():
+    # The endpoint rather than the path, so ids don't make a series each
+    return request.endpoint or '<unmatched>'
+
+
+def _finish_request(status):
+    if g.get('metrics_recorded') or 'request_started' not in g:
+        return
+    g.metrics_recorded = True
+    seconds = time.perf_counter() - g.request_started
+    endpoint = _endpoint()
+    request_metrics.record_request(endpoint, request.method, status, seconds, g.sql_queries, g.sql_seconds)
+
+    if seconds >= current_app.config.get('SLOW_REQUEST_SECONDS', 1.0):
+        slow_request_log.warning(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'seconds': round(seconds, 4),
+            'sql_queries': g.sql_queries,
+            'sql_seconds': round(g.sql_seconds, 4),
+            'engine_searches': g.get('engine_searches', 0),
+            'engine_seconds': round(g.get('engine_seconds', 0.0), 4),
+        }))
+
+
+def init_metrics(app):
+    """Time every request of ``app`` and every statement run on its database.
+
+    A streamed response is timed until its headers are sent.
+    """
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_response(response):
+        _finish_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_error(exc):
+        # after_request is skipped when a view raises
+        if exc is not None:
+            _finish_request(500)
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_started')
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        request_metrics.record_query(seconds)
+        if has_request_context() and 'request_started' in g:
+            g.sql_queries += 1
+            g.sql_seconds += seconds
+
+
+def _number(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class _Writer:
+    # Samples are grouped by metric name, as the format requires, whatever
+    # order they are added in
+    def __init__(self):
+        self._families = {}
+
+    def _family(self, name, metric_type, help_text):
+        return self._families.setdefault(name, [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}'])
+
+    def sample(self, name, metric_type, help_text, value, **labels):
+        self._family(name, metric_type, help_text).append(f'{name}{_label_text(labels)} {_number(value)}')
+
+    def histogram(self, name, help_text, buckets, counts, total, **labels):
+        lines = self._family(name, 'histogram', help_text)
+        cumulative = 0
+        for bound, count in zip(list(buckets) + ['+Inf'], counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_label_text({**labels, "le": bound})} {cumulative}')
+        lines.append(f'{name}_sum{_label_text(labels)} {_number(total)}')
+        lines.append(f'{name}_count{_label_text(labels)} {cumulative}')
+
+    def text(self):
+        return '\n'.join(line for lines in self._families.values() for line in lines) + '\n'
+
+    def stats(self, prefix, help_text, stats, **labels):
+        """A gauge for every number in a stats() dict."""
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.sample(f'{prefix}_{key}', 'gauge', f'{help_text}: {key}', value, **labels)
+
+
+def render_metrics():
+    """Every metric, in the Prometheus text exposition format."""
+    out = _Writer()
+
+    requests, latency, queries, query_seconds, query_latency = request_metrics.snapshot()
+
+    for (endpoint, method, status), count in sorted(requests.items()):
+        out.sample('chess_requests_total', 'counter', 'Requests handled.', count,
+                   endpoint=endpoint, method=method, status=status)
+    for (endpoint, method), (counts, total) in sorted(latency.items()):
+        out.histogram('chess_request_duration_seconds', 'Time to handle a request.',
+                      LATENCY_BUCKETS, counts, total, endpoint=endpoint, method=method)
+    for endpoint, (counts, total) in sorted(queries.items()):
+        out.histogram('chess_request_sql_queries', 'SQL statements run per request.',
+                      QUERY_COUNT_BUCKETS, counts, total, endpoint=endpoint)
+    for endpoint, seconds in sorted(query_seconds.items()):
+        out.sample('chess_request_sql_seconds_total', 'counter', 'Time spent in SQL statements by requests.',
+                   seconds, endpoint=endpoint)
+    out.histogram('chess_sql_query_duration_seconds', 'Time to run one SQL statement.',
+                  QUERY_BUCKETS, *query_latency)
+
+    for (kind, difficulty), totals in sorted(search_stats.totals().items(), key=lambda item: str(item[0])):
+        labels = {'kind': kind, 'difficulty': difficulty}
+        out.histogram('chess_engine_search_duration_seconds', 'Time for one engine search.',
+                      SEARCH_SECONDS_BUCKETS, totals['buckets'], totals['seconds'], **labels)
+        out.sample('chess_engine_search_nodes_total', 'counter', 'Nodes searched by the engine.',
+                   totals['nodes'], **labels)
+        out.sample('chess_engine_search_depth_total', 'counter',
+                   'Sum of the depths engine searches reached; divide by the search count for the average.',
+                   totals['depth'], **labels)
+        out.sample('chess_engine_search_over_budget_total', 'counter', 'Engine searches over their time budget.',
+                   totals['over_budget'], **labels)
+
+    for path, stats in engine_pool_stats().items():
+        out.stats('chess_engine_pool', 'Engine process pool', stats, backend='pool', path=path)
+    for path, stats in engine_service_stats().items():
+        out.stats('chess_engine_pool', 'Engine process pool', stats, backend='async', path=path)
+
+    pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        out.stats('chess_db_pool', 'Database connection pool', {
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+
+    for name, cache in (('responses', get_response_cache()), ('evaluations', get_eval_cache()),
+                        ('suggestions', get_suggestion_cache()), ('leaderboard', get_leaderboard())):
+        out.stats('chess_cache', 'In-process cache', cache.stats(), cache=name)
+
+    return out.text()
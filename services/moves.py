@@ -0,0 +1,154 @@
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import undefer
+
+from models import db, Game, Move
+from services.analysis_queue import player_color
+from services.game_codec import pack_analysis_or_none, unpack_analysis
+from services.player_stats import update_move_aggregates
+from services.replay import load_game_plies, ply_for_move
+from services.response_cache import invalidate_responses
+from services.stored_analysis import replace_analysis
+
+# Rows per INSERT statement, well under SQLite's limit on bound parameters
+UPSERT_CHUNK_SIZE = 500
+
+_GAME_STATE_LENGTH = Move.__table__.c.game_state.type.length
+
+
+def validate_moves(moves):
+    """Check a move-recording payload row by row.
+
+    Returns (rows, errors): the rows ready for store_moves(), and one
+    {'index', 'error'} dict for every row that can't be stored.
+    """
+    rows = []
+    errors = []
+    seen = {}
+
+    for index, move in enumerate(moves):
+        def error(message):
+            errors.append({'index': index, 'error': message})
+
+        if not isinstance(move, dict):
+            error('Move must be an object')
+            continue
+        game_id = move.get('game_id')
+        move_number = move.get('move_number')
+        game_state = move.get('game_state')
+        score = move.get('score', 0)
+        comment = move.get('comment') or ''
+
+        if not isinstance(game_id, int) or isinstance(game_id, bool):
+            error('game_id must be an integer')
+        elif not isinstance(move_number, int) or isinstance(move_number, bool) or move_number < 1:
+            error('move_number must be a positive integer')
+        elif not isinstance(game_state, str) or len(game_state) > _GAME_STATE_LENGTH:
+            error(f'game_state must be a string of at most {_GAME_STATE_LENGTH} characters')
+        elif not isinstance(comment, str):
+            error('comment must be a string')
+        elif (game_id, move_number) in seen:
+            error(f'Same game_id and move_number as row {seen[game_id, move_number]}')
+        else:
+            seen[game_id, move_number] = index
+            # Scores are on the 0-10 scale; anything else counts as 0
+            if not isinstance(score, (int, float)) or isinstance(score, bool):
+                score = 0
+            rows.append({
+                'index': index,
+                'game_id': game_id,
+                'move_number': move_number,
+                'game_state': game_state,
+                'score': max(0, min(10, score)),
+                'is_blunder': bool(move.get('is_blunder', False)),
+                'is_brilliant': bool(move.get('is_brilliant', False)),
+                'comment': comment,
+            })
+
+    # One query checks every game the payload refers to
+    game_ids = {row['game_id'] for row in rows}
+    known = {game_id for game_id, in db.session.query(Game.id).filter(Game.id.in_(game_ids))} if game_ids else set()
+    for row in rows:
+        if row['game_id'] not in known:
+            errors.append({'index': row['index'], 'error': f"Game {row['game_id']} not found"})
+    rows = [row for row in rows if row['game_id'] in known]
+
+    errors.sort(key=lambda e: e['index'])
+    return rows, errors
+
+
+def store_moves(rows):
+    """Insert or update validated rows keyed on (game_id, move_number).
+
+    A retried batch overwrites the rows it wrote the first time instead of
+    duplicating them, and the player aggregates are adjusted for the rows it
+    replaced. Moves of a game whose analysis is packed are merged into the
+    packed analysis (services/stored_analysis.py) instead of becoming Move
+    rows. Everything happens in the caller's transaction; the caller commits.
+    """
+    if not rows:
+        return 0
+    games = {game.id: game for game in Game.query.options(undefer(Game.packed_analysis))
+             .filter(Game.id.in_({row['game_id'] for row in rows}))}
+    values = [{key: value for key, value in row.items() if key != 'index'} for row in rows]
+    added = {}
+    for row in values:
+        added.setdefault(row['game_id'], []).append(row)
+    packed = {game_id for game_id, game in games.items() if game.packed_analysis is not None}
+
+    # The Move rows about to be overwritten, so their scores can be taken back out
+    keys = {(row['game_id'], row['move_number']) for row in values if row['game_id'] not in packed}
+    replaced = {}
+    if keys:
+        for row in db.session.query(
+            Move.game_id, Move.move_number, Move.score, Move.is_blunder, Move.is_brilliant
+        ).filter(Move.game_id.in_({game_id for game_id, _ in keys}),
+                 Move.move_number.in_({move_number for _, move_number in keys})):
+            if (row.game_id, row.move_number) in keys:
+                replaced.setdefault(row.game_id, []).append(row._asdict())
+
+    unpacked = [row for row in values if row['game_id'] not in packed]
+    for start in range(0, len(unpacked), UPSERT_CHUNK_SIZE):
+        statement = insert(Move).values(unpacked[start:start + UPSERT_CHUNK_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=['game_id', 'move_number'],
+            set_={
+                name: statement.excluded[name]
+                for name in ('game_state', 'score', 'is_blunder', 'is_brilliant', 'comment')
+            }
+        )
+        db.session.execute(statement)
+
+    for game_id in packed:
+        game = games[game_id]
+        moves = {row['move_number']: dict(row, game_state=None) for row in unpack_analysis(game.packed_analysis)}
+        for row in added[game_id]:
+            if row['move_number'] in moves:
+                replaced.setdefault(game_id, []).append(moves[row['move_number']])
+            moves[row['move_number']] = row
+        moves = sorted(moves.values(), key=lambda row: row['move_number'])
+        if pack_analysis_or_none(moves) is None:
+            # Back to Move rows, which need the positions the packed moves left out
+            _fill_game_states(game, moves)
+        replace_analysis(game, moves, pack=True)
+
+    for game_id, game in games.items():
+        update_move_aggregates(game, added.get(game_id, []), replaced.get(game_id, []))
+    return len(values)
+
+
+def _fill_game_states(game, rows):
+    color = player_color(game)
+    plies = load_game_plies(game)
+    for row in rows:
+        ply = ply_for_move(row['move_number'], color)
+        if row['game_state'] is None and ply < len(plies):
+            row['game_state'] = plies[ply]['fen']
+
+
+def invalidate_move_responses(game_ids):
+    """Drop the cached analysis and player stats of games whose graded moves
+    changed. Call after the commit."""
+    game_ids = set(game_ids)
+    user_ids = [user_id for user_id, in db.session.query(Game.user_id).filter(Game.id.in_(game_ids))]
+    invalidate_responses('game_analysis', *game_ids)
+    invalidate_responses('player_stats', *user_ids)
@@ -0,0 +1,137 @@
+import os
+import random
+import struct
+import threading
+from collections import defaultdict
+
+import chess
+import chess.polyglot
+
+from services.analysis import read_pgn
+
+# How deep into a game book moves are collected when building from our games
+BOOK_MAX_PLY = 12
+
+# Polyglot move encoding of promotion pieces
+_PROMOTIONS = {chess.KNIGHT: 1, chess.BISHOP: 2, chess.ROOK: 3, chess.QUEEN: 4}
+_ENTRY = struct.Struct('>QHHI')
+
+
+class OpeningBook:
+    """Polyglot opening book consulted before the engine.
+
+    The file is memory mapped once and shared by every request, so a lookup
+    is a binary search over the mapped entries rather than an engine search.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._reader = chess.polyglot.open_reader(path)
+
+    def choose(self, board, choice='weighted', max_ply=BOOK_MAX_PLY, rng=random):
+        """Pick a book move for ``board`` or return None when out of book.
+
+        ``choice`` keeps each difficulty's character: 'best' always plays the
+        main line, 'weighted' samples by weight and 'uniform' treats every
+        book move the same, including the rare sidelines.
+        """
+        if board.ply() >= max_ply:
+            return None
+        entries = list(self._reader.find_all(board))
+        if not entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if choice == 'best':
+            return max(entries, key=lambda e: e.weight).move
+        if choice == 'uniform':
+            return rng.choice(entries).move
+        return rng.choices(entries, weights=[e.weight or 1 for e in entries])[0].move
+
+    def stats(self):
+        return {
+            'entries': len(self._reader),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def close(self):
+        self._reader.close()
+
+
+def _encode_move(board, move):
+    # Polyglot writes castling as the king capturing its own rook
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if board.is_kingside_castling(move) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    return to_square | move.from_square << 6 | _PROMOTIONS.get(move.promotion, 0) << 12
+
+
+# Points a game's result scores for (white, black)
+_RESULT_POINTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+
+
+def build_opening_book(games, path, max_ply=BOOK_MAX_PLY, min_games=2):
+    """Write a Polyglot book of the moves played in ``games``.
+
+    ``games`` yields (pgn, result) pairs; the site's PGNs carry no result, so
+    it comes from the Game row, with the PGN's Result header as a fallback
+    when it is None. Every time a move is played it adds one to its weight,
+    plus the points it scored for the side that played it (two for a win,
+    one for a draw), so popular moves are kept whoever won and moves that won
+    more often are chosen more often. Moves seen in fewer than ``min_games``
+    games are left out. Returns the number of entries written.
+    """
+    counts = defaultdict(lambda: [0, 0])  # (key, move) -> [games, weight]
+    for pgn, result in games:
+        try:
+            game = read_pgn(pgn)
+        except ValueError:
+            continue
+        points = _RESULT_POINTS.get(result or game.headers.get('Result'), (0, 0))
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= max_ply:
+                break
+            entry = counts[chess.polyglot.zobrist_hash(board), _encode_move(board, move)]
+            entry[0] += 1
+            entry[1] += 1 + (points[0] if board.turn == chess.WHITE else points[1])
+            board.push(move)
+
+    entries = sorted(
+        (key, raw_move, min(weight, 0xFFFF))
+        for (key, raw_move), (played, weight) in counts.items()
+        if played >= min_games
+    )
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for key, raw_move, weight in entries:
+            f.write(_ENTRY.pack(key, raw_move, weight, 0))
+    # Swap the file in whole so a running server never maps a half-written book
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+_books = {}
+_books_lock = threading.Lock()
+
+
+def get_opening_book(path):
+    """Return the shared OpeningBook for ``path``, or None if there is no book."""
+    if not path:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _books_lock:
+        book, loaded = _books.get(path, (None, None))
+        if loaded != mtime:
+            # First use, or the book was rebuilt: map the new file. The old map
+            # is left to be garbage collected as requests may still be reading it
+            book = OpeningBook(path) if os.path.getsize(path) else None
+            _books[path] = (book, mtime)
+        return book
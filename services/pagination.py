@@ -0,0 +1,58 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """A cursor that wasn't made by encode_cursor() for this listing."""
+
+
+def page_size():
+    """The request's ``limit`` argument, PAGE_SIZE by default and at most MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', type=int) or current_app.config.get('PAGE_SIZE', 50)
+    return max(1, min(limit, current_app.config.get('MAX_PAGE_SIZE', 200)))
+
+
+def encode_cursor(values):
+    """An opaque cursor for the sort key of the last row on a page."""
+    data = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """The sort key values in ``cursor``, converted to the types of ``columns``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor(cursor)
+        return [
+            datetime.fromisoformat(value) if column.type.python_type is datetime else column.type.python_type(value)
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def after_cursor(columns, cursor, descending=False):
+    """A filter for the rows that sort after ``cursor`` on ``columns``.
+
+    The columns must make a unique sort key, with the id last, and the query
+    must be ordered by them in the same direction.
+    """
+    key = tuple_(*columns)
+    values = tuple_(*decode_cursor(cursor, columns))
+    return key < values if descending else key > values
+
+
+def keyset_page(rows, limit, sort_key):
+    """Split rows fetched with LIMIT ``limit + 1`` into (page, next_cursor).
+
+    next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    return rows[:limit], encode_cursor(sort_key(rows[limit - 1]))
@@ -0,0 +1,63 @@
+from sqlalchemy import case, column, func, select, table
+
+from models import db, PlayerStats, User
+
+# The trigram index needs at least this many characters; shorter queries
+# match the start of usernames instead
+TRIGRAM_LENGTH = 3
+
+SEARCH_LIMIT = 10
+SEARCH_CANDIDATES = 50
+
+_user_search = table('user_search', column('rowid'))
+
+
+def players_query(*columns):
+    """Players joined to their stats, so listing them is one query rather
+    than a lazy load of User.stats for every row."""
+    return db.session.query(
+        User.id, User.username, User.last_login,
+        PlayerStats.rating, PlayerStats.wins, PlayerStats.losses, PlayerStats.draws,
+        *columns
+    ).outerjoin(PlayerStats, PlayerStats.user_id == User.id)
+
+
+def player_to_dict(row):
+    return {
+        'id': row.id,
+        'username': row.username,
+        'rating': row.rating if row.rating is not None else 1000,
+        'wins': row.wins or 0,
+        'losses': row.losses or 0,
+        'draws': row.draws or 0,
+        'last_active': row.last_login.isoformat() if row.last_login else None
+    }
+
+
+def _username_filter(q):
+    if db.engine.dialect.name != 'sqlite':
+        return User.username.ilike(f'%{q}%')
+    # Only the first SEARCH_CANDIDATES matches of each kind are ranked, which
+    # keeps a query that matches half the players as fast as one that
+    # matches a few. The ranking is exact once the query is that selective.
+    name = func.lower(User.username)
+    prefixes = select(User.id).where(name >= q, name < q + '\U0010ffff') \
+        .order_by(name).limit(SEARCH_CANDIDATES)
+    if len(q) < TRIGRAM_LENGTH:
+        return User.id.in_(prefixes)
+    # A quoted FTS5 string matches anywhere in the name, case-insensitively
+    phrase = '"' + q.replace('"', '""') + '"'
+    matches = select(_user_search.c.rowid).where(column('user_search').op('MATCH')(phrase)) \
+        .limit(SEARCH_CANDIDATES)
+    return User.id.in_(prefixes) | User.id.in_(matches)
+
+
+def search_players(q, exclude=None, limit=SEARCH_LIMIT):
+    """Players whose username contains ``q``: those whose name starts with it
+    first, then by rating."""
+    q = q.lower()
+    prefix = case((func.substr(func.lower(User.username), 1, len(q)) == q, 1), else_=0)
+    query = players_query().filter(_username_filter(q))
+    if exclude:
+        query = query.filter(User.id != exclude)
+    return query.order_by(prefix.desc(), PlayerStats.rating.desc(), User.username).limit(limit).all()
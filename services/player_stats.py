@@ -0,0 +1,180 @@
+from sqlalchemy import func, select, union_all
+
+from models import db, Friendship, Game, Move, PlayerStats
+from services.game_codec import unpack_analysis
+from services.response_cache import invalidate_responses
+from services.stored_analysis import load_analysis
+
+# The stats chart groups moves 1-5, 6-10, ..., 41-45 and 46 onwards
+MOVE_RANGE_SIZE = 5
+MOVE_RANGES = 10
+
+# Rating of a player before their first game, as registration and the
+# PlayerStats column default give it
+INITIAL_RATING = 1000
+
+
+def _move_range(move_number):
+    return min(max(move_number - 1, 0) // MOVE_RANGE_SIZE, MOVE_RANGES - 1)
+
+
+def game_average(game):
+    """Average score of a game's scored moves, or None before any are stored."""
+    if not game.moves_scored:
+        return None
+    return game.score_total / game.moves_scored
+
+
+def get_player_stats(user_id):
+    """The user's PlayerStats row, added to the session if they have none yet."""
+    stats = PlayerStats.query.filter_by(user_id=user_id).first()
+    if not stats:
+        stats = PlayerStats(user_id=user_id, wins=0, losses=0, draws=0, rating=INITIAL_RATING,
+                            highest_rating=INITIAL_RATING)
+        db.session.add(stats)
+    return stats
+
+
+def update_move_aggregates(game, added, removed=()):
+    """Fold a change to a game's graded moves into the game's and its player's totals.
+
+    ``added`` and ``removed`` are the stored and deleted rows as dicts with
+    move_number, score, is_blunder and is_brilliant. Call after the rows have
+    been written; the caller commits.
+    """
+    added = [row for row in added if row.get('score') is not None]
+    removed = [row for row in removed if row.get('score') is not None]
+    if not added and not removed:
+        return
+
+    old_average = game_average(game)
+    game.moves_scored = (game.moves_scored or 0) + len(added) - len(removed)
+    game.score_total = (game.score_total or 0.0) + sum(r['score'] for r in added) - sum(r['score'] for r in removed)
+    game.blunders = (game.blunders or 0) + sum(bool(r.get('is_blunder')) for r in added) \
+        - sum(bool(r.get('is_blunder')) for r in removed)
+    new_average = game_average(game)
+
+    if not game.user_id:
+        return
+    stats = get_player_stats(game.user_id)
+    stats.moves_scored = (stats.moves_scored or 0) + len(added) - len(removed)
+    stats.score_total = (stats.score_total or 0.0) + sum(r['score'] for r in added) - sum(r['score'] for r in removed)
+    stats.blunders = (stats.blunders or 0) + sum(bool(r.get('is_blunder')) for r in added) \
+        - sum(bool(r.get('is_blunder')) for r in removed)
+    stats.brilliants = (stats.brilliants or 0) + sum(bool(r.get('is_brilliant')) for r in added) \
+        - sum(bool(r.get('is_brilliant')) for r in removed)
+    stats.games_analyzed = (stats.games_analyzed or 0) + (old_average is None) - (new_average is None)
+
+    # Assign a new list so the JSON column is marked as changed
+    ranges = [list(r) for r in stats.move_range_scores or [[0.0, 0]] * MOVE_RANGES]
+    for rows, sign in ((added, 1), (removed, -1)):
+        for row in rows:
+            bucket = ranges[_move_range(row['move_number'])]
+            bucket[0] += sign * row['score']
+            bucket[1] += sign
+    stats.move_range_scores = ranges
+
+    # Records can only be updated in place while rows are added. When this
+    # game held one and some of its rows went, look the record up again.
+    if removed and game.id in (stats.best_move_game_id, stats.worst_move_game_id):
+        _reload_best_and_worst(stats)
+    else:
+        for row in added:
+            if stats.best_move_score is None or row['score'] > stats.best_move_score:
+                stats.best_move_game_id, stats.best_move_number, stats.best_move_score = \
+                    game.id, row['move_number'], row['score']
+            if stats.worst_move_score is None or row['score'] < stats.worst_move_score:
+                stats.worst_move_game_id, stats.worst_move_number, stats.worst_move_score = \
+                    game.id, row['move_number'], row['score']
+
+    if old_average is not None and (old_average >= (stats.highest_average or 0)
+                                    or old_average <= (stats.lowest_average or 0)):
+        _reload_average_range(stats)
+    elif new_average is not None:
+        if stats.highest_average is None or new_average > stats.highest_average:
+            stats.highest_average = new_average
+        if stats.lowest_average is None or new_average < stats.lowest_average:
+            stats.lowest_average = new_average
+
+
+def _reload_best_and_worst(stats):
+    # Ties go to the earliest move, over the Move rows and the packed analyses alike
+    scored = [tuple(row) for row in db.session.query(Move.score, Move.game_id, Move.move_number)
+              .join(Game, Move.game_id == Game.id)
+              .filter(Game.user_id == stats.user_id, Move.score.isnot(None))]
+    for game_id, packed in db.session.query(Game.id, Game.packed_analysis) \
+            .filter(Game.user_id == stats.user_id, Game.packed_analysis.isnot(None)):
+        scored.extend((row['score'], game_id, row['move_number'])
+                      for row in unpack_analysis(packed) if row['score'] is not None)
+    best = min(scored, key=lambda row: (-row[0], row[1], row[2]), default=None)
+    worst = min(scored, default=None)
+    stats.best_move_score, stats.best_move_game_id, stats.best_move_number = best or (None, None, None)
+    stats.worst_move_score, stats.worst_move_game_id, stats.worst_move_number = worst or (None, None, None)
+
+
+def _reload_average_range(stats):
+    average = Game.score_total / Game.moves_scored
+    stats.highest_average, stats.lowest_average = db.session.query(func.max(average), func.min(average)) \
+        .filter(Game.user_id == stats.user_id, Game.moves_scored > 0).one()
+
+
+def rebuild_player_stats(user_id):
+    """Recompute a player's move aggregates from their stored graded moves.
+
+    For backfilling data stored before the aggregates existed. The caller
+    commits.
+    """
+    stats = get_player_stats(user_id)
+    stats.games_analyzed = stats.moves_scored = stats.blunders = stats.brilliants = 0
+    stats.score_total = 0.0
+    stats.highest_average = stats.lowest_average = None
+    stats.best_move_game_id = stats.best_move_number = stats.best_move_score = None
+    stats.worst_move_game_id = stats.worst_move_number = stats.worst_move_score = None
+    stats.move_range_scores = None
+
+    for game in Game.query.filter_by(user_id=user_id).order_by(Game.id).all():
+        game.moves_scored, game.score_total, game.blunders = 0, 0.0, 0
+        update_move_aggregates(game, load_analysis(game.id))
+    return stats
+
+
+def invalidate_record_responses(user_id):
+    """Drop the cached responses that show a player's rating and record:
+    their own stats, their friends' friend lists and the friend requests
+    they have sent. Call after the commit."""
+    sent = select(Friendship.friend_id.label('other_id'), Friendship.status).where(Friendship.user_id == user_id)
+    received = select(Friendship.user_id.label('other_id'), Friendship.status).where(
+        Friendship.friend_id == user_id, Friendship.status == 'accepted')
+    rows = db.session.execute(union_all(sent, received)).all()
+    invalidate_responses('player_stats', user_id)
+    invalidate_responses('friends', *[other_id for other_id, status in rows if status == 'accepted'])
+    invalidate_responses('friend_requests', *[other_id for other_id, status in rows if status == 'pending'])
+
+
+def player_stats_to_dict(stats, last_game=None):
+    ranges = stats.move_range_scores or []
+    return {
+        'wins': stats.wins,
+        'losses': stats.losses,
+        'draws': stats.draws,
+        'rating': stats.rating,
+        'highest_rating': stats.highest_rating,
+        'games_analyzed': stats.games_analyzed or 0,
+        'moves_scored': stats.moves_scored or 0,
+        'average_score': stats.score_total / stats.moves_scored if stats.moves_scored else None,
+        'blunders': stats.blunders or 0,
+        'brilliants': stats.brilliants or 0,
+        'highest_average': stats.highest_average,
+        'lowest_average': stats.lowest_average,
+        'best_move': stats.best_move_number,
+        'best_move_game_id': stats.best_move_game_id,
+        'best_move_score': stats.best_move_score,
+        'worst_move': stats.worst_move_number,
+        'worst_move_game_id': stats.worst_move_game_id,
+        'worst_move_score': stats.worst_move_score,
+        # Average score per range of moves, None where no moves were scored
+        'average_scores': [total / count if count else None for total, count in ranges],
+        'last_game_id': stats.last_game_id,
+        'last_game_average': game_average(last_game) if last_game else None,
+        'last_game_blunders': last_game.blunders if last_game else None,
+    }
@@ -0,0 +1,172 @@
+import chess
+from sqlalchemy import case, insert, select, update
+
+from models import db, Game, PlayerStats
+from services.analysis_queue import player_color
+from services.difficulty import DIFFICULTY_PROFILES, get_profile
+from services.player_stats import INITIAL_RATING
+
+try:
+    import numpy as np
+except ImportError:  # recompute_ratings() falls back to plain Python
+    np = None
+
+# Elo K-factor: new players' ratings move quickly until they have played
+# PROVISIONAL_GAMES rated games, then settle
+PROVISIONAL_GAMES = 30
+PROVISIONAL_K = 40
+ESTABLISHED_K = 20
+
+# What recompute_ratings() rebuilds on PlayerStats
+RECORD_FIELDS = ('rating', 'highest_rating', 'wins', 'losses', 'draws')
+
+# White's score for each finished result
+RESULT_SCORES = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+
+
+def game_score(game):
+    """The player's score in a game, 1, 0.5 or 0, or None when it is
+    unfinished or doesn't say which side the player had."""
+    white_score = RESULT_SCORES.get(game.result)
+    color = player_color(game)
+    if white_score is None or color is None:
+        return None
+    return white_score if color == chess.WHITE else 1 - white_score
+
+
+def engine_rating(difficulty):
+    """The rating of the AI at a difficulty; games saved without one count as medium."""
+    return get_profile(difficulty)['rating']
+
+
+def expected_score(rating, opponent):
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+def k_factor(games_played):
+    return PROVISIONAL_K if games_played < PROVISIONAL_GAMES else ESTABLISHED_K
+
+
+def rating_change(rating, games_played, opponent, score):
+    return round(k_factor(games_played) * (score - expected_score(rating, opponent)))
+
+
+def apply_game_result(stats, game):
+    """Fold a saved game into the player's record and rating.
+
+    Returns the rating change, or None when the game isn't rated. The caller
+    commits.
+    """
+    score = game_score(game)
+    if score is None:
+        return None
+    played = (stats.wins or 0) + (stats.losses or 0) + (stats.draws or 0)
+    change = rating_change(stats.rating, played, engine_rating(game.difficulty), score)
+
+    if score == 1:
+        stats.wins = (stats.wins or 0) + 1
+    elif score == 0:
+        stats.losses = (stats.losses or 0) + 1
+    else:
+        stats.draws = (stats.draws or 0) + 1
+    stats.rating += change
+    stats.highest_rating = max(stats.highest_rating or stats.rating, stats.rating)
+    return change
+
+
+def _rated_games():
+    """User ids, opponent ratings and scores of every rated game, each
+    player's games together and in the order they were played.
+
+    game_score() and engine_rating() as SQL, so the rows come back ready to
+    replay without building an object per game.
+    """
+    player_won = ((Game.result == '1-0') & (Game.white_player == 'Player')) | \
+        ((Game.result == '0-1') & (Game.white_player != 'Player') & (Game.black_player == 'Player'))
+    score = case((Game.result == '1/2-1/2', 0.5), (player_won, 1.0), else_=0.0)
+    opponent = case(
+        {name: profile['rating'] for name, profile in DIFFICULTY_PROFILES.items()},
+        value=Game.difficulty, else_=engine_rating(None)
+    )
+    rows = db.session.execute(
+        select(Game.user_id, opponent, score)
+        .where(Game.user_id.isnot(None), Game.result.in_(RESULT_SCORES),
+               (Game.white_player == 'Player') | (Game.black_player == 'Player'))
+        .order_by(Game.user_id, Game.date_played, Game.id)
+    ).all()
+    return tuple(map(list, zip(*rows))) if rows else ([], [], [])
+
+
+def _replay_python(users, opponents, scores):
+    records = {}
+    for user_id, opponent, score in zip(users, opponents, scores):
+        record = records.setdefault(user_id, [INITIAL_RATING, INITIAL_RATING, 0, 0, 0])
+        rating, highest, wins, losses, draws = record
+        record[0] = rating = rating + rating_change(rating, wins + losses + draws, opponent, score)
+        record[1] = max(highest, rating)
+        record[2 if score == 1 else 3 if score == 0 else 4] += 1
+    return records
+
+
+def _replay_numpy(users, opponents, scores):
+    # Every player's opponent is the engine, whose rating is fixed, so players
+    # are independent: the n-th game of every player is replayed in one step.
+    users = np.asarray(users)
+    opponents = np.asarray(opponents, dtype=float)
+    scores = np.asarray(scores, dtype=float)
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    counts = np.diff(np.r_[starts, len(users)])
+    player = np.repeat(np.arange(len(starts)), counts)
+    played = np.arange(len(users)) - np.repeat(starts, counts)
+
+    order = np.argsort(played, kind='stable')
+    bounds = np.searchsorted(played[order], np.arange(counts.max() + 1))
+    rating = np.full(len(starts), float(INITIAL_RATING))
+    highest = rating.copy()
+    for n in range(counts.max()):
+        games = order[bounds[n]:bounds[n + 1]]
+        players = player[games]
+        expected = 1 / (1 + 10 ** ((opponents[games] - rating[players]) / 400))
+        rating[players] += np.rint(k_factor(n) * (scores[games] - expected))
+        highest[players] = np.maximum(highest[players], rating[players])
+
+    wins = np.bincount(player, weights=scores == 1)
+    losses = np.bincount(player, weights=scores == 0)
+    draws = counts - wins - losses
+    return {
+        int(user_id): [int(r), int(h), int(w), int(l), int(d)]
+        for user_id, r, h, w, l, d in zip(users[starts], rating, highest, wins, losses, draws)
+    }
+
+
+def recompute_ratings(use_numpy=None):
+    """Rebuild every player's rating, highest rating and record by replaying
+    all their games in the order they were played.
+
+    Vectorised with NumPy when it is installed (or with ``use_numpy``),
+    otherwise a plain loop over the games. Returns the number of players
+    rebuilt. The caller commits.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    elif use_numpy and np is None:
+        raise RuntimeError('NumPy is not installed')
+    users, opponents, scores = _rated_games()
+    replay = _replay_numpy if use_numpy and users else _replay_python
+    records = replay(users, opponents, scores)
+
+    stats_ids = dict(db.session.query(PlayerStats.user_id, PlayerStats.id))
+    fresh = [INITIAL_RATING, INITIAL_RATING, 0, 0, 0]
+    rows = [
+        dict(zip(RECORD_FIELDS, records.get(user_id, fresh)), id=stats_id)
+        for user_id, stats_id in stats_ids.items()
+    ]
+    if rows:
+        db.session.execute(update(PlayerStats), rows)
+    missing = [
+        dict(zip(RECORD_FIELDS, record), user_id=user_id)
+        for user_id, record in records.items() if user_id not in stats_ids
+    ]
+    if missing:
+        db.session.execute(insert(PlayerStats), missing)
+    return len(rows) + len(missing)
@@ -0,0 +1,136 @@
+import logging
+
+import chess
+from sqlalchemy import insert
+from sqlalchemy.orm import undefer
+
+from models import db, Game, GamePly, Move
+from services.analysis import read_pgn
+from services.game_codec import pack_analysis_or_none, pack_moves, unpack_moves
+
+logger = logging.getLogger(__name__)
+
+
+def _plies(board, moves):
+    rows = [{'ply': 0, 'san': None, 'uci': None, 'fen': board.fen()}]
+    for ply, move in enumerate(moves, start=1):
+        san = board.san(move)
+        board.push(move)
+        rows.append({'ply': ply, 'san': san, 'uci': move.uci(), 'fen': board.fen()})
+    return rows
+
+
+def game_plies(pgn):
+    """The starting position and the position after each ply of a PGN game,
+    as GamePly rows without the game_id."""
+    game = read_pgn(pgn)
+    return _plies(game.board(), game.mainline_moves())
+
+
+def store_game_plies(game, store_rows=True):
+    """Parse the game's PGN once, pack its moves into Game.packed_moves and,
+    with ``store_rows``, store its plies in place of any stored before.
+
+    Returns the number of plies, 0 when the PGN can't be read. The caller
+    commits.
+    """
+    if store_rows:
+        GamePly.query.filter_by(game_id=game.id).delete()
+    try:
+        rows = game_plies(game.pgn)
+    except ValueError as e:
+        logger.warning('Not storing plies for game %s: %s', game.id, e)
+        return 0
+    # Packed moves are replayed from the standard starting position
+    if rows[0]['fen'] == chess.STARTING_FEN:
+        game.packed_moves = pack_moves([chess.Move.from_uci(row['uci']) for row in rows[1:]])
+    if store_rows:
+        db.session.execute(insert(GamePly), [dict(row, game_id=game.id) for row in rows])
+    return len(rows)
+
+
+def load_game_plies(game):
+    """All of a game's plies in order, in one query.
+
+    Games without stored plies, because they were saved before plies were
+    or with STORE_GAME_PLIES off, are replayed from their packed moves or
+    PGN; `flask build-game-replays` stores their plies.
+    """
+    rows = db.session.query(GamePly.ply, GamePly.san, GamePly.uci, GamePly.fen) \
+        .filter(GamePly.game_id == game.id).order_by(GamePly.ply).all()
+    if rows:
+        return [row._asdict() for row in rows]
+    packed = db.session.query(Game.packed_moves).filter_by(id=game.id).scalar()
+    if packed:
+        return _plies(chess.Board(), unpack_moves(packed))
+    try:
+        return game_plies(game.pgn)
+    except ValueError:
+        return []
+
+
+def ply_for_move(move_number, color):
+    """The ply of a player's move, from its move number and the player's side."""
+    return 2 * move_number - (0 if color == chess.BLACK else 1)
+
+
+def ply_to_dict(row):
+    return {
+        'ply': row['ply'],
+        # Player-facing move number of the move that led here
+        'move_number': (row['ply'] + 1) // 2,
+        'san': row['san'],
+        'uci': row['uci'],
+        'fen': row['fen'],
+    }
+
+
+def store_missing_plies(batch_size=500):
+    """Store the plies of every game that has none; returns how many games.
+
+    Commits after each batch, so an interrupted backfill keeps its progress.
+    """
+    stored = 0
+    last_id = 0
+    while True:
+        games = Game.query.filter(Game.id > last_id, ~Game.plies.any()) \
+            .order_by(Game.id).limit(batch_size).all()
+        if not games:
+            return stored
+        for game in games:
+            stored += bool(store_game_plies(game))
+        db.session.commit()
+        last_id = games[-1].id
+
+
+def pack_stored_games(drop_plies=False, pack_analysis=False, batch_size=500):
+    """Fill in Game.packed_moves where missing; returns how many games were
+    packed.
+
+    With ``pack_analysis`` the Move rows of analysed games are moved into
+    Game.packed_analysis, and deleted from games that already have one. With
+    ``drop_plies`` the GamePly rows of every packed game are deleted too,
+    leaving replays to decode the packed moves. Commits after each batch, so
+    an interrupted run keeps its progress.
+    """
+    packed = 0
+    last_id = 0
+    while True:
+        games = Game.query.options(undefer(Game.packed_moves), undefer(Game.packed_analysis)) \
+            .filter(Game.id > last_id).order_by(Game.id).limit(batch_size).all()
+        if not games:
+            return packed
+        for game in games:
+            changed = False
+            if game.packed_moves is None:
+                changed = bool(store_game_plies(game, store_rows=False)) and game.packed_moves is not None
+            if pack_analysis and game.analyzed and game.packed_analysis is None and game.moves:
+                game.packed_analysis = pack_analysis_or_none(game.moves)
+                changed = changed or game.packed_analysis is not None
+            if pack_analysis and game.packed_analysis is not None and game.moves:
+                Move.query.filter_by(game_id=game.id).delete()
+            if drop_plies and game.packed_moves is not None:
+                GamePly.query.filter_by(game_id=game.id).delete()
+            packed += changed
+        db.session.commit()
+        last_id = games[-1].id
@@ -0,0 +1,143 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+
+class ResponseCache:
+    """Rendered JSON bodies of read-heavy GET routes with their strong ETags.
+
+    Entries are keyed by (kind, id), e.g. ('player_stats', 7), with one body
+    per query string. The writes that change a resource invalidate its key
+    once they are committed; the ``ttl`` bounds how stale an entry can get
+    when the write happened in another worker process.
+    """
+
+    def __init__(self, max_size=10000, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, variant):
+        """(entry, generation): the cached entry or None, and the generation
+        to hand back to put() so a body rendered before an invalidation is
+        never stored after it."""
+        with self._lock:
+            variants = self._entries.get(key)
+            entry = variants.get(variant) if variants else None
+            if entry is not None and entry['expires'] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, self._generation
+            if variants:
+                variants.pop(variant, None)
+            self.misses += 1
+            return None, self._generation
+
+    def put(self, key, variant, body, cache_control, generation):
+        entry = {
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'cache_control': cache_control,
+            'expires': time.monotonic() + self.ttl,
+        }
+        with self._lock:
+            if generation == self._generation:
+                self._entries.setdefault(key, {})[variant] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, kind, *ids):
+        with self._lock:
+            self._generation += 1
+            for id_ in ids:
+                if self._entries.pop((kind, id_), None) is not None:
+                    self.invalidations += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'not_modified': self.not_modified,
+                'invalidations': self.invalidations,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.hits = self.misses = self.not_modified = self.invalidations = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                max_size=current_app.config.get('RESPONSE_CACHE_SIZE', 10000),
+                ttl=current_app.config.get('RESPONSE_CACHE_TTL', 30),
+            )
+        return _cache
+
+
+def invalidate_responses(kind, *ids):
+    """Drop the cached responses for these ids; call after the commit."""
+    get_response_cache().invalidate(kind, *[int(id_) for id_ in ids if id_ is not None])
+
+
+def cached_json(kind, arg):
+    """Cache a JSON GET view's 200 responses under (kind, the ``arg`` URL value).
+
+    Responses carry the body's ETag and answer a matching If-None-Match with
+    304 Not Modified. They are sent with Cache-Control: no-cache, so browsers
+    revalidate each time, unless the view set its own Cache-Control.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            cache = get_response_cache()
+            key, variant = (kind, kwargs[arg]), request.query_string
+            entry, generation = cache.get(key, variant)
+            if entry is None:
+                response = current_app.make_response(view(**kwargs))
+                if response.status_code != 200 or not response.is_json:
+                    return response
+                entry = cache.put(key, variant, response.get_data(),
+                                  response.headers.get('Cache-Control', 'no-cache'), generation)
+
+            response = current_app.response_class(entry['body'], mimetype='application/json')
+            response.set_etag(entry['etag'])
+            response.headers['Cache-Control'] = entry['cache_control']
+            response.make_conditional(request)
+            if response.status_code == 304:
+                cache.record_not_modified()
+            return response
+        return wrapper
+    return decorator
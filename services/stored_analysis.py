@@ -0,0 +1,42 @@
+"""Where a game's graded moves are stored.
+
+Games keep a Move row per graded move. With PACK_ANALYSIS on, analysed
+games keep them packed into Game.packed_analysis instead
+(services/game_codec.py) and have no Move rows, unless the packed format
+can't hold their grades. A game with Game.packed_analysis set keeps all of
+its graded moves there.
+"""
+from sqlalchemy import insert
+
+from models import db, Game, Move
+from services.game_codec import pack_analysis_or_none, unpack_analysis
+
+_MOVE_FIELDS = ('move_number', 'game_state', 'score', 'is_blunder', 'is_brilliant', 'comment')
+
+
+def load_analysis(game_id):
+    """A game's graded moves in move order, as dicts with the Move columns.
+
+    game_state is None for packed games; their positions come from the
+    game's plies (services/replay.py).
+    """
+    packed = db.session.query(Game.packed_analysis).filter_by(id=game_id).scalar()
+    if packed is not None:
+        return [dict(row, game_state=None) for row in unpack_analysis(packed)]
+    return [row._asdict() for row in db.session.query(*(getattr(Move, name) for name in _MOVE_FIELDS))
+            .filter(Move.game_id == game_id).order_by(Move.move_number)]
+
+
+def replace_analysis(game, rows, pack=False):
+    """Store ``rows`` as all of a game's graded moves: as Move rows, or with
+    ``pack`` packed into Game.packed_analysis when they fit.
+
+    Rows are dicts with the Move columns; game_state is only kept in Move
+    rows. The caller commits.
+    """
+    Move.query.filter_by(game_id=game.id).delete()
+    game.packed_analysis = pack_analysis_or_none(rows) if pack else None
+    if game.packed_analysis is None and rows:
+        db.session.execute(insert(Move), [
+            dict({name: row.get(name) for name in _MOVE_FIELDS}, game_id=game.id) for row in rows
+        ])
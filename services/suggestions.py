@@ -0,0 +1,165 @@
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask import current_app
+from sqlalchemy import func, select, union_all
+
+from models import db, Friendship, PlayerStats, User
+from services.player_search import player_to_dict, players_query
+
+SUGGESTION_COUNT = 5
+
+
+class SuggestionCache:
+    """Per-user friend suggestions, each kept for ``ttl`` seconds.
+
+    Suggestions change slowly, so a user opening the friends page again
+    shortly after gets the same list without any queries. Friendship
+    changes invalidate both players' entries.
+    """
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, user_id, suggestions):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, suggestions)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_suggestion_cache():
+    """Return the process-wide suggestion cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SuggestionCache(
+                max_size=current_app.config.get('SUGGESTION_CACHE_SIZE', 10000),
+                ttl=current_app.config.get('SUGGESTION_CACHE_TTL', 300),
+            )
+        return _cache
+
+
+def _connected_ids(user_id):
+    """Everyone the user has a friendship with, whatever its status, and
+    the ones that are accepted."""
+    rows = db.session.query(Friendship.user_id, Friendship.friend_id, Friendship.status).filter(
+        (Friendship.user_id == user_id) | (Friendship.friend_id == user_id)
+    ).all()
+    connected = {friend_id if uid == user_id else uid for uid, friend_id, _ in rows}
+    friends = {friend_id if uid == user_id else uid for uid, friend_id, status in rows if status == 'accepted'}
+    return connected, friends
+
+
+def _friends_of_friends(friend_ids):
+    """Candidate ids with how many of ``friend_ids`` each is friends with."""
+    sent = select(Friendship.friend_id.label('candidate')).where(
+        Friendship.user_id.in_(friend_ids), Friendship.status == 'accepted')
+    received = select(Friendship.user_id.label('candidate')).where(
+        Friendship.friend_id.in_(friend_ids), Friendship.status == 'accepted')
+    return Counter(candidate for candidate, in db.session.execute(union_all(sent, received)))
+
+
+def _similar_rating(user_id, count):
+    """Ids of players rated closest to the user, ``count`` from either side."""
+    rating = db.session.query(PlayerStats.rating).filter_by(user_id=user_id).scalar() or 1000
+    above = select(PlayerStats.user_id, PlayerStats.rating).where(PlayerStats.rating >= rating) \
+        .order_by(PlayerStats.rating).limit(count)
+    below = select(PlayerStats.user_id, PlayerStats.rating).where(PlayerStats.rating < rating) \
+        .order_by(PlayerStats.rating.desc()).limit(count)
+    rows = db.session.execute(union_all(above.subquery().select(), below.subquery().select())).all()
+    return [candidate for candidate, candidate_rating in sorted(rows, key=lambda row: abs(row[1] - rating))]
+
+
+def _random_players(count):
+    """Ids of ``count`` players from a random point in the id order.
+
+    Seeks into the primary key instead of ORDER BY RANDOM(), wrapping round
+    to the lowest ids when the start is near the end.
+    """
+    highest = db.session.query(func.max(User.id)).scalar() or 0
+    start = random.randint(1, highest) if highest else 1
+    after = select(User.id).where(User.id >= start).order_by(User.id).limit(count)
+    before = select(User.id).where(User.id < start).order_by(User.id).limit(count)
+    return [candidate for candidate, in db.session.execute(union_all(after.subquery().select(),
+                                                                     before.subquery().select()))]
+
+
+def suggest_players(user_id, count=SUGGESTION_COUNT):
+    """Up to ``count`` players the user has no friendship with.
+
+    Players with the most mutual friends come first, then those rated
+    closest to the user, then random players. Every query is an index seek,
+    so the cost doesn't grow with the number of players.
+    """
+    connected, friends = _connected_ids(user_id)
+    # Room for the candidates that turn out to be excluded
+    wanted = count * 4
+
+    mutual = _friends_of_friends(friends)
+    reasons = OrderedDict()
+    for candidate, _ in mutual.most_common():
+        reasons.setdefault(candidate, 'mutual_friends')
+    for candidate in _similar_rating(user_id, wanted):
+        reasons.setdefault(candidate, 'similar_rating')
+    for candidate in _random_players(wanted):
+        reasons.setdefault(candidate, 'random')
+
+    chosen = [candidate for candidate in reasons
+              if candidate != user_id and candidate not in connected][:count]
+    rows = {row.id: row for row in players_query().filter(User.id.in_(chosen))}
+
+    suggestions = []
+    for candidate in chosen:
+        if candidate in rows:
+            suggestion = player_to_dict(rows[candidate])
+            suggestion['reason'] = reasons[candidate]
+            suggestion['mutual_friends'] = mutual.get(candidate, 0)
+            suggestions.append(suggestion)
+    return suggestions
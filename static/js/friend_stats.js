@@ -74,12 +74,8 @@ async function loadAndDisplayFriendStats() {
         const stats = await fetchFriendStats();
         if (!stats) return;
 
-        // Fetch game analysis if available
-        let analysis = [];
-        
-        if (stats.last_game_id) {
-          analysis = await fetchGameAnalysis(stats.last_game_id);
-        }
+        // The last game's move scores come with the stats
+        const analysis = Array.isArray(stats.last_game_moves) ? stats.last_game_moves : [];
 
         // Update the UI
         updateStatsDisplay(stats, analysis);
@@ -113,45 +109,6 @@ async function fetchFriendStats() {
     }
 }
 
-/**
- * Fetch game analysis data
- */
-async function fetchGameAnalysis(gameId) {
-  try {
-      if (!gameId) {
-          console.warn("No game ID provided for analysis");
-          return [];
-      }
-
-      // Show loading state
-      document.getElementById('gameInsights').innerHTML = "<p>Analyzing game moves...</p>";
-
-      const response = await fetch(`/api/game_analysis/${gameId}`);
-      
-      if (!response.ok) {
-          throw new Error(`Failed to get analysis: ${response.status}`);
-      }
-
-      const analysis = await response.json();
-      
-      if (!Array.isArray(analysis)) {
-          console.warn("Unexpected analysis format:", analysis);
-          return [];
-      }
-
-      // Sort by move number
-      analysis.sort((a, b) => a.move_number - b.move_number);
-      
-      return analysis;
-
-  } catch (error) {
-      console.error("Error fetching game analysis:", error);
-      document.getElementById('gameInsights').innerHTML = 
-          `<p>Couldn't load game analysis: ${error.message}</p>`;
-      return [];
-  }
-}
-
 /**
  * Update the stats display with friend data
  */
@@ -160,48 +117,31 @@ function updateStatsDisplay(stats, analysis) {
   analysis = Array.isArray(analysis) ? analysis : [];
   stats = stats || {};
 
-  // Find best and worst moves
-  const bestMove = analysis.length > 0 
-    ? analysis.reduce((best, move) => {
-        if (move.is_brilliant) return move; // Prefer brilliant moves
-        return move.score > best.score ? move : best;
-      }, { score: -Infinity, move_number: 'N/A' })
-    : { score: 'N/A', move_number: 'N/A' };
-    
-  const worstMove = analysis.length > 0
-    ? analysis.reduce((worst, move) => {
-        if (move.is_blunder) return move; // Prefer blunders
-        return move.score < worst.score ? move : worst;
-      }, { score: Infinity, move_number: 'N/A' })
-    : { score: 'N/A', move_number: 'N/A' };
-
   // Helper to safely set text content
   function setText(id, value) {
     const el = document.getElementById(id);
     if (el) el.textContent = value;
   }
 
-  // Best move
+  // Best and worst moves over every analysed game, kept by the server
   setText(
     'bestMove',
-    bestMove.move_number !== 'N/A'
-      ? `Move ${bestMove.move_number} (${typeof bestMove.score === 'number' ? bestMove.score.toFixed(1) : bestMove.score})${bestMove.is_brilliant ? ' ★' : ''}`
+    typeof stats.best_move_score === 'number'
+      ? `Move ${stats.best_move} (${stats.best_move_score.toFixed(1)})`
       : 'N/A'
   );
-
-  // Worst move
   setText(
     'worstMove',
-    worstMove.move_number !== 'N/A'
-      ? `Move ${worstMove.move_number} (${typeof worstMove.score === 'number' ? worstMove.score.toFixed(1) : worstMove.score})${worstMove.is_blunder ? ' ⚠' : ''}`
+    typeof stats.worst_move_score === 'number'
+      ? `Move ${stats.worst_move} (${stats.worst_move_score.toFixed(1)})`
       : 'N/A'
   );
 
   // Last game average
   setText(
     'lastGameAvg',
-    typeof stats.average_score === 'number'
-      ? stats.average_score.toFixed(1)
+    typeof stats.last_game_average === 'number'
+      ? stats.last_game_average.toFixed(1)
       : 'N/A'
   );
 
@@ -16,14 +16,27 @@ const suggestionCountBadge = document.getElementById('suggestionCount');
 const friendCardTemplate = document.getElementById('friendCardTemplate');
 const requestCardTemplate = document.getElementById('requestCardTemplate');
 
+// Search-as-you-type debounce
+let searchTimer = null;
+const SEARCH_DELAY_MS = 250;
+const SEARCH_MIN_LENGTH = 2;
+
 // Event Listeners
 document.addEventListener('DOMContentLoaded', initializeFriendsPage);
 searchButton.addEventListener('click', searchPlayers);
 friendSearchInput.addEventListener('keyup', (e) => {
     if (e.key === 'Enter') {
+        clearTimeout(searchTimer);
         searchPlayers();
     }
 });
+// Search as the user types, once they pause
+friendSearchInput.addEventListener('input', () => {
+    clearTimeout(searchTimer);
+    if (friendSearchInput.value.trim().length >= SEARCH_MIN_LENGTH) {
+        searchTimer = setTimeout(searchPlayers, SEARCH_DELAY_MS);
+    }
+});
 
 /**
  * Initialize the friends page
@@ -119,30 +132,53 @@ async function getUserData() {
 }
 
 /**
- * Load the list of friends
+ * Add a "Show more" button that loads the next page of a list
  */
-async function loadFriendsList() {
+function appendShowMoreButton(listElem, loadPage, nextCursor) {
+    const button = document.createElement('button');
+    button.className = 'btn btn-outline-secondary w-100 mt-3 show-more';
+    button.textContent = 'Show more';
+    button.addEventListener('click', () => {
+        button.remove();
+        loadPage(nextCursor);
+    });
+    listElem.appendChild(button);
+}
+
+/**
+ * Load the list of friends, a page at a time
+ */
+async function loadFriendsList(cursor = null) {
     try {
-        friendsListElem.innerHTML = '<div class="empty-state"><p>Loading your friends list...</p><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div></div>';
-        
-        const response = await fetch(`/api/friends/${currentUserId}`);
-        const friends = await response.json();
-        
-        friendCountBadge.textContent = friends.length;
-        
-        if (friends.length === 0) {
+        if (!cursor) {
+            friendsListElem.innerHTML = '<div class="empty-state"><p>Loading your friends list...</p><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div></div>';
+        }
+
+        const url = `/api/friends/${currentUserId}` + (cursor ? `?cursor=${encodeURIComponent(cursor)}` : '');
+        const response = await fetch(url);
+        const data = await response.json();
+        const friends = data.friends;
+
+        if (!cursor && friends.length === 0) {
+            friendCountBadge.textContent = 0;
             friendsListElem.innerHTML = '<div class="empty-state"><p>You don\'t have any friends yet. Add some from the suggestions tab or search for players.</p></div>';
             return;
         }
 
-        // Clear and populate the friends list
-        friendsListElem.innerHTML = '';
+        // Clear the list for the first page, then append to it
+        if (!cursor) {
+            friendsListElem.innerHTML = '';
+        }
 
         for (const friend of friends) {
-            const stats = await fetchFriendStats(friend.id);
-            const card = createFriendCard(friend, stats);
+            const card = createFriendCard(friend);
             friendsListElem.appendChild(card);
         }
+
+        friendCountBadge.textContent = data.total;
+        if (data.next_cursor) {
+            appendShowMoreButton(friendsListElem, loadFriendsList, data.next_cursor);
+        }
     } catch (error) {
         console.error('Error loading friends:', error);
         friendsListElem.innerHTML = '<div class="empty-state"><p>Error loading friends. Please try again.</p></div>';
@@ -150,40 +186,45 @@ async function loadFriendsList() {
 }
 
 /**
- * Load friend requests
+ * Load friend requests, a page at a time
  */
-async function loadFriendRequests() {
+async function loadFriendRequests(cursor = null) {
     try {
-        friendRequestsElem.innerHTML = '<div class="empty-state"><p>Checking for friend requests...</p><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div></div>';
-        
-        // Add a timestamp to prevent caching
-        const timestamp = new Date().getTime();
-        const response = await fetch(`/api/friend_requests/${currentUserId}?t=${timestamp}`, {
-            headers: {
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache'
-            }
-        });
-        
-        const requests = await response.json();
-        
+        if (!cursor) {
+            friendRequestsElem.innerHTML = '<div class="empty-state"><p>Checking for friend requests...</p><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div></div>';
+        }
+
+        // The server sends an ETag and Cache-Control: no-cache, so the browser
+        // revalidates each time and an unchanged list comes back as a 304
+        const url = `/api/friend_requests/${currentUserId}` + (cursor ? `?cursor=${encodeURIComponent(cursor)}` : '');
+        const response = await fetch(url);
+
+        const data = await response.json();
+        const requests = data.requests;
+
         // Debug info about received requests
         console.log('Received friend requests:', requests);
-        
-        requestCountBadge.textContent = requests.length;
-        
-        if (requests.length === 0) {
+
+        if (!cursor && requests.length === 0) {
+            requestCountBadge.textContent = 0;
             friendRequestsElem.innerHTML = '<div class="empty-state"><p>You don\'t have any pending friend requests.</p></div>';
             return;
         }
 
-        // Clear and populate the requests list
-        friendRequestsElem.innerHTML = '';
+        // Clear the list for the first page, then append to it
+        if (!cursor) {
+            friendRequestsElem.innerHTML = '';
+        }
 
         for (const request of requests) {
             const card = createRequestCard(request);
             friendRequestsElem.appendChild(card);
         }
+
+        requestCountBadge.textContent = data.total;
+        if (data.next_cursor) {
+            appendShowMoreButton(friendRequestsElem, loadFriendRequests, data.next_cursor);
+        }
     } catch (error) {
         console.error('Error loading friend requests:', error);
         friendRequestsElem.innerHTML = '<div class="empty-state"><p>Error loading friend requests. Please try again.</p></div>';
@@ -235,8 +276,14 @@ async function searchPlayers() {
         suggestionsListElem.innerHTML = '<div class="empty-state"><p>Searching for players...</p><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div></div>';
         
         const response = await fetch(`/api/search_players?q=${encodeURIComponent(query)}&exclude=${currentUserId}`);
-        const players = await response.json();
-        
+        const data = await response.json();
+
+        // A slower response to an earlier keystroke; a newer search is on its way
+        if (data.query !== friendSearchInput.value.trim()) {
+            return;
+        }
+        const players = data.results;
+
         // Switch to suggestions tab
         document.getElementById('suggestions-tab').click();
         
@@ -262,7 +309,7 @@ async function searchPlayers() {
 /**
  * Create a friend card element
  */
-function createFriendCard(friend, stats) {
+function createFriendCard(friend) {
     const fragment = friendCardTemplate.content.cloneNode(true);
     const card = fragment.querySelector('.col');
     
@@ -270,9 +317,7 @@ function createFriendCard(friend, stats) {
     card.querySelector('[data-name]').textContent = friend.username;
     card.querySelector('[data-rating]').textContent = `Rating: ${friend.rating || 1000}`;
     
-    if (stats) {
-        card.querySelector('[data-stats]').textContent = `W: ${stats.wins || 0} | L: ${stats.losses || 0} | D: ${stats.draws || 0}`;
-    }
+    card.querySelector('[data-stats]').textContent = `W: ${friend.wins} | L: ${friend.losses} | D: ${friend.draws}`;
     
     // Format last active time
     const lastActive = friend.last_active ? formatLastActivity(new Date(friend.last_active)) : 'Unknown';
@@ -376,6 +421,9 @@ function createSuggestionCard(player) {
     // Format last active time
     const lastActive = player.last_active ? formatLastActivity(new Date(player.last_active)) : 'Unknown';
     card.querySelector('[data-last-active]').textContent = `Last active: ${lastActive}`;
+    if (player.mutual_friends) {
+        card.querySelector('[data-last-active]').textContent += ` | ${player.mutual_friends} mutual friend${player.mutual_friends === 1 ? '' : 's'}`;
+    }
     
     // Replace the action buttons
     const buttonsContainer = card.querySelector('.action-buttons');
@@ -490,19 +538,6 @@ async function sendFriendRequest(friendId, friendUsername) {
     }
 }
 
-/**
- * Fetch a friend's stats
- */
-async function fetchFriendStats(friendId) {
-    try {
-        const response = await fetch(`/api/player_stats/${friendId}`);
-        return await response.json();
-    } catch (error) {
-        console.error('Error fetching friend stats:', error);
-        return null;
-    }
-}
-
 /**
  * Format the last active time as a relative time string
  */
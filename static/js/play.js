@@ -9,13 +9,14 @@ let aiMoveRequestId = 0;
 
 let moveHistory = []; // Track the history of FEN positions
 let currentMoveIndex = 0; // Track the current position in the history
-let moveRecordingQueue = [];
 let isProcessingQueue = [];
 let pendingMoves = [];
+let stopEvaluationStream = null; // Stops the evaluation stream of the position on the board
 
 // Initialize board with custom click-to-move interaction
 function initializeBoard(orientation) {
   boardOrientation = orientation;
+  stopEvaluation();
   game.reset(); // Reset game state
   selectedSquare = null;
 
@@ -123,51 +124,58 @@ async function getAIMove(fen) {
   }
 }
 
-async function getEvaluation(fen) {
-  try {
-    const response = await fetch("/get_evaluation", {
-      method: "POST",
-      headers: { 
-        "Content-Type": "application/json",
-        "X-CSRFToken": window.csrfToken // <-- Add CSRF token
-      },
-      body: JSON.stringify({ fen, difficulty: selectedDifficulty }),
-    });
-
-    const data = await response.json();
-    if (data.error) {
-      console.error("Error received from evaluation:", data.error);
-      return null;
+// Streams the evaluation of a position, updating the evaluation text after
+// every search depth. Returns a function that stops the stream.
+function streamEvaluation(fen) {
+  const params = new URLSearchParams({ fen, difficulty: selectedDifficulty });
+  const source = new EventSource(`/stream_evaluation?${params}`);
+
+  source.onmessage = (event) => {
+    updateEvalText(JSON.parse(event.data).evaluation);
+  };
+  source.addEventListener("done", (event) => {
+    updateEvalText(JSON.parse(event.data).evaluation);
+    source.close();
+  });
+  source.addEventListener("error", (event) => {
+    if (event.data) {
+      console.error("Error received from evaluation stream:", JSON.parse(event.data).error);
     }
+    source.close();
+  });
 
-    return data.evaluation;
-  } catch (error) {
-    console.error("Error fetching evaluation:", error);
-    return null;
+  return () => source.close();
+}
+
+// Only one position is evaluated at a time; a new one stops the last stream
+function evaluatePosition(fen) {
+  stopEvaluation();
+  stopEvaluationStream = streamEvaluation(fen);
+}
+
+function stopEvaluation() {
+  if (stopEvaluationStream) {
+    stopEvaluationStream();
+    stopEvaluationStream = null;
   }
 }
 
-function updateScoreText(evaluation) {
+function updateEvalText(evaluation) {
   if (isNaN(evaluation) || evaluation === null || evaluation === undefined) {
-    $("#scoreText").text("Evaluation: Not available");
+    $("#evalText").text("Evaluation: Not available");
     return;
   }
 
+  // Evaluations are from white's side
+  const playerEvaluation = boardOrientation === "white" ? evaluation : -evaluation;
   let scoreDisplay = "";
-  if (evaluation === 10000) {
-    scoreDisplay = "Mate in N (AI is winning)";
-  } else if (evaluation === -10000) {
-    scoreDisplay = "Mate in N (You are winning)";
+  if (Math.abs(playerEvaluation) === 10000) {
+    scoreDisplay = playerEvaluation > 0 ? "Mate in N (You are winning)" : "Mate in N (AI is winning)";
   } else {
-    const scoreInPawns = (evaluation / 100).toFixed(2);
-    if (boardOrientation === "white") {
-      scoreDisplay = `Evaluation: ${scoreInPawns} pawns`;
-    } else {
-      scoreDisplay = `Evaluation: ${-scoreInPawns} pawns`;
-    }
+    scoreDisplay = `Evaluation: ${(playerEvaluation / 100).toFixed(2)} pawns`;
   }
 
-  $("#scoreText").text(scoreDisplay);
+  $("#evalText").text(scoreDisplay);
 }
 
 async function playAIMove() {
@@ -213,6 +221,9 @@ async function playAIMove() {
           setTimeout(() => {
             showDrawModal(); // Show the draw modal
           }, 500);
+        } else {
+          // Evaluate the position while the player thinks
+          evaluatePosition(game.fen());
         }
       }
     }, 1000);
@@ -245,20 +256,6 @@ async function showGameResult(result) {
       result
     );
 
-    if (saveResponse.game_id) {
-      // Trigger analysis
-      const analysisResponse = await fetch(
-        `/analyze_game/${saveResponse.game_id}`,
-        {
-          method: "POST",
-        }
-      );
-
-      if (!analysisResponse.ok) {
-        console.error("Analysis failed to start");
-      }
-    }
-
     // Check if there was an error in the response
     if (saveResponse.error) {
       console.error("Save game returned an error:", saveResponse.error);
@@ -313,7 +310,7 @@ async function evaluatePlayerMove(fenBefore, move) {
     const data = await response.json();
     if (data.error) {
       console.error("Error evaluating move:", data.error);
-      return;
+      return null;
     }
 
     // Display the score and feedback (not comment)
@@ -321,8 +318,10 @@ async function evaluatePlayerMove(fenBefore, move) {
     $("#scoreText").html(
       `<span class="black-text"><b>Score:</b> ${score} – ${feedback}</span>`
     );
+    return data;
   } catch (error) {
     console.error("Error fetching evaluation:", error);
+    return null;
   }
 }
 
@@ -404,6 +403,8 @@ async function onSquareClick(square) {
               return;
             }
 
+            // Free the engine for grading the move and the AI's reply
+            stopEvaluation();
             $("#moveText").html(
               `<span class="black-text">Moved from <b>${move.from}</b> to <b>${move.to}</b></span>`
             );
@@ -415,18 +416,8 @@ async function onSquareClick(square) {
             const uciMove = move.promotion
               ? `${move.from}${move.to}${move.promotion}`
               : `${move.from}${move.to}`;
-            evaluatePlayerMove(fenBefore, uciMove);
-
-            // Evaluate the position after the player's move
-            const evalMoveResponse = await fetch("/evaluate_move", {
-              method: "POST",
-              headers: { 
-                "Content-Type": "application/json",
-                "X-CSRFToken": window.csrfToken // <-- Add this line
-              },
-              body: JSON.stringify({ fen_before: fenBefore, move: uciMove }),
-            });
-            const evalMoveData = await evalMoveResponse.json();
+            // Grade the player's move once and reuse the result for recording
+            const evalMoveData = (await evaluatePlayerMove(fenBefore, uciMove)) || {};
             const score = evalMoveData.score ?? 0;
 
             // Record the player move
@@ -472,6 +463,8 @@ async function onSquareClick(square) {
           return;
         }
 
+        // Free the engine for grading the move and the AI's reply
+        stopEvaluation();
         $("#moveText").html(
           `<span class="black-text">Moved from <b>${move.from}</b> to <b>${move.to}</b></span>`
         );
@@ -481,18 +474,8 @@ async function onSquareClick(square) {
 
         const gameState = game.fen();
         const uciMove = `${move.from}${move.to}`;
-        evaluatePlayerMove(fenBefore, uciMove);
-
-        // Evaluate the position after the player's move
-        const evalMoveResponse = await fetch("/evaluate_move", {
-          method: "POST",
-          headers: { 
-            "Content-Type": "application/json",
-            "X-CSRFToken": window.csrfToken // <-- Add this line
-          },
-          body: JSON.stringify({ fen_before: fenBefore, move: uciMove }),
-        });
-        const evalMoveData = await evalMoveResponse.json();
+        // Grade the player's move once and reuse the result for recording
+        const evalMoveData = (await evaluatePlayerMove(fenBefore, uciMove)) || {};
         const score = evalMoveData.score ?? 0;
 
         pendingMoves.push({
@@ -574,6 +557,7 @@ $("#playWhite").click(() => initializeBoard("white"));
 $("#playBlack").click(() => initializeBoard("black"));
 
 $("#reset").click(() => {
+  stopEvaluation();
   game.reset();
   board1.start();
   selectedSquare = null;
@@ -655,6 +639,7 @@ async function startGame(difficulty) {
                 <div class="card-body">
                     <p class="card-text fs-5" id="moveText" style="text-align: left; color: black">No moves yet.</p>
                     <p class="card-text fs-5" id="scoreText" style="text-align: left;"></p>
+                    <p class="card-text fs-5" id="evalText" style="text-align: left; color: black"></p>
                 </div>
             </div>
 
@@ -754,6 +739,7 @@ async function saveGame(pgn, white, black, result) {
         black: blackName,
         result: validResult,
         user_id: userId,
+        difficulty: selectedDifficulty,
         analyzed: false,
       }),
     });
@@ -779,23 +765,6 @@ async function saveGame(pgn, white, black, result) {
   }
 }
 
-async function updateGameResult(gameId, result) {
-  try {
-    const response = await fetch(`/update_game/${gameId}`, {
-      method: "POST",
-      headers: { 
-        "Content-Type": "application/json",
-        "X-CSRFToken": window.csrfToken // <-- Add CSRF token
-      },
-      body: JSON.stringify({ result }),
-    });
-    return await response.json();
-  } catch (error) {
-    console.error("Error updating game result:", error);
-    return { error: error.message };
-  }
-}
-
 // Helper function to update the state of the Previous and Next buttons
 function updateNavigationButtons() {
   if (currentMoveIndex <= 0) {
@@ -913,11 +882,9 @@ async function showCheckmateOptions() {
       localStorage.setItem("user", JSON.stringify(userData));
     }
 
-    // Now update all pendingMoves with the correct game_id
-    pendingMoves.forEach(m => m.game_id = saveResponse.game_id);
-
-    // Save all moves to the database
-    await saveAllMoves();
+    // The server grades every move of the finished game in the background
+    // and writes the Move rows itself, so the per-move scores are not sent
+    pendingMoves = [];
   }
 
   $("#resignButton").replaceWith(`
@@ -1071,146 +1038,3 @@ function showDrawModal() {
 function closeDrawModal() {
     $('#drawModal').remove(); // Remove the modal from the DOM
 }
-
-async function recordMove(gameId, gameState, score) {
-  if (!gameId) {
-    console.warn("No game ID available - move recording queued for later");
-    moveRecordingQueue.push(gameState);
-    showRecordingStatus("warning");
-    return null;
-  }
-
-  try {
-    showRecordingStatus("pending");
-
-    console.log("Recording move number:", game.history().length);
-
-    const response = await fetch("/record_move", {
-      method: "POST",
-      headers: { 
-        "Content-Type": "application/json",
-        "X-CSRFToken": window.csrfToken // <-- Add CSRF token
-      },
-      body: JSON.stringify({
-        game_id: gameId,
-        move_number: Math.ceil(game.history().length / 2),
-        game_state: gameState,
-        score: score, // Will be updated by analysis
-        is_blunder: false,
-        is_brilliant: false,
-        comment: ""
-      }),
-    });
-
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.error || "Failed to record move");
-    }
-
-    const data = await response.json();
-    if (data.error) {
-      console.error("Error recording move:", data.error);
-      return null;
-    }
-
-    showRecordingStatus("success");
-    return data;
-  } catch (error) {
-    console.error("Error recording move:", error);
-    showRecordingStatus("error");
-    return null;
-  }
-}
-
-async function recordAIMove(gameId, move, fenBefore, fenAfter, evaluation) {
-  try {
-    const tempGame = new Chess(fenBefore);
-    const moveResult = tempGame.move({
-      from: move.slice(0, 2),
-      to: move.slice(2, 4),
-      promotion: move.length > 4 ? move[4] : undefined,
-    });
-
-    if (moveResult === null) {
-      console.error("Invalid AI move:", move, "FEN:", fenBefore);
-      return null;
-    }
-
-    const response = await fetch("/record_move", {
-      method: "POST",
-      headers: { 
-        "Content-Type": "application/json",
-        "X-CSRFToken": window.csrfToken // <-- Add CSRF token
-      },
-      body: JSON.stringify({
-        game_id: gameId,
-        move_number: game.history().length,
-        game_state: fenAfter,
-        score: evaluation || 0,
-        is_blunder: false,
-        is_brilliant: false,
-        comment: ""
-      }),
-    });
-
-    if (!response.ok) {
-      throw new Error("Failed to record AI move");
-    }
-
-    return await response.json();
-  } catch (error) {
-    console.error("Error recording AI move:", error);
-    return null;
-  }
-}
-
-function showRecordingStatus(status) {
-  const moveCard = $("#moveCard");
-  const statusText = $("#recordingStatus");
-
-  // Create status element if it doesn't exist
-  if (statusText.length === 0) {
-    moveCard
-      .find(".card-body")
-      .append('<p id="recordingStatus" class="card-text fs-6"></p>');
-  }
-
-  // Update status message and styling
-  const statusElement = $("#recordingStatus");
-  switch (status) {
-    case "pending":
-      statusElement.text("Recording move...").css("color", "#f0ad4e");
-      break;
-    case "success":
-      statusElement.text("Move recorded").css("color", "#5cb85c");
-      // Clear success message after a short delay
-      setTimeout(() => statusElement.text(""), 2000);
-      break;
-    case "error":
-      statusElement.text("Failed to record move").css("color", "#d9534f");
-      break;
-    case "warning":
-      statusElement.text("Move queued for recording").css("color", "#f0ad4e");
-      break;
-    default:
-      statusElement.text("");
-  }
-}
-
-async function saveAllMoves() {
-  if (pendingMoves.length === 0) return;
-  try {
-    const response = await fetch('/api/record_moves_batch', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': window.csrfToken // <-- Add CSRF token
-      },
-      body: JSON.stringify({moves: pendingMoves})
-    });
-    if (!response.ok) throw new Error('Failed to save moves');
-    pendingMoves = [];
-  } catch (error) {
-    console.error('Error saving moves:', error);
-  }
-}
\ No newline at end of file
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads DATABASE_URL when it is imported
+_tmp = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp.name, 'test.db')}"
+
+from app import app as flask_app  # noqa: E402
+from models import db  # noqa: E402
+from services.analysis import get_eval_cache  # noqa: E402
+from services.leaderboard import get_leaderboard  # noqa: E402
+from services.response_cache import get_response_cache  # noqa: E402
+
+FAKE_ENGINE = os.path.join(ROOT, 'benchmarks', 'fake_uci_engine.py')
+
+
+@pytest.fixture
+def app():
+    """The app on an empty database, with the fake engine and no opening book."""
+    flask_app.config.update(
+        STOCKFISH_PATH=FAKE_ENGINE,
+        WTF_CSRF_ENABLED=False,
+        OPENING_BOOK_PATH=None,
+    )
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        for cache in (get_eval_cache(), get_response_cache(), get_leaderboard()):
+            cache.clear()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,175 @@
+"""Helpers for the query plan and query count tests.
+
+They call every route against a scratch database seeded with a couple of
+rows in each table, and collect the statements each one runs.
+"""
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+from models import db, AnalysisJob, Friendship, Game, Move, PlayerStats, User
+from services.leaderboard import get_leaderboard
+from services.response_cache import get_response_cache
+from services.suggestions import get_suggestion_cache
+
+# Routes that need a chess engine or start background analysis
+SKIPPED_ENDPOINTS = {
+    'static',
+    'chess.get_ai_move',
+    'chess.get_evaluation',
+    'chess.stream_evaluation',
+    'chess.evaluate_move',
+    'chess.analyze_game',
+}
+
+# Full scans that are known about, and why they are allowed for now
+KNOWN_SCANS = {}
+
+# Request data for the routes that need more than their URL
+SAMPLE_QUERY_STRINGS = {
+    'friends.search_players': {'q': 'play', 'exclude': 1},
+    'friends.get_friendship': {'user_id': 1, 'friend_id': 2},
+    'move.get_game_moves': {'game_id': 1},
+}
+SAMPLE_PAYLOADS = {
+    'auth.login': {'username': 'player1', 'password': 'not-the-password'},
+    'auth.register': {'username': 'player3', 'email': 'player3@example.com', 'password': 'password'},
+    'chess.save_game': {'pgn': '1. e4 e5 *', 'white': 'Player', 'black': 'AI', 'result': '*', 'user_id': 1},
+    'chess.update_game': {'result': '1-0'},
+    'chess.record_moves_batch': {'moves': [{'game_id': 1, 'move_number': 2, 'game_state': 'x', 'score': 5}]},
+    'move.record_move': {
+        'game_id': 1, 'move_number': 3, 'game_state': 'x', 'score': 5,
+        'is_blunder': False, 'is_brilliant': False, 'comment': '',
+    },
+    'friends.handle_friend_action': {'action': 'accept', 'friendship_id': 1},
+}
+
+# "SCAN user", or "SCAN TABLE user" before SQLite 3.36; searches and index
+# scans read "SEARCH ..." or "SCAN ... USING ..."
+_TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def seed_sample_data():
+    """A couple of rows in every table, so each route has something to find."""
+    users = [User(username=f'player{i}', email=f'player{i}@example.com', password_hash='x') for i in (1, 2)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([PlayerStats(user_id=user.id) for user in users])
+    game = Game(user_id=users[0].id, pgn='1. e4 e5 *', white_player='Player', black_player='AI', result='*')
+    db.session.add(game)
+    db.session.flush()
+    db.session.add(Move(game_id=game.id, move_number=1, game_state='x', score=5))
+    db.session.add(AnalysisJob(game_id=game.id, status='done'))
+    db.session.add(Friendship(user_id=users[0].id, friend_id=users[1].id, status='pending'))
+    db.session.commit()
+
+
+@contextmanager
+def capture_statements(engine):
+    """Collect (statement, parameters) for every single-row statement run."""
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', collect)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', collect)
+
+
+def table_scans(connection, statement, parameters):
+    """The full table scans in SQLite's plan for a statement.
+
+    Scans of a subquery's few rows, which SQLite also reports as SCAN, are
+    left out.
+    """
+    plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    scans = [(row[-1], _TABLE_SCAN.match(row[-1])) for row in plan]
+    return [detail for detail, scan in scans if scan and scan.group(1) in db.metadata.tables]
+
+
+def exercise_routes(app, writes=True):
+    """Call every route once; yields (endpoint, statements it ran).
+
+    POST routes are called with SAMPLE_PAYLOADS unless ``writes`` is false.
+    Writes sample rows either way, so only run it on a scratch database.
+    """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if rule.endpoint in SKIPPED_ENDPOINTS:
+            continue
+        values = {name: 1 if type(rule._converters[name]).__name__ == 'IntegerConverter' else 'Player'
+                  for name in rule.arguments}
+        url = rule.build(values, append_unknown=False)[1]
+
+        with capture_statements(db.engine) as statements:
+            if 'GET' in rule.methods:
+                client.get(url, query_string=SAMPLE_QUERY_STRINGS.get(rule.endpoint, {}))
+            elif writes and rule.endpoint in SAMPLE_PAYLOADS:
+                client.post(url, json=SAMPLE_PAYLOADS[rule.endpoint])
+            else:
+                continue
+        yield rule.endpoint, statements
+
+
+def find_table_scans(app):
+    """EXPLAIN each query every route runs.
+
+    Returns (endpoint, statement, plan detail) for every full table scan
+    outside KNOWN_SCANS.
+    """
+    problems = []
+    for endpoint, statements in exercise_routes(app):
+        if endpoint in KNOWN_SCANS:
+            continue
+        with db.engine.connect() as connection:
+            for statement, parameters in statements:
+                try:
+                    details = table_scans(connection, statement, parameters)
+                except DBAPIError as e:
+                    details = [f'query failed: {e.orig}']
+                for detail in details:
+                    problems.append((endpoint, statement, detail))
+    return problems
+
+
+def add_friends(count):
+    """More players for player1 to find, befriend, be asked by and be suggested."""
+    users = [User(username=f'player-extra{i}', email=f'extra{i}@example.com', password_hash='x')
+             for i in range(count * 2)]
+    db.session.add_all(users)
+    db.session.flush()
+    for i, user in enumerate(users):
+        db.session.add(PlayerStats(user_id=user.id))
+        if i < count:
+            db.session.add(Friendship(user_id=1 if i % 2 else user.id, friend_id=user.id if i % 2 else 1,
+                                      status='accepted' if i % 4 < 2 else 'pending'))
+    db.session.commit()
+
+
+def find_query_count_growth(app, extra=20):
+    """Count each GET route's statements, add ``extra`` friends, count again.
+
+    Returns (endpoint, statements before, statements after) for every route
+    whose number of statements grew with the number of rows it returns.
+    """
+    # Only GET routes, as the sample writes aren't repeatable
+    def counts():
+        get_suggestion_cache().clear()
+        get_leaderboard().clear()
+        get_response_cache().clear()
+        return {endpoint: len(statements) for endpoint, statements in exercise_routes(app, writes=False)}
+
+    before = counts()
+    add_friends(extra)
+    after = counts()
+    return [(endpoint, before[endpoint], after[endpoint])
+            for endpoint in before if after[endpoint] != before[endpoint]]
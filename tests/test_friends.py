@@ -0,0 +1,24 @@
+from models import db, Friendship, Game, PlayerStats, User
+
+
+def test_friends_list_includes_each_friends_record(client):
+    users = [User(username=f'player{i}', email=f'player{i}@example.com', password_hash='x') for i in (1, 2)]
+    db.session.add_all(users)
+    db.session.flush()
+    player, friend = users
+    db.session.add(PlayerStats(user_id=friend.id, rating=1100, highest_rating=1100, wins=2, losses=1, draws=0))
+    db.session.add(Friendship(user_id=player.id, friend_id=friend.id, status='accepted'))
+    game = Game(user_id=friend.id, pgn='1. e4 e5 *', white_player='Player', black_player='AI',
+                result='*', difficulty='easy')
+    db.session.add(game)
+    db.session.commit()
+    player_id, game_id = player.id, game.id
+
+    def friends():
+        return client.get(f'/api/friends/{player_id}').get_json()['friends']
+
+    assert [(f['username'], f['wins'], f['losses'], f['draws']) for f in friends()] == [('player2', 2, 1, 0)]
+
+    # A finished game updates the friend's card rather than a cached copy
+    client.post(f'/update_game/{game_id}', json={'result': '1-0'})
+    assert friends()[0]['wins'] == 3
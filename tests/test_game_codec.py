@@ -0,0 +1,127 @@
+import chess
+import pytest
+
+from models import db, Game, GamePly, Move, User
+from services.analysis import analyse_game, read_pgn
+from services.analysis_queue import save_game_analysis
+from services.game_codec import (COMMENTS, CannotPack, pack_analysis, pack_analysis_or_none, pack_moves,
+                                 unpack_analysis, unpack_moves)
+from services.replay import game_plies, load_game_plies, ply_for_move, store_game_plies
+from services.stored_analysis import load_analysis, replace_analysis
+
+# Captures, a promotion and castling on both sides
+PGN = '1. e4 d5 2. exd5 c6 3. dxc6 Nf6 4. cxb7 Nbd7 5. bxa8=N e5 6. Nf3 Bd6 7. Be2 O-O 8. O-O Qc7 *'
+
+GRADED_ROWS = [
+    {'move_number': 1, 'score': 10, 'is_blunder': False, 'is_brilliant': True, 'comment': 'Best move!'},
+    {'move_number': 2, 'score': 7.25, 'is_blunder': False, 'is_brilliant': False, 'comment': 'Good move.'},
+    {'move_number': 3, 'score': 0, 'is_blunder': True, 'is_brilliant': False, 'comment': 'Blunder!'},
+    {'move_number': 4, 'score': 10, 'is_blunder': False, 'is_brilliant': False,
+     'comment': "You're delivering mate in 3"},
+    {'move_number': 5, 'score': 0, 'is_blunder': True, 'is_brilliant': False, 'comment': 'Opponent has mate in 2'},
+    {'move_number': 6, 'score': 3, 'is_blunder': False, 'is_brilliant': False,
+     'comment': "You were delivering mate in -1, don't miss it!"},
+    {'move_number': 7, 'score': None, 'is_blunder': False, 'is_brilliant': False, 'comment': ''},
+    {'move_number': 8, 'score': 10, 'is_blunder': False, 'is_brilliant': False,
+     'comment': 'Checkmate! You won the game.'},
+]
+
+
+def add_game(pgn=PGN):
+    user = User(username='player', email='player@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    game = Game(user_id=user.id, pgn=pgn, white_player='Player', black_player='AI', result='*')
+    db.session.add(game)
+    db.session.flush()
+    return game
+
+
+def test_moves_round_trip():
+    moves = list(read_pgn(PGN).mainline_moves())
+    assert len(moves) == 16
+
+    assert unpack_moves(pack_moves(moves)) == moves
+
+
+def test_graded_moves_round_trip():
+    assert unpack_analysis(pack_analysis(GRADED_ROWS)) == GRADED_ROWS
+
+
+def test_every_feedback_message_round_trips():
+    rows = [{'move_number': i, 'score': 5, 'is_blunder': False, 'is_brilliant': False,
+             'comment': comment.format(n=-(i + 1) if i % 2 else i + 1)}
+            for i, comment in enumerate(COMMENTS)]
+
+    assert unpack_analysis(pack_analysis(rows)) == rows
+
+
+def test_unknown_comments_are_not_packed():
+    rows = [dict(GRADED_ROWS[0], comment='Nice!')]
+
+    with pytest.raises(CannotPack):
+        pack_analysis(rows)
+    assert pack_analysis_or_none(rows) is None
+
+
+def test_packed_analysis_loads_like_move_rows(app):
+    game = add_game()
+    rows = [dict(row, game_state=None) for row in GRADED_ROWS]
+
+    replace_analysis(game, rows, pack=True)
+    db.session.commit()
+    assert game.packed_analysis is not None
+    assert Move.query.filter_by(game_id=game.id).count() == 0
+    packed = load_analysis(game.id)
+
+    replace_analysis(game, rows, pack=False)
+    db.session.commit()
+    assert game.packed_analysis is None
+    assert load_analysis(game.id) == packed == rows
+
+
+def test_unpackable_analysis_is_kept_in_move_rows(app):
+    game = add_game()
+    rows = [dict(GRADED_ROWS[0], comment='Nice!', game_state='x')]
+
+    replace_analysis(game, rows, pack=True)
+    db.session.commit()
+
+    assert game.packed_analysis is None
+    assert load_analysis(game.id) == rows
+
+
+def test_packed_moves_replay_like_the_pgn(app):
+    game = add_game()
+    expected = game_plies(PGN)
+
+    store_game_plies(game)
+    db.session.commit()
+    assert load_game_plies(game) == expected
+
+    GamePly.query.filter_by(game_id=game.id).delete()
+    db.session.commit()
+    assert game.packed_moves is not None
+    assert load_game_plies(game) == expected
+
+
+@pytest.mark.parametrize('pack', [False, True])
+def test_engine_graded_game_round_trips(app, monkeypatch, pack):
+    monkeypatch.setitem(app.config, 'PACK_ANALYSIS', pack)
+    game = add_game()
+    store_game_plies(game, store_rows=False)
+    plies = analyse_game(PGN, depth=2)
+
+    save_game_analysis(game, plies)
+    db.session.commit()
+    stored = load_analysis(game.id)
+
+    graded = [ply for ply in plies if ply['color'] == chess.WHITE]
+    assert (game.packed_analysis is not None) == pack
+    assert [(row['move_number'], row['score'], row['is_blunder'], row['comment']) for row in stored] == \
+        [(ply['move_number'], ply['score'], ply['feedback'] == 'Blunder!', ply['feedback']) for ply in graded]
+    # Packed games keep no positions; they come from replaying the moves
+    replayed = load_game_plies(game)
+    for row, ply in zip(stored, graded):
+        assert replayed[ply_for_move(row['move_number'], chess.WHITE)]['fen'] == ply['fen']
+        assert row['game_state'] == (None if pack else ply['fen'])
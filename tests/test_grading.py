@@ -0,0 +1,38 @@
+import chess
+import chess.engine
+
+from services.analysis import GRADING_PROFILE, get_eval_cache
+from services.difficulty import DIFFICULTY_PROFILES, engine_options
+
+FEN = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1'
+
+
+def weak_info(cp):
+    return {'score': chess.engine.PovScore(chess.engine.Cp(cp), chess.WHITE), 'depth': 30, 'pv': []}
+
+
+def test_skill_limited_entries_are_not_full_strength(app):
+    board = chess.Board(FEN)
+    cache = get_eval_cache()
+    cache.put(board, weak_info(900), engine_options(DIFFICULTY_PROFILES['easy']))
+
+    assert cache.get(board, 1, engine_options(GRADING_PROFILE)) is None
+    assert cache.get(board, 1) is None
+    assert cache.get(board, 1, engine_options(DIFFICULTY_PROFILES['easy']))['score'].white().score() == 900
+
+
+def test_grading_ignores_skill_limited_entries(client):
+    body = {'fen_before': FEN, 'move': 'e7e5'}
+    expected = client.post('/evaluate_move', json=body).get_json()
+    assert 'error' not in expected
+
+    cache = get_eval_cache()
+    cache.clear()
+    before = chess.Board(FEN)
+    after = before.copy()
+    after.push_uci('e7e5')
+    for profile in ('easy', 'medium'):
+        for board in (before, after):
+            cache.put(board, weak_info(900), engine_options(DIFFICULTY_PROFILES[profile]))
+
+    assert client.post('/evaluate_move', json=body).get_json() == expected
@@ -0,0 +1,10 @@
+from tests.query_plans import find_query_count_growth, seed_sample_data
+
+
+def test_routes_run_a_fixed_number_of_queries(app):
+    seed_sample_data()
+
+    problems = find_query_count_growth(app, extra=20)
+
+    assert not problems, '\n'.join(f'{endpoint}: {before} statements, {after} after adding 20 friends'
+                                   for endpoint, before, after in problems)
@@ -0,0 +1,10 @@
+from tests.query_plans import find_table_scans, seed_sample_data
+
+
+def test_no_route_scans_a_whole_table(app):
+    seed_sample_data()
+
+    problems = find_table_scans(app)
+
+    assert not problems, '\n'.join(f'{endpoint}: {detail}\n    {" ".join(statement.split())}'
+                                   for endpoint, statement, detail in problems)
@@ -0,0 +1,54 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Game, PlayerStats, User
+from services.difficulty import DIFFICULTY_PROFILES
+from services.ratings import (PROVISIONAL_GAMES, RECORD_FIELDS, _rated_games, _replay_numpy, _replay_python,
+                              recompute_ratings)
+
+pytest.importorskip('numpy')
+
+
+def game_history(players=5, seed=0):
+    """Players with 0 to past PROVISIONAL_GAMES games each, as _rated_games() returns them."""
+    rng = random.Random(seed)
+    ratings = [profile['rating'] for profile in DIFFICULTY_PROFILES.values()]
+    users, opponents, scores = [], [], []
+    for user_id in range(1, players + 1):
+        for _ in range(rng.randint(1, PROVISIONAL_GAMES + 10)):
+            users.append(user_id)
+            opponents.append(rng.choice(ratings))
+            scores.append(rng.choice([0.0, 0.5, 1.0]))
+    return users, opponents, scores
+
+
+def test_numpy_replay_matches_python():
+    history = game_history()
+
+    assert _replay_numpy(*history) == _replay_python(*history)
+
+
+def test_recompute_ratings_is_the_same_with_and_without_numpy(app):
+    rng = random.Random(1)
+    users = [User(username=f'player{i}', email=f'player{i}@example.com', password_hash='x') for i in range(4)]
+    db.session.add_all(users)
+    db.session.flush()
+    started = datetime(2025, 1, 1)
+    for i in range(120):
+        player_white = rng.random() < 0.5
+        db.session.add(Game(
+            user_id=rng.choice(users).id, pgn='*', result=rng.choice(['1-0', '0-1', '1/2-1/2', '*']),
+            white_player='Player' if player_white else 'AI', black_player='AI' if player_white else 'Player',
+            difficulty=rng.choice([None, *DIFFICULTY_PROFILES]), date_played=started + timedelta(minutes=i),
+        ))
+    db.session.commit()
+    assert _rated_games()[0]
+
+    def records(use_numpy):
+        recompute_ratings(use_numpy=use_numpy)
+        db.session.commit()
+        return {stats.user_id: [getattr(stats, field) for field in RECORD_FIELDS] for stats in PlayerStats.query}
+
+    assert records(use_numpy=True) == records(use_numpy=False)
@@ -0,0 +1,33 @@
+from models import db, Game, PlayerStats, User
+from services.database import DatabaseBusy
+
+
+def test_update_game_retries_when_the_database_is_locked(client, monkeypatch):
+    user = User(username='player', email='player@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(PlayerStats(user_id=user.id, rating=1000, highest_rating=1000))
+    game = Game(user_id=user.id, pgn='1. e4 e5 *', white_player='Player', black_player='AI',
+                result='*', difficulty='medium')
+    db.session.add(game)
+    db.session.commit()
+    game_id, user_id = game.id, user.id
+
+    commit = db.session.commit
+    calls = []
+
+    def commit_once_locked():
+        calls.append(1)
+        if len(calls) == 1:
+            raise DatabaseBusy('COMMIT', None, Exception('database is locked'))
+        commit()
+
+    monkeypatch.setattr(db.session, 'commit', commit_once_locked)
+    response = client.post(f'/update_game/{game_id}', json={'result': '1-0'})
+    monkeypatch.undo()
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+    stats = PlayerStats.query.filter_by(user_id=user_id).one()
+    # The retry applied the result once, after rolling back the locked attempt
+    assert (stats.wins, stats.rating) == (1, 1000 + response.get_json()['rating_change'])